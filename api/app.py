@@ -1,139 +1,42 @@
-from http.server import BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
-import json
 import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 import os
-import zipfile
+import tempfile
+from flask import Flask, request, jsonify, send_file
 from werkzeug.utils import secure_filename
-from PIL import Image
-import cgi
-import io
+import logging
+import sys
+import time
+import uuid
+
+# The shared hallticket package lives at the project root, one level above this function
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hallticket import (TicketRenderer, build_photo_index, ingest_images, resolve_image_workers, render_cache,
+                        preview_roster, ROSTER_EXTENSIONS, configure_logging, profile_run, PROFILE_SUFFIX, Budget,
+                        generate_bounded, SessionStore, check_session_id)
+
+app = Flask(__name__)
 
 # Configuration for Vercel - use /tmp for temporary files
 UPLOAD_FOLDER = '/tmp/uploads'
 OUTPUT_FOLDER = '/tmp/output'
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = ROSTER_EXTENSIONS
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp'}
+IMAGE_WORKERS = resolve_image_workers()
+
+configure_logging()  # HALLTICKET_LOG_LEVEL controls how much reaches the function logs
+logger = logging.getLogger(__name__)
 
 # Create necessary directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+# Photo uploads and each request's roster/logo get their own folders, so concurrent invocations never share one
+image_sessions = SessionStore(UPLOAD_FOLDER, 'images_')
+upload_sessions = SessionStore(UPLOAD_FOLDER, 'upload_')
+
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def draw_ticket(c, row, y_start, copy_label, department_name, logo_path):
-    width, height = A4
-
-    # Draw outer box for ticket (top above logo)
-    box_left = 30
-    box_right = width - 30
-    box_top = y_start + 40
-    box_bottom = y_start - 320
-    box_width = box_right - box_left
-    box_height = box_top - box_bottom
-    c.setLineWidth(1)
-    c.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
-
-    # College Logo
-    if logo_path and os.path.exists(logo_path):
-        try:
-            c.drawImage(logo_path, 40, y_start-30, width=60, height=60, mask='auto')
-        except:
-            pass
-
-    # Header
-    c.setFont("Helvetica-Bold", 13)
-    c.drawCentredString(width/2, y_start, "GURU NANAK DEV ENGINEERING COLLEGE, BIDAR")
-    c.setLineWidth(1)
-
-    # Department name
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width/2, y_start-20, department_name.upper())
-    c.setLineWidth(0.8)
-
-    # Exam title
-    c.setFont("Helvetica-Bold", 11)
-    c.drawCentredString(width/2, y_start-40, "ADMISSION TICKET FOR B.E EXAMINATION JUNE / JULY 2025")
-    c.setLineWidth(0.5)
-    c.line(40, y_start-50, width-40, y_start-50)
-
-    # Copy Label
-    c.setFont("Helvetica-Bold", 10)
-    c.drawRightString(width-40, y_start-40, copy_label)
-
-    # Student details
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y_start-80, f"1. UNIVERSITY SEAT NO.: {row['Seat No']}     No: {row['Exam No']}     Date: {row['Date']}")
-    c.drawString(50, y_start-100, f"2. NAME OF THE CANDIDATE: {row['Name']}")
-
-    # Subjects with signature box
-    c.drawString(50, y_start-120, "3. SUBJECTS APPLIED:")
-    subjects = str(row['Subjects Applied']).split(",")
-    y = y_start - 140
-    for sub in subjects:
-        sub = sub.strip()
-        c.drawString(70, y, sub)
-        c.rect(200, y-5, 60, 15)
-        y -= 20
-
-    # Note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(70, y, "Note: Please verify the eligibility of candidate before issuing the admission ticket.")
-    y -= 20
-    c.drawString(70, y, "This is Electronically Generated Admission Ticket.")
-
-    # Photo - aligned with university seat number line
-    photo_path = row.get('Photo Path', '')
-    print(f"Photo path for {row.get('Seat No', 'Unknown')}: {photo_path}")
-    
-    if pd.notna(photo_path) and str(photo_path).strip() != '' and os.path.exists(str(photo_path)):
-        try:
-            print(f"Drawing image: {photo_path}")
-            # Align photo with the university seat number line (y_start-80)
-            photo_x = width - 150  # Right side position
-            photo_y = y_start - 80 - 100  # Start at same level as university seat no, account for image height
-            c.drawImage(photo_path, photo_x, photo_y, 100, 100)
-            print(f"Successfully drew image for {row.get('Seat No', 'Unknown')}")
-        except Exception as e:
-            print(f"Error drawing image for {row.get('Seat No', 'Unknown')}: {e}")
-    else:
-        print(f"No photo or file doesn't exist for {row.get('Seat No', 'Unknown')}: {photo_path}")
-
-    # Exam Center
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y-30, f"Exam Center: {row['Exam Center']}")
-
-    # Signature placeholders
-    c.drawString(50, y-70, "Signature of the Candidate")
-    c.drawString(250, y-70, "Signature of the Principal with seal")
-    c.drawString(450, y-70, "Signature of the Hod")
-
-def generate_hallticket(row, department_name, logo_path, output_dir):
-    filename = f"hallticket_{row['Seat No']}.pdf"
-    filepath = os.path.join(output_dir, filename)
-    
-    c = canvas.Canvas(filepath, pagesize=A4)
-    width, height = A4
-
-    copies = ["STUDENT COPY", "COLLEGE COPY"]
-    y_positions = [height-50, height/2-30]
-
-    for label, y in zip(copies, y_positions):
-        draw_ticket(c, row, y, label, department_name, logo_path)
-        c.setLineWidth(0.5)
-        c.line(40, y-280, width-40, y-280)
-
-    # Footer note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawCentredString(width/2, 30, "Candidate must read the instructions provided in the answer booklet before commencement of examination.")
-
-    c.showPage()
-    c.save()
-    return filename
-
 # HTML Template embedded
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -168,7 +71,7 @@ HTML_TEMPLATE = """
         <form id="hallTicketForm" enctype="multipart/form-data">
             <div class="form-group">
                 <label for="excel_file">Excel File (Required):</label>
-                <input type="file" id="excel_file" name="excel_file" accept=".xlsx,.xls" required>
+                <input type="file" id="excel_file" name="excel_file" accept=".xlsx,.xls,.csv,.parquet" required>
                 <small>Required columns: Seat No, Exam No, Name, Date, Exam Center</small>
             </div>
             
@@ -238,13 +141,16 @@ HTML_TEMPLATE = """
                     resultDiv.className = 'result success';
                     resultDiv.innerHTML = `
                         <h3>✅ Success!</h3>
-                        <p>${data.message}</p>
+                        <p class="result-message"></p>
                         <p>Total Students: ${data.total_students} | Generated: ${data.generated_count}</p>
                         <a href="${data.download_url}" class="download-btn">📥 Download Hall Tickets (ZIP)</a>
                     `;
+                    resultDiv.querySelector('.result-message').textContent = data.message;
                 } else {
                     resultDiv.className = 'result error';
-                    resultDiv.innerHTML = `<h3>❌ Error</h3><p>${data.error}</p>`;
+                    // Error text can quote roster cells and file names: set it as text, never as HTML
+                    resultDiv.innerHTML = '<h3>❌ Error</h3><p></p>';
+                    resultDiv.querySelector('p').textContent = data.error;
                 }
             })
             .catch(error => {
@@ -275,45 +181,25 @@ def upload_candidate_images():
         if not uploaded_files or uploaded_files[0].filename == '':
             return jsonify({'error': 'No images uploaded'}), 400
         
-        # Create images directory for this session
-        session_id = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
-        images_dir = os.path.join(UPLOAD_FOLDER, f'images_{session_id}')
-        os.makedirs(images_dir, exist_ok=True)
-        
-        uploaded_images = []
-        for file in uploaded_files:
-            if file and file.filename != '':
-                if allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
-                    # Extract seat number from filename (expected format: SeatNo_Name.ext or SeatNo.ext)
-                    filename = secure_filename(file.filename)
-                    seat_no = filename.split('_')[0].split('.')[0]  # Get seat number from filename
-                    
-                    # Save with seat number as filename
-                    ext = filename.rsplit('.', 1)[1].lower()
-                    new_filename = f"{seat_no}.{ext}"
-                    file_path = os.path.join(images_dir, new_filename)
-                    file.save(file_path)
-                    
-                    # Resize image for better performance
-                    try:
-                        with Image.open(file_path) as img:
-                            # Resize to max 200x200 while maintaining aspect ratio
-                            img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                            img.save(file_path, optimize=True)
-                    except Exception as e:
-                        print(f"Error resizing image {filename}: {e}")
-                    
-                    uploaded_images.append({
-                        'seat_no': seat_no,
-                        'filename': new_filename,
-                        'path': file_path
-                    })
-        
+        # Decode each upload straight from its stream and thumbnail it (max 200x200) on a thread pool;
+        # files are named by seat number (expected format: SeatNo_Name.ext or SeatNo.ext).
+        # The session folder is staged privately and renamed into place once every photo is written
+        started = time.perf_counter()
+        files = [(file.filename, file.stream) for file in uploaded_files if file and file.filename != '']
+        with image_sessions.create() as (session_id, images_dir):
+            uploaded_images, failed_images = ingest_images(files, images_dir, ALLOWED_IMAGE_EXTENSIONS, IMAGE_WORKERS)
+        for failure in failed_images:
+            logger.warning("Error processing image %s: %s", failure['filename'], failure['error'])
+
         return jsonify({
             'success': True,
             'session_id': session_id,
             'uploaded_count': len(uploaded_images),
-            'images': uploaded_images
+            'images': uploaded_images,
+            'failed_count': len(failed_images),
+            'failed': failed_images,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'workers': IMAGE_WORKERS
         })
     
     except Exception as e:
@@ -332,94 +218,100 @@ def upload_file():
         subject_option = request.form.get('subject_option', 'excel')
         custom_subjects = request.form.get('custom_subjects', '')
         images_session_id = request.form.get('images_session_id', '')
+        # ?profile=1 runs the generation under cProfile and reports the hottest functions
+        profile = (request.args.get('profile') or request.form.get('profile', '')).lower() in ('1', 'true', 'yes')
 
         if excel_file.filename == '':
             return jsonify({'error': 'No Excel file selected'}), 400
 
         if not allowed_file(excel_file.filename, ALLOWED_EXTENSIONS):
-            return jsonify({'error': 'Invalid Excel file format. Please use .xlsx or .xls'}), 400
-
-        # Save Excel file
-        excel_filename = secure_filename(excel_file.filename)
-        excel_path = os.path.join(UPLOAD_FOLDER, excel_filename)
-        excel_file.save(excel_path)
-
-        # Save logo file if provided
-        logo_path = None
-        if logo_file and logo_file.filename != '':
-            if allowed_file(logo_file.filename, ALLOWED_IMAGE_EXTENSIONS):
-                logo_filename = secure_filename(logo_file.filename)
-                logo_path = os.path.join(UPLOAD_FOLDER, logo_filename)
-                logo_file.save(logo_path)
-
-        # Load Excel data
+            return jsonify({'error': 'Invalid roster file format. Please use .xlsx, .xls, .csv or .parquet'}), 400
+
+        if images_session_id:
+            try:
+                images_session_id = check_session_id(images_session_id)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        # This request's roster and logo get a folder of their own
+        logo_filename = None
+        with upload_sessions.create() as (upload_id, staging):
+            # Save Excel file
+            excel_filename = secure_filename(excel_file.filename)
+            excel_file.save(os.path.join(staging, excel_filename))
+
+            # Save logo file if provided
+            if logo_file and logo_file.filename != '':
+                if allowed_file(logo_file.filename, ALLOWED_IMAGE_EXTENSIONS):
+                    logo_filename = secure_filename(logo_file.filename)
+                    logo_file.save(os.path.join(staging, logo_filename))
+        upload_dir = upload_sessions.path(upload_id)
+        excel_path = os.path.join(upload_dir, excel_filename)
+        logo_path = os.path.join(upload_dir, logo_filename) if logo_filename else None
+
+        # Header and row count only: /tmp memory and disk are tight, so rows are read, rendered and
+        # zipped a chunk at a time (HALLTICKET_MEMORY_MB / HALLTICKET_DISK_MB set the budget)
         try:
-            df = pd.read_excel(excel_path)
+            columns = preview_roster(excel_path, nrows=0)['columns']
         except Exception as e:
             return jsonify({'error': f'Error reading Excel file: {str(e)}'}), 400
 
         # Validate required columns
         required_columns = ['Seat No', 'Exam No', 'Name', 'Date', 'Exam Center']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in columns]
         if missing_columns:
             return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
 
         # Handle subjects
+        subjects_string = None
         if subject_option == 'custom' and custom_subjects.strip():
             subjects_list = [s.strip() for s in custom_subjects.split('\n') if s.strip()]
             if subjects_list:
                 subjects_string = ", ".join(subjects_list)
-                df['Subjects Applied'] = subjects_string
-        elif 'Subjects Applied' not in df.columns:
+        if subjects_string is None and 'Subjects Applied' not in columns:
             return jsonify({'error': 'No subjects found. Either select Excel subjects or provide custom subjects.'}), 400
 
-        # Handle candidate images
-        if images_session_id:
-            images_dir = os.path.join(UPLOAD_FOLDER, f'images_{images_session_id}')
-            if os.path.exists(images_dir):
-                # Map seat numbers to image paths
-                for index, row in df.iterrows():
-                    seat_no = str(row['Seat No'])
-                    # Look for image files with this seat number
-                    for ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
-                        img_path = os.path.join(images_dir, f"{seat_no}.{ext}")
-                        if os.path.exists(img_path):
-                            df.at[index, 'Photo Path'] = img_path
-                            print(f"Matched image for {seat_no}: {img_path}")
-                            break
-                    else:
-                        print(f"No image found for seat number: {seat_no}")
-
-        # Create output directory for this session
-        session_dir = os.path.join(OUTPUT_FOLDER, f"session_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}")
-        os.makedirs(session_dir, exist_ok=True)
-
-        # Generate hall tickets
-        generated_files = []
-        for _, row in df.iterrows():
-            try:
-                filename = generate_hallticket(row, department_name, logo_path, session_dir)
-                generated_files.append(filename)
-            except Exception as e:
-                print(f"Error generating ticket for {row.get('Name', 'Unknown')}: {e}")
-
-        # Create ZIP file
-        zip_filename = f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        # Handle candidate images: one directory scan, matched to each chunk's seat numbers as it is read
+        photo_index = {}
+        if images_session_id and image_sessions.exists(images_session_id):
+            with image_sessions.lock(images_session_id):
+                photo_index = build_photo_index(image_sessions.path(images_session_id))
+
+        # Tickets go straight into the ZIP - no per-student PDFs in /tmp next to it
+        renderer = TicketRenderer(department_name, logo_path)
+        # The random suffix keeps two requests in the same second apart
+        zip_stem = f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        zip_filename = f"{zip_stem}.zip"
         zip_path = os.path.join(OUTPUT_FOLDER, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for filename in generated_files:
-                file_path = os.path.join(session_dir, filename)
-                if os.path.exists(file_path):
-                    zipf.write(file_path, filename)
 
-        return jsonify({
+        def generate():
+            summary = generate_bounded(renderer, excel_path, zip_path, Budget(), subjects_string, photo_index,
+                                       workers=1, cache=None if profile else render_cache)
+            for failure in summary['failed']:
+                logger.warning("Error generating ticket for %s: %s", failure['seat_no'], failure['error'])
+            return summary
+
+        profile_summary = None
+        if profile:
+            # The stats file sits next to the ZIP
+            profile_path = os.path.join(OUTPUT_FOLDER, f"{zip_stem}{PROFILE_SUFFIX}")
+            summary, profile_summary = profile_run(generate, path=profile_path)
+        else:
+            summary = generate()
+
+        response = {
             'success': True,
-            'message': f'Successfully generated {len(generated_files)} hall tickets',
+            'message': f"Successfully generated {summary['generated_count']} hall tickets",
             'download_url': f'/download/{zip_filename}',
-            'total_students': len(df),
-            'generated_count': len(generated_files)
-        })
+            'total_students': summary['total_students'],
+            'generated_count': summary['generated_count'],
+            'failed_count': summary['failed_count'],
+            'photos': summary['photos'],
+            'peak_rss_mb': summary['peak_rss_mb']
+        }
+        if profile_summary is not None:
+            response['profile'] = profile_summary
+        return jsonify(response)
 
     except Exception as e:
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
@@ -427,8 +319,9 @@ def upload_file():
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
+        filename = secure_filename(filename)
         file_path = os.path.join(OUTPUT_FOLDER, filename)
-        if os.path.exists(file_path):
+        if filename and os.path.isfile(file_path):
             return send_file(file_path, as_attachment=True, download_name=filename)
         else:
             return jsonify({'error': 'File not found'}), 404
@@ -445,23 +338,15 @@ def preview_excel():
         if excel_file.filename == '':
             return jsonify({'error': 'No Excel file selected'}), 400
 
-        # Save temporary file
-        temp_filename = secure_filename(excel_file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{temp_filename}")
-        excel_file.save(temp_path)
-
-        # Read Excel file
-        df = pd.read_excel(temp_path)
-        
-        # Clean up temp file
-        os.remove(temp_path)
-
-        # Return preview data
-        preview_data = {
-            'columns': list(df.columns),
-            'row_count': len(df),
-            'sample_data': df.head(3).to_dict('records')
-        }
+        if not allowed_file(excel_file.filename, ALLOWED_EXTENSIONS):
+            return jsonify({'error': 'Invalid roster file format. Please use .xlsx, .xls, .csv or .parquet'}), 400
+
+        # A private temporary folder per request, removed with the file once the preview is read
+        with tempfile.TemporaryDirectory(dir=UPLOAD_FOLDER, prefix='preview_') as staging:
+            temp_path = os.path.join(staging, f"roster.{excel_file.filename.rsplit('.', 1)[1].lower()}")
+            excel_file.save(temp_path)
+            # Read the header and first rows only (plus a row count), not the whole workbook
+            preview_data = preview_roster(temp_path)
 
         return jsonify(preview_data)
 
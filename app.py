@@ -1,141 +1,137 @@
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 import os
 import zipfile
-import tempfile
 from werkzeug.utils import secure_filename
-import io
-import json
-from PIL import Image
-import shutil
+import pickle
+import logging
+import threading
+import time
+from hallticket import (TicketRenderer, resolve_workers, prepare_records, build_photo_index, apply_photo_index,
+                        JobQueue, write_zip, stream_zip, volume_filename, image_cache, ingest_images,
+                        resolve_image_workers, photo_derivatives, render_cache, BatchManifest, PreviousOutputs,
+                        diff_roster, roster_fields, iter_incremental, iter_volumes_incremental, manifest_path,
+                        read_roster, preview_roster, ROSTER_EXTENSIONS, WorkbookCache, metrics, configure_logging,
+                        profile_run, PROFILE_SUFFIX, Budget, generate_bounded, StorageManager, SessionStore,
+                        check_session_id, Checkpoint, checkpoint_path, CHECKPOINT_SUFFIX, validate_roster, private_dir)
 
 app = Flask(__name__)
+configure_logging()  # HALLTICKET_LOG_LEVEL=DEBUG for more detail, WARNING for less
+logger = logging.getLogger(__name__)
 app.secret_key = 'hall_ticket_generator_secret_key'
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = ROSTER_EXTENSIONS  # Excel, or CSV/Parquet for very large rosters
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp'}
+REQUIRED_COLUMNS = ['Seat No', 'Exam No', 'Name', 'Date', 'Exam Center']  # 'Subjects Applied' may come from the form
+RENDER_WORKERS = resolve_workers()  # override with HALLTICKET_WORKERS, 1 = serial
+JOB_WORKERS = int(os.environ.get('HALLTICKET_JOB_WORKERS', 2))  # batches generated concurrently
+IMAGE_WORKERS = resolve_image_workers()  # threads thumbnailing uploaded photos, override with HALLTICKET_IMAGE_WORKERS
+# Generated files and uploads are evicted oldest first past these quotas, and once unused for this long (0 = no limit)
+OUTPUT_QUOTA_MB = int(os.environ.get('HALLTICKET_OUTPUT_QUOTA_MB', 2048))
+OUTPUT_TTL = int(os.environ.get('HALLTICKET_OUTPUT_TTL', 7 * 24 * 3600))  # seconds
+UPLOAD_QUOTA_MB = int(os.environ.get('HALLTICKET_UPLOAD_QUOTA_MB', 1024))
+UPLOAD_TTL = int(os.environ.get('HALLTICKET_UPLOAD_TTL', 24 * 3600))
+PREVIEW_CHECK_ROWS = int(os.environ.get('HALLTICKET_PREVIEW_CHECK_ROWS', 1000))  # rows /preview validates
+# Previewed rosters up to this size are parsed in the background; larger ones stay files that bounded runs stream
+PREFETCH_MAX_ROWS = int(os.environ.get('HALLTICKET_PREFETCH_ROWS', 100000))
+STREAM_TTL = int(os.environ.get('HALLTICKET_STREAM_TTL', 3600))  # seconds a prepared stream waits for its download
+# Photo derivatives and cached tickets live in a private folder under the app's instance folder
+os.environ.setdefault('HALLTICKET_CACHE_DIR', os.path.join(app.instance_path, 'cache'))
 
 # Create necessary directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-def allowed_file(filename, allowed_extensions):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-
-def draw_ticket(c, row, y_start, copy_label, department_name, logo_path):
-    width, height = A4
-
-    # Draw outer box for ticket (top above logo)
-    box_left = 30
-    box_right = width - 30
-    box_top = y_start + 40
-    box_bottom = y_start - 320
-    box_width = box_right - box_left
-    box_height = box_top - box_bottom
-    c.setLineWidth(1)
-    c.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
-
-    # College Logo
-    if logo_path and os.path.exists(logo_path):
-        try:
-            c.drawImage(logo_path, 40, y_start-30, width=60, height=60, mask='auto')
-        except:
-            pass
-
-    # Header
-    c.setFont("Helvetica-Bold", 13)
-    c.drawCentredString(width/2, y_start, "GURU NANAK DEV ENGINEERING COLLEGE, BIDAR")
-    c.setLineWidth(1)
-
-    # Department name
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width/2, y_start-20, department_name.upper())
-    c.setLineWidth(0.8)
-
-    # Exam title
-    c.setFont("Helvetica-Bold", 11)
-    c.drawCentredString(width/2, y_start-40, "ADMISSION TICKET FOR B.E EXAMINATION JUNE / JULY 2025")
-    c.setLineWidth(0.5)
-    c.line(40, y_start-50, width-40, y_start-50)
-
-    # Copy Label
-    c.setFont("Helvetica-Bold", 10)
-    c.drawRightString(width-40, y_start-40, copy_label)
-
-    # Student details
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y_start-80, f"1. UNIVERSITY SEAT NO.: {row['Seat No']}     No: {row['Exam No']}     Date: {row['Date']}")
-    c.drawString(50, y_start-100, f"2. NAME OF THE CANDIDATE: {row['Name']}")
-
-    # Subjects with signature box
-    c.drawString(50, y_start-120, "3. SUBJECTS APPLIED:")
-    subjects = str(row['Subjects Applied']).split(",")
-    y = y_start - 140
-    for sub in subjects:
-        sub = sub.strip()
-        c.drawString(70, y, sub)
-        c.rect(200, y-5, 60, 15)
-        y -= 20
-
-    # Note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(70, y, "Note: Please verify the eligibility of candidate before issuing the admission ticket.")
-    y -= 20
-    c.drawString(70, y, "This is Electronically Generated Admission Ticket.")
-
-    # Photo - aligned with university seat number line
-    photo_path = row.get('Photo Path', '')
-    print(f"Photo path for {row.get('Seat No', 'Unknown')}: {photo_path}")
-    
-    if pd.notna(photo_path) and str(photo_path).strip() != '' and os.path.exists(str(photo_path)):
+# Background queue that runs generation jobs outside the request thread; their status is written to
+# instance/jobs, so a gunicorn worker can answer /jobs/<id> for a job another worker runs
+job_queue = JobQueue(workers=JOB_WORKERS, status_dir=private_dir(os.path.join(app.instance_path, 'jobs')))
+# Batches prepared for /download/stream/<job_id>, pickled so whichever worker gets the download can send it
+STREAM_FOLDER = private_dir(os.path.join(app.instance_path, 'streams'))
+
+# Rosters uploaded for /preview, parsed in the background and reused by /upload via workbook_token
+workbook_cache = WorkbookCache(UPLOAD_FOLDER)
+
+# Photo uploads (images_<id>) and each /upload request's files (upload_<id>) get their own folders,
+# published whole, so concurrent coordinators, threads and gunicorn workers never share one
+image_sessions = SessionStore(UPLOAD_FOLDER, 'images_')
+upload_sessions = SessionStore(UPLOAD_FOLDER, 'upload_')
+
+# Quotas and TTLs for output/ and uploads/, enforced by a background sweeper (HALLTICKET_STORAGE_SWEEP seconds apart)
+storage = StorageManager()
+storage.add(OUTPUT_FOLDER, OUTPUT_QUOTA_MB, OUTPUT_TTL)
+storage.add(UPLOAD_FOLDER, UPLOAD_QUOTA_MB, UPLOAD_TTL)
+
+@app.before_request
+def start_background_threads():
+    """Start the storage sweeper with the first request rather than at import (later calls do nothing)"""
+    storage.start()
+
+def pin_sessions(job_id, pins):
+    """Keep the (directory, name) sessions job `job_id` reads from eviction, in every process, until unpinned"""
+    for directory, name in pins:
+        storage.pin(directory, name, job_id)
+
+def run_pinned(job, generate, *args):
+    """Run a generation job, then release the sessions pinned for it; a prepared stream keeps them until downloaded"""
+    result = None
+    try:
+        result = generate(job, *args)
+        return result
+    finally:
+        if not (result or {}).get('streaming'):
+            storage.unpin(job.id)
+
+def stream_path(job_id):
+    return os.path.join(STREAM_FOLDER, f"{secure_filename(job_id)}.pickle")
+
+def add_pending_stream(job_id, renderer, records, workers):
+    """
+    Keep a prepared batch for its streamed download, which any worker process may serve, and drop those
+    left waiting past STREAM_TTL
+    """
+    cutoff = time.time() - STREAM_TTL
+    for entry in os.scandir(STREAM_FOLDER):
         try:
-            print(f"Drawing image: {photo_path}")
-            # Align photo with the university seat number line (y_start-80)
-            photo_x = width - 150  # Right side position
-            photo_y = y_start - 80 - 100  # Start at same level as university seat no, account for image height
-            c.drawImage(photo_path, photo_x, photo_y, 100, 100)
-            print(f"Successfully drew image for {row.get('Seat No', 'Unknown')}")
-        except Exception as e:
-            print(f"Error drawing image for {row.get('Seat No', 'Unknown')}: {e}")
-    else:
-        print(f"No photo or file doesn't exist for {row.get('Seat No', 'Unknown')}: {photo_path}")
-
-    # Exam Center
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y-30, f"Exam Center: {row['Exam Center']}")
-
-    # Signature placeholders
-    c.drawString(50, y-70, "Signature of the Candidate")
-    c.drawString(250, y-70, "Signature of the Principal with seal")
-    c.drawString(450, y-70, "Signature of the Hod")
-
-def generate_hallticket(row, department_name, logo_path, output_dir):
-    filename = f"hallticket_{row['Seat No']}.pdf"
-    filepath = os.path.join(output_dir, filename)
-    
-    c = canvas.Canvas(filepath, pagesize=A4)
-    width, height = A4
-
-    copies = ["STUDENT COPY", "COLLEGE COPY"]
-    y_positions = [height-50, height/2-30]
-
-    for label, y in zip(copies, y_positions):
-        draw_ticket(c, row, y, label, department_name, logo_path)
-        c.setLineWidth(0.5)
-        c.line(40, y-280, width-40, y-280)
-
-    # Footer note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawCentredString(width/2, 30, "Candidate must read the instructions provided in the answer booklet before commencement of examination.")
+            if entry.name.endswith('.pickle') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                storage.unpin(entry.name[:-len('.pickle')])
+        except OSError:
+            continue  # taken or dropped by another request meanwhile
+    path = stream_path(job_id)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'wb') as f:
+        pickle.dump((renderer, records, workers), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, path)
+
+def take_pending_stream(job_id):
+    """The (renderer, records, workers) of a stream job, once, or None if unknown, already downloaded or expired"""
+    path = stream_path(job_id)
+    taken = f"{path}.{os.getpid()}.{threading.get_ident()}.taken"
+    try:
+        os.replace(path, taken)  # only one request, in whichever process, gets to send it
+    except OSError:
+        return None
+    try:
+        if os.path.getmtime(taken) < time.time() - STREAM_TTL:
+            storage.unpin(job_id)
+            return None
+        with open(taken, 'rb') as f:
+            return pickle.load(f)  # written by add_pending_stream into this app's private instance folder
+    finally:
+        os.remove(taken)
+
+def unpin_when_sent(chunks, job_id):
+    """Pass a response's chunks through, releasing the job's pinned sessions once the download ends or is aborted"""
+    try:
+        yield from chunks
+    finally:
+        storage.unpin(job_id)
 
-    c.showPage()
-    c.save()
-    return filename
+def allowed_file(filename, allowed_extensions):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 @app.route('/')
 def index():
@@ -149,166 +145,534 @@ def upload_candidate_images():
         if not uploaded_files or uploaded_files[0].filename == '':
             return jsonify({'error': 'No images uploaded'}), 400
         
-        # Create images directory for this session
-        session_id = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
-        images_dir = os.path.join(UPLOAD_FOLDER, f'images_{session_id}')
-        os.makedirs(images_dir, exist_ok=True)
-        
-        uploaded_images = []
-        for file in uploaded_files:
-            if file and file.filename != '':
-                if allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
-                    # Extract seat number from filename (expected format: SeatNo_Name.ext or SeatNo.ext)
-                    filename = secure_filename(file.filename)
-                    seat_no = filename.split('_')[0].split('.')[0]  # Get seat number from filename
-                    
-                    # Save with seat number as filename
-                    ext = filename.rsplit('.', 1)[1].lower()
-                    new_filename = f"{seat_no}.{ext}"
-                    file_path = os.path.join(images_dir, new_filename)
-                    file.save(file_path)
-                    
-                    # Resize image for better performance
-                    try:
-                        with Image.open(file_path) as img:
-                            # Resize to max 200x200 while maintaining aspect ratio
-                            img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                            img.save(file_path, optimize=True)
-                    except Exception as e:
-                        print(f"Error resizing image {filename}: {e}")
-                    
-                    uploaded_images.append({
-                        'seat_no': seat_no,
-                        'filename': new_filename,
-                        'path': file_path
-                    })
-        
+        # A new session, or more photos for the session_id an earlier upload returned
+        session_id = request.form.get('session_id') or None
+        try:
+            if session_id and not image_sessions.exists(session_id):
+                return jsonify({'error': 'Image session not found'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Decode each upload straight from its stream and thumbnail it (max 200x200) on a thread pool;
+        # files are named by seat number (expected format: SeatNo_Name.ext or SeatNo.ext).
+        # They are staged privately and published together, so a job never sees half an upload
+        started = time.perf_counter()
+        files = [(file.filename, file.stream) for file in uploaded_files if file and file.filename != '']
+        with image_sessions.create(session_id) as (session_id, images_dir):
+            uploaded_images, failed_images = ingest_images(files, images_dir, ALLOWED_IMAGE_EXTENSIONS, IMAGE_WORKERS)
+        for failure in failed_images:
+            logger.warning("Error processing image %s: %s", failure['filename'], failure['error'])
+
         return jsonify({
             'success': True,
             'session_id': session_id,
             'uploaded_count': len(uploaded_images),
-            'images': uploaded_images
+            'images': uploaded_images,
+            'failed_count': len(failed_images),
+            'failed': failed_images,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'workers': IMAGE_WORKERS
         })
     
     except Exception as e:
         return jsonify({'error': f'Error uploading images: {str(e)}'}), 500
 
+def load_photo_index(images_session_id, timer):
+    """Photo index of an uploaded images session ({} without one), marking the session as in use"""
+    if not images_session_id:
+        return {}
+    images_dir = image_sessions.path(images_session_id)
+    if not os.path.exists(images_dir):
+        return {}
+    storage.touch(UPLOAD_FOLDER, os.path.basename(images_dir))  # counts as a use of the session
+    # One directory scan, taken while no upload is adding photos to the session
+    with timer.stage('match'), image_sessions.lock(images_session_id):
+        return build_photo_index(images_dir)
+
+def load_previous_manifest(previous_batch='', manifest_file_path=None):
+    """Manifest of an earlier batch, from an uploaded manifest file or a batch id in the output folder"""
+    if manifest_file_path:
+        return BatchManifest.load(manifest_file_path)
+    if not previous_batch:
+        return None
+    path = manifest_path(OUTPUT_FOLDER, secure_filename(previous_batch))
+    if not os.path.exists(path):
+        raise ValueError(f'No manifest found for previous batch {previous_batch}')
+    return BatchManifest.load(path)
+
+def find_resumable(batch_or_job_id):
+    """Batch id of the checkpointed batch named by a batch id or by the /upload job id that started it, or None"""
+    name = secure_filename(batch_or_job_id)
+    if name and os.path.exists(checkpoint_path(OUTPUT_FOLDER, name)):
+        return name
+    if len(name) != 32:
+        return None
+    # Batch ids end with the first 8 characters of their job id
+    suffix = f"_{name[:8]}{CHECKPOINT_SUFFIX}"
+    journals = sorted(f for f in os.listdir(OUTPUT_FOLDER) if f.startswith('hall_tickets_') and f.endswith(suffix))
+    return journals[-1][:-len(CHECKPOINT_SUFFIX)] if journals else None
+
+def write_changes(results, zipf):
+    """Pass results through, copying newly rendered tickets into `zipf` (the changed-students-only ZIP)"""
+    for result in results:
+        if result['success'] and not result['reused'] and result['data'] is not None:
+            zipf.writestr(result['filename'], result['data'])
+        yield result
+
+def generate_batch(job, excel_path, logo_path, department_name, subject_option, custom_subjects,
+                   images_session_id, workers, delivery='zip', volume_size=0, previous_batch='',
+                   previous_manifest_path=None, workbook=None, resume_batch='', cache=render_cache):
+    """
+    Parse the Excel file (or take `workbook`, already parsed for /preview), match photos, render every ticket and ZIP them (runs as a queued job).
+
+    Unchanged tickets are copied from the render `cache`; None draws every one (as profiling does).
+
+    With `resume_batch` the interrupted ZIP batch of that id is continued: tickets its checkpoint lists are
+    copied from its ZIP when still intact, and only the rest are rendered.
+    """
+    # Stage timings and counters for this run, also added to the /metrics totals
+    timer = metrics.batch()
+
+    # Very large rosters: read, render and ZIP a chunk at a time instead of loading everything first
+    if delivery == 'bounded':
+        return generate_bounded_batch(job, excel_path, logo_path, department_name, subject_option, custom_subjects,
+                                      images_session_id, workers, workbook, timer, cache)
+
+    # Load only the columns a ticket uses
+    with timer.stage('parse'):
+        if workbook is not None:
+            df = workbook.roster()
+        else:
+            try:
+                df = read_roster(excel_path)
+            except Exception as e:
+                raise ValueError(f'Error reading Excel file: {str(e)}')
+
+    # Validate required columns
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f'Missing required columns: {", ".join(missing_columns)}')
+
+    # Handle subjects
+    if subject_option == 'custom' and custom_subjects.strip():
+        subjects_list = [s.strip() for s in custom_subjects.split('\n') if s.strip()]
+        if subjects_list:
+            subjects_string = ", ".join(subjects_list)
+            df['Subjects Applied'] = subjects_string
+    elif 'Subjects Applied' not in df.columns:
+        raise ValueError('No subjects found. Either select Excel subjects or provide custom subjects.')
+
+    job.set_total(len(df))
+    timer.inc('batches')
+
+    # Handle candidate images: one directory scan, then a vectorised seat number lookup
+    photo_index = load_photo_index(images_session_id, timer)
+    if photo_index:
+        with timer.stage('match'):
+            matched_count = apply_photo_index(df, photo_index)
+        logger.info("Matched images for %d of %d students in session %s", matched_count, len(df), images_session_id)
+
+    # Whole-roster checks before anything is drawn: rows with errors are skipped and reported, not rendered
+    with timer.stage('validate'):
+        report = validate_roster(df, known_photos=set(photo_index.values()))
+    validation = report.to_dict()
+
+    renderer = TicketRenderer(department_name, logo_path)
+    # Subjects split, photos resolved, lines formatted - once per column
+    with timer.stage('prepare'):
+        records = prepare_records(df, known_photos=set(photo_index.values()))
+        report.mark(records)
+    timer.count_photos(records)
+    # Shrink photos to the 100pt slot once per source image; derivatives are reused by later runs
+    with timer.stage('resize'):
+        photo_report = photo_derivatives.apply(records)
+
+    # Streaming delivery: render nothing now, /download/stream/<job_id> draws tickets while sending the ZIP
+    if delivery == 'stream':
+        add_pending_stream(job.id, renderer, records, workers)
+        return {
+            'success': True,
+            'message': f'{len(df)} hall tickets are ready to stream',
+            'download_url': f'/download/stream/{job.id}',
+            'total_students': len(df),
+            'generated_count': None,
+            'streaming': True,
+            'photos': photo_report,
+            'validation': validation,
+            'timings': timer.summary()
+        }
+
+    # Diff against the previous batch (keyed on Seat No) so only added and changed students are rendered
+    with timer.stage('diff'):
+        previous = load_previous_manifest(previous_batch, previous_manifest_path)
+        fields = roster_fields(df)
+        diff = diff_roster(renderer, records, fields, previous)
+    previous_outputs = PreviousOutputs(previous, OUTPUT_FOLDER)
+    # The job id keeps two batches started in the same second from overwriting each other's files;
+    # a resumed batch keeps the id of the one it continues
+    batch_id = resume_batch or f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}"
+    incremental = {'batch_id': batch_id, 'manifest_url': f'/download/{batch_id}.manifest.json', 'photos': photo_report}
+    if previous is not None:
+        incremental['diff'] = diff.summary([record.seat_no for record in records])
+        logger.info("Diff against previous batch: %d added, %d changed, %d removed, %d unchanged",
+                    diff.count('added'), diff.count('changed'), len(diff.removed), diff.count('unchanged'))
+
+    checkpoint = None
+    try:
+        # Merged delivery: every student on one canvas (one page each), split into volumes if requested
+        if delivery == 'merged':
+            result = generate_merged(job, renderer, records, fields, diff, previous_outputs, workers, volume_size,
+                                     batch_id, timer)
+            return dict(result, timings=timer.summary(), validation=validation, **incremental)
+
+        # Render each ticket in memory and write it straight into the ZIP (no per-student PDFs on disk);
+        # unchanged students are copied from the previous batch's ZIP, or the render cache, instead of redrawn
+        zip_filename = f"{batch_id}.zip"
+        zip_path = os.path.join(OUTPUT_FOLDER, zip_filename)
+        # Each ticket is journaled as it goes into the ZIP; resuming reads the intact ones back from the interrupted ZIP
+        interrupted = None
+        if resume_batch and os.path.exists(zip_path):
+            interrupted = f"{zip_path}.interrupted"
+            os.replace(zip_path, interrupted)
+        checkpoint = Checkpoint.open(checkpoint_path(OUTPUT_FOLDER, batch_id), diff, bool(resume_batch),
+                                     archive=interrupted)
+        results = iter_incremental(renderer, records, diff, previous_outputs, workers=workers, progress=job.record,
+                                   cache=cache, checkpoint=checkpoint)
+        # Waiting on the workers counts as render time, the rest of the loop as zip time
+        results = timer.tally(timer.timed(results, 'render'))
+        with timer.stage('zip'):
+            if previous is not None:
+                # Alongside the full ZIP, a ZIP of just the added and changed students' tickets
+                changes_filename = f"{batch_id}_changes.zip"
+                with zipfile.ZipFile(os.path.join(OUTPUT_FOLDER, changes_filename), 'w') as changes_zip:
+                    results = write_zip(write_changes(results, changes_zip), zip_path, checkpoint)
+                incremental['changes_url'] = f'/download/{changes_filename}'
+            else:
+                results = write_zip(results, zip_path, checkpoint)
+        if interrupted:
+            os.remove(interrupted)
+    finally:
+        previous_outputs.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    with timer.stage('save'):
+        BatchManifest.build(renderer, records, fields, diff, results, {'kind': 'zip', 'archive': zip_filename}).save(
+            manifest_path(OUTPUT_FOLDER, batch_id))
+    generated_count = sum(1 for r in results if r['success'])
+    cached_count = sum(1 for r in results if r.get('cached'))
+    reused_count = sum(1 for r in results if r.get('reused'))
+    failed = [{'seat_no': r['seat_no'], 'error': r['error']} for r in results if not r['success']]
+    for r in results:
+        if not r['success'] and not r.get('skipped'):
+            logger.warning("Error generating ticket for %s: %s", r['seat_no'], r['error'])
+
+    return dict({
+        'success': True,
+        'message': f'Successfully generated {generated_count} hall tickets',
+        'download_url': f'/download/{zip_filename}',
+        'total_students': len(df),
+        'generated_count': generated_count,
+        'cached_count': cached_count,
+        'reused_count': reused_count,
+        'resumed_count': checkpoint.resumed,
+        'failed_count': len(failed),
+        'failed': failed,
+        'workers': resolve_workers(workers),
+        'timings': timer.summary(),
+        'validation': validation
+    }, **incremental)
+
+def generate_bounded_batch(job, excel_path, logo_path, department_name, subject_option, custom_subjects,
+                           images_session_id, workers, workbook, timer, cache=render_cache):
+    """ZIP delivery within the HALLTICKET_MEMORY_MB / HALLTICKET_DISK_MB budget; not diffed against earlier batches"""
+    # A previewed workbook is streamed from its file too, unless it has already been parsed
+    roster = workbook.source() if workbook is not None else excel_path
+    if isinstance(roster, str):
+        # Header and row count only; the rows themselves are read chunk by chunk while rendering
+        try:
+            preview = preview_roster(roster, nrows=0)
+        except Exception as e:
+            raise ValueError(f'Error reading Excel file: {str(e)}')
+        columns, total = preview['columns'], preview['row_count']
+    else:
+        columns, total = list(roster.columns), len(roster)
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise ValueError(f'Missing required columns: {", ".join(missing_columns)}')
+    subjects = None
+    if subject_option == 'custom' and custom_subjects.strip():
+        subjects = ", ".join(s.strip() for s in custom_subjects.split('\n') if s.strip()) or None
+    if subjects is None and 'Subjects Applied' not in columns:
+        raise ValueError('No subjects found. Either select Excel subjects or provide custom subjects.')
+
+    job.set_total(total)
+    timer.inc('batches')
+    photo_index = load_photo_index(images_session_id, timer)
+
+    batch_id = f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}"
+    zip_filename = f"{batch_id}.zip"
+    renderer = TicketRenderer(department_name, logo_path)
+    summary = generate_bounded(renderer, roster, os.path.join(OUTPUT_FOLDER, zip_filename), Budget(), subjects,
+                               photo_index, workers, progress=job.record, cache=cache, timer=timer)
+    for failure in summary['failed']:
+        logger.warning("Error generating ticket for %s: %s", failure['seat_no'], failure['error'])
+
+    return dict(summary, **{
+        'success': True,
+        'message': f"Successfully generated {summary['generated_count']} hall tickets",
+        'download_url': f'/download/{zip_filename}',
+        'batch_id': batch_id,
+        'workers': resolve_workers(workers),
+        'timings': timer.summary()
+    })
+
+def generate_merged(job, renderer, records, fields, diff, previous_outputs, workers, volume_size, batch_id, timer):
+    """Render one multi-page PDF for bulk printing; several volumes are packaged into a ZIP"""
+    volumes = []
+    results = []
+    # Unchanged volumes are copied from the previous batch; in the others, unchanged pages are spliced in
+    merged = iter_volumes_incremental(renderer, records, diff, previous_outputs, volume_size, workers, job.record)
+    for number, data, volume_results, digest in timer.timed(merged, 'render'):
+        volumes.append((data, digest, all(r['reused'] for r in volume_results)))
+        results.extend(timer.tally(volume_results))
+
+    if len(volumes) == 1:
+        download_name = volume_filename(batch_id, 1, 1)
+        with timer.stage('save'):
+            with open(os.path.join(OUTPUT_FOLDER, download_name), 'wb') as f:
+                f.write(volumes[0][0])
+        outputs = {'archive': None, 'volumes': [{'filename': download_name, 'digest': volumes[0][1]}]}
+    else:
+        download_name = f"{batch_id}.zip"
+        outputs = {'archive': download_name, 'volumes': []}
+        with timer.stage('zip'), zipfile.ZipFile(os.path.join(OUTPUT_FOLDER, download_name), 'w') as zipf:
+            for number, (data, digest, reused) in enumerate(volumes, 1):
+                filename = volume_filename("hall_tickets", number, len(volumes))
+                zipf.writestr(filename, data)
+                outputs['volumes'].append({'filename': filename, 'digest': digest})
+    outputs.update(kind='merged', volume_size=volume_size or 0)
+    with timer.stage('save'):
+        BatchManifest.build(renderer, records, fields, diff, results, outputs).save(manifest_path(OUTPUT_FOLDER, batch_id))
+
+    generated_count = sum(1 for r in results if r['success'])
+    failed = [{'seat_no': r['seat_no'], 'error': r['error']} for r in results if not r['success']]
+    return {
+        'success': True,
+        'message': f'Successfully generated {generated_count} hall tickets in {len(volumes)} merged PDF(s)',
+        'download_url': f'/download/{download_name}',
+        'total_students': len(records),
+        'generated_count': generated_count,
+        'reused_count': sum(1 for r in results if r['reused']),
+        'rerendered_volumes': [number for number, (data, digest, reused) in enumerate(volumes, 1) if not reused],
+        'failed_count': len(failed),
+        'failed': failed,
+        'volumes': len(volumes),
+        'workers': resolve_workers(workers)
+    }
+
+def generate_profiled(job, *args):
+    """
+    generate_batch under cProfile, with the render cache off so every ticket is drawn in the profile.
+    The stats file joins the batch's own files in the output folder (evicted with them) and the
+    hottest functions go into the result
+    """
+    def profile_path(result):
+        # A stream has no batch yet: its profile is named after the job
+        return os.path.join(OUTPUT_FOLDER, f"{result.get('batch_id') or f'profile_{job.id}'}{PROFILE_SUFFIX}")
+
+    result, summary = profile_run(generate_batch, job, *args, cache=None, path=profile_path)
+    if 'profile_path' in summary:
+        summary['profile_path'] = os.path.basename(summary['profile_path'])
+        summary['profile_url'] = f"/download/{summary['profile_path']}"
+    return dict(result, profile=summary)
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
+        # A workbook_token from /preview stands in for the Excel file: no re-upload, no re-parse
+        workbook_token = request.form.get('workbook_token', '')
+        workbook = workbook_cache.get(workbook_token) if workbook_token else None
+
         # Check if files are present
-        if 'excel_file' not in request.files:
+        if workbook is None and 'excel_file' not in request.files:
+            if workbook_token:
+                return jsonify({'error': 'Preview expired, please upload the Excel file again',
+                                'workbook_expired': True}), 410
             return jsonify({'error': 'No Excel file uploaded'}), 400
-        
-        excel_file = request.files['excel_file']
+
+        excel_file = request.files.get('excel_file')
         logo_file = request.files.get('logo_file')
         department_name = request.form.get('department_name', 'INFORMATION SCIENCE ENGINEERING')
         subject_option = request.form.get('subject_option', 'excel')
         custom_subjects = request.form.get('custom_subjects', '')
         images_session_id = request.form.get('images_session_id', '')
-
-        if excel_file.filename == '':
-            return jsonify({'error': 'No Excel file selected'}), 400
-
-        if not allowed_file(excel_file.filename, ALLOWED_EXTENSIONS):
-            return jsonify({'error': 'Invalid Excel file format. Please use .xlsx or .xls'}), 400
-
-        # Save Excel file
-        excel_filename = secure_filename(excel_file.filename)
-        excel_path = os.path.join(UPLOAD_FOLDER, excel_filename)
-        excel_file.save(excel_path)
-
-        # Save logo file if provided
-        logo_path = None
-        if logo_file and logo_file.filename != '':
-            if allowed_file(logo_file.filename, ALLOWED_IMAGE_EXTENSIONS):
-                logo_filename = secure_filename(logo_file.filename)
-                logo_path = os.path.join(UPLOAD_FOLDER, logo_filename)
-                logo_file.save(logo_path)
-
-        # Load Excel data
-        try:
-            df = pd.read_excel(excel_path)
-        except Exception as e:
-            return jsonify({'error': f'Error reading Excel file: {str(e)}'}), 400
-
-        # Validate required columns
-        required_columns = ['Seat No', 'Exam No', 'Name', 'Date', 'Exam Center']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return jsonify({'error': f'Missing required columns: {", ".join(missing_columns)}'}), 400
-
-        # Handle subjects
-        if subject_option == 'custom' and custom_subjects.strip():
-            subjects_list = [s.strip() for s in custom_subjects.split('\n') if s.strip()]
-            if subjects_list:
-                subjects_string = ", ".join(subjects_list)
-                df['Subjects Applied'] = subjects_string
-        elif 'Subjects Applied' not in df.columns:
-            return jsonify({'error': 'No subjects found. Either select Excel subjects or provide custom subjects.'}), 400
-
-        # Handle candidate images
+        workers = request.form.get('workers') or RENDER_WORKERS
+        wait = request.form.get('wait', '').lower() in ('1', 'true', 'yes')
+        delivery = request.form.get('delivery', 'zip')  # 'zip', 'stream', 'merged' or 'bounded' (low-memory ZIP)
+        if workbook is not None and delivery != 'bounded':
+            workbook_cache.prefetch(workbook)  # usually done already, while the user read the preview
+        volume_size = request.form.get('volume_size', type=int) or 0  # pages per merged volume, 0 = one file
+        previous_batch = request.form.get('previous_batch', '')  # batch_id of an earlier run to diff against
+        previous_manifest = request.files.get('previous_manifest')
+        resume = request.form.get('resume', '')  # batch_id (or job_id) of an interrupted ZIP batch to continue
+        # ?profile=1 profiles the run; rendering is serial so the drawing happens in the profiled thread
+        profile = (request.args.get('profile') or request.form.get('profile', '')).lower() in ('1', 'true', 'yes')
+        if profile:
+            workers = 1
         if images_session_id:
-            images_dir = os.path.join(UPLOAD_FOLDER, f'images_{images_session_id}')
-            if os.path.exists(images_dir):
-                # Map seat numbers to image paths
-                for index, row in df.iterrows():
-                    seat_no = str(row['Seat No'])
-                    # Look for image files with this seat number
-                    for ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
-                        img_path = os.path.join(images_dir, f"{seat_no}.{ext}")
-                        if os.path.exists(img_path):
-                            df.at[index, 'Photo Path'] = img_path
-                            print(f"Matched image for {seat_no}: {img_path}")
-                            break
-                    else:
-                        print(f"No image found for seat number: {seat_no}")
-
-        # Create output directory for this session
-        session_dir = os.path.join(OUTPUT_FOLDER, f"session_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}")
-        os.makedirs(session_dir, exist_ok=True)
-
-        # Generate hall tickets
-        generated_files = []
-        for _, row in df.iterrows():
             try:
-                filename = generate_hallticket(row, department_name, logo_path, session_dir)
-                generated_files.append(filename)
-            except Exception as e:
-                print(f"Error generating ticket for {row.get('Name', 'Unknown')}: {e}")
-
-        # Create ZIP file
-        zip_filename = f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        zip_path = os.path.join(OUTPUT_FOLDER, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for filename in generated_files:
-                file_path = os.path.join(session_dir, filename)
-                if os.path.exists(file_path):
-                    zipf.write(file_path, filename)
-
+                images_session_id = check_session_id(images_session_id)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        resume_batch = ''
+        if resume:
+            if delivery != 'zip':
+                return jsonify({'error': 'Only ZIP deliveries can be resumed'}), 400
+            resume_batch = find_resumable(resume)
+            if resume_batch is None:
+                return jsonify({'error': f'No checkpoint found for {resume}'}), 404
+            storage.touch(OUTPUT_FOLDER, resume_batch)  # not evicted before the job picks it up
+
+        if workbook is None:
+            if excel_file.filename == '':
+                return jsonify({'error': 'No Excel file selected'}), 400
+
+            if not allowed_file(excel_file.filename, ALLOWED_EXTENSIONS):
+                return jsonify({'error': 'Invalid roster file format. Please use .xlsx, .xls, .csv or .parquet'}), 400
+
+        # This request's files go into a folder of their own, so two coordinators uploading
+        # students.xlsx at the same moment never overwrite each other's roster or logo
+        excel_filename = logo_filename = manifest_filename = None
+        with upload_sessions.create() as (upload_id, staging):
+            # Save Excel file
+            if workbook is None:
+                excel_filename = secure_filename(excel_file.filename)
+                excel_file.save(os.path.join(staging, excel_filename))
+
+            # Save logo file if provided
+            if logo_file and logo_file.filename != '':
+                if allowed_file(logo_file.filename, ALLOWED_IMAGE_EXTENSIONS):
+                    logo_filename = secure_filename(logo_file.filename)
+                    logo_file.save(os.path.join(staging, logo_filename))
+
+            # An uploaded manifest from an earlier run replaces previous_batch
+            if previous_manifest and previous_manifest.filename != '':
+                manifest_filename = secure_filename(previous_manifest.filename)
+                previous_manifest.save(os.path.join(staging, manifest_filename))
+
+        upload_dir = upload_sessions.path(upload_id)
+        excel_path = os.path.join(upload_dir, excel_filename) if excel_filename else None
+        logo_path = os.path.join(upload_dir, logo_filename) if logo_filename else None
+        previous_manifest_path = os.path.join(upload_dir, manifest_filename) if manifest_filename else None
+
+        job_args = (excel_path, logo_path, department_name, subject_option, custom_subjects,
+                    images_session_id, workers, delivery, volume_size, previous_batch, previous_manifest_path, workbook,
+                    resume_batch)
+
+        generate = generate_profiled if profile else generate_batch
+
+        # Everything the job reads stays pinned, so no process's storage sweeper evicts it mid-run
+        job = job_queue.create()
+        pins = [(UPLOAD_FOLDER, os.path.basename(upload_dir))]
+        if images_session_id:
+            pins.append((UPLOAD_FOLDER, os.path.basename(image_sessions.path(images_session_id))))
+        if workbook is not None:
+            pins.append((UPLOAD_FOLDER, os.path.basename(workbook.path)))
+        for batch in (secure_filename(previous_batch), resume_batch):
+            if batch:
+                pins.append((OUTPUT_FOLDER, batch))
+        pin_sessions(job.id, pins)
+
+        # wait=true keeps the old blocking behaviour for scripts that expect the result inline
+        if wait:
+            job_queue.execute(run_pinned, generate, *job_args, job=job)
+            if job.error:
+                return jsonify({'error': job.error, 'job_id': job.id}), 400
+            return jsonify(dict(job.result, job_id=job.id))
+
+        job_queue.submit(run_pinned, generate, *job_args, job=job)
         return jsonify({
             'success': True,
-            'message': f'Successfully generated {len(generated_files)} hall tickets',
-            'download_url': f'/download/{zip_filename}',
-            'total_students': len(df),
-            'generated_count': len(generated_files)
-        })
+            'job_id': job.id,
+            'status_url': f'/jobs/{job.id}'
+        }), 202
 
     except Exception as e:
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = job_queue.status(job_id)  # the job may be running in another worker process
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
         file_path = os.path.join(OUTPUT_FOLDER, filename)
         if os.path.exists(file_path):
+            storage.touch(OUTPUT_FOLDER, filename)  # downloaded batches count as recently used
             return send_file(file_path, as_attachment=True, download_name=filename)
         else:
             return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': f'Download error: {str(e)}'}), 500
 
+@app.route('/download/stream/<job_id>')
+def download_stream(job_id):
+    pending = take_pending_stream(job_id)
+    if pending is None:
+        return jsonify({'error': 'Stream not found, expired or already downloaded'}), 404
+
+    renderer, records, workers = pending
+    zip_filename = f"hall_tickets_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    timer = metrics.batch()
+    chunks = stream_zip(timer.tally(timer.timed(renderer.iter_render(records, workers=workers, cache=render_cache),
+                                                'render')))
+    chunks = unpin_when_sent(chunks, job_id)  # the photos are read while the ZIP is drawn
+    return Response(chunks, mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={zip_filename}'})
+
+@app.route('/stats/image_cache')
+def image_cache_stats():
+    """Logo cache counters for this web process (worker processes keep their own caches)"""
+    return jsonify(image_cache.stats())
+
+@app.route('/stats/render_cache')
+def render_cache_stats():
+    """Render cache counters for this web process (the cached files are shared by all processes)"""
+    return jsonify(render_cache.stats())
+
+@app.route('/stats/workbook_cache')
+def workbook_cache_stats():
+    """Counters for rosters kept between /preview and /upload"""
+    return jsonify(workbook_cache.stats())
+
+@app.route('/admin/storage')
+def storage_usage():
+    """Size, quota, TTL and evictions of output/ and uploads/, as of the sweeper's last pass"""
+    return jsonify(storage.usage())
+
+@app.route('/admin/storage/sweep', methods=['POST'])
+def storage_sweep():
+    """Ask the background sweeper to run now; the request returns without waiting for it"""
+    storage.wake()
+    return jsonify({'success': True, 'status_url': '/admin/storage'}), 202
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timings, ticket counters, cache and job stats of this web process in Prometheus text format"""
+    caches = {'render': render_cache.stats(), 'image': image_cache.stats(), 'workbook': workbook_cache.stats()}
+    jobs = job_queue.stats()
+    usage = storage.usage()['directories']
+    gauges = {'jobs': ('Jobs known to the queue, by status', 'status', jobs['jobs']),
+              'storage_bytes': ('Bytes in each managed directory, as of the last sweep', 'directory',
+                                {area['directory']: area['size_bytes'] or 0 for area in usage})}
+    return Response(metrics.prometheus(caches, gauges), mimetype='text/plain; version=0.0.4')
+
 @app.route('/preview', methods=['POST'])
 def preview_excel():
     try:
@@ -319,23 +683,30 @@ def preview_excel():
         if excel_file.filename == '':
             return jsonify({'error': 'No Excel file selected'}), 400
 
-        # Save temporary file
-        temp_filename = secure_filename(excel_file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f"temp_{temp_filename}")
-        excel_file.save(temp_path)
+        # Keep the file: it is parsed in the background and /upload can reuse it via the token
+        workbook = workbook_cache.add(secure_filename(excel_file.filename), excel_file.save)
 
-        # Read Excel file
-        df = pd.read_excel(temp_path)
-        
-        # Clean up temp file
-        os.remove(temp_path)
-
-        # Return preview data
-        preview_data = {
-            'columns': list(df.columns),
-            'row_count': len(df),
-            'sample_data': df.head(3).to_dict('records')
-        }
+        # Read the header and first rows only (plus a row count), not the whole workbook
+        preview_data = preview_roster(workbook.path)
+        preview_data['workbook_token'] = workbook.token
+        preview_data['missing_columns'] = [col for col in REQUIRED_COLUMNS if col not in preview_data['columns']]
+
+        # Only the first rows are checked here, read like the sample; the job checks the whole roster.
+        # With an images_session_id, photos are checked against that upload as generation would
+        df = read_roster(workbook.path, nrows=PREVIEW_CHECK_ROWS)
+        images_session_id = request.form.get('images_session_id', '')
+        if images_session_id:
+            try:
+                photo_index = load_photo_index(check_session_id(images_session_id), metrics.batch())
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            apply_photo_index(df, photo_index)
+        else:
+            photo_index = {}
+        preview_data['validation'] = validate_roster(df, known_photos=set(photo_index.values())).to_dict()
+        preview_data['validation']['complete'] = len(df) >= preview_data['row_count']
+        if preview_data['row_count'] <= PREFETCH_MAX_ROWS:
+            workbook_cache.prefetch(workbook)
 
         return jsonify(preview_data)
 
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Benchmark the whole generation pipeline on synthetic rosters and write the timings as JSON for regression tracking
+
+Usage: python benchmark_pipeline.py --sizes 100,1000,10000,50000 --workers 4 --output bench.json
+       python benchmark_pipeline.py --sizes 50000 --bounded --memory-mb 512   (fails if peak RSS passes the budget)
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import pandas as pd
+from PIL import Image, ImageDraw
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from hallticket import (TicketRenderer, LAYOUT_VERSION, PhotoDerivatives, BatchTimer, read_roster, build_photo_index,
+                        apply_photo_index, prepare_records, resolve_workers, write_zip, Budget, generate_bounded,
+                        peak_rss_mb)
+
+DEFAULT_SIZES = "100,1000"
+SAVE_SAMPLE = 200  # tickets timed draw-vs-save serially for the PDF save stage
+
+# Synthetic data
+
+def make_photo(path, index, size):
+    """A JPEG with smooth noise, so it compresses like a photo rather than a flat colour"""
+    noise = Image.effect_noise((size[0] // 16, size[1] // 16), 64).resize(size, Image.Resampling.BICUBIC)
+    tint = Image.new('RGB', size, ((index * 53) % 256, (index * 97) % 256, (index * 31) % 256))
+    img = Image.blend(Image.merge('RGB', (noise, noise, noise)), tint, 0.4)
+    ImageDraw.Draw(img).text((20, 20), f"Photo {index}", fill=(0, 0, 0))
+    img.save(path, 'JPEG', quality=90)
+
+def make_roster(rows, directory, roster_format, distinct_photos, photo_size, photo_ratio):
+    """Write a roster file and a photo directory (one SeatNo.jpg per photographed student) into `directory`"""
+    seats = [f"3GN21CS{i:05d}" for i in range(rows)]
+    df = pd.DataFrame({
+        'Seat No': seats,
+        'Exam No': [f"E{236000 + i}" for i in range(rows)],
+        'Name': [f"Student {i}" for i in range(rows)],
+        'Date': ["14-05-2025"] * rows,
+        'Subjects Applied': ["21CS81 - Machine Learning, 21CS82 - Software Engineering, 21CS83, 21CS84"] * rows,
+        'Exam Center': ["GN"] * rows,
+    })
+    roster_path = os.path.join(directory, f"roster.{roster_format}")
+    if roster_format == 'csv':
+        df.to_csv(roster_path, index=False)
+    else:
+        df.to_excel(roster_path, index=False)
+
+    # A few distinct source photos, hard-linked (or copied) under every seat number that has one
+    sources = os.path.join(directory, "sources")
+    images = os.path.join(directory, "images")
+    os.makedirs(sources)
+    os.makedirs(images)
+    originals = []
+    for index in range(max(1, min(distinct_photos, rows))):
+        path = os.path.join(sources, f"photo_{index}.jpg")
+        make_photo(path, index, photo_size)
+        originals.append(path)
+    photographed = int(rows * photo_ratio)
+    for i, seat in enumerate(seats[:photographed]):
+        target = os.path.join(images, f"{seat}.jpg")
+        try:
+            os.link(originals[i % len(originals)], target)
+        except OSError:
+            shutil.copyfile(originals[i % len(originals)], target)
+    return roster_path, images
+
+# Measurement helpers
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def pdf_sizes(results, sizes):
+    """Pass results through, noting the size of each rendered PDF"""
+    for result in results:
+        if result['data'] is not None:
+            sizes.append(len(result['data']))
+        yield result
+
+def time_pdf_save(renderer, records):
+    """Split per-ticket cost into drawing and canvas.save() on a serial sample"""
+    draw = save = 0.0
+    for record in records:
+        c = canvas.Canvas(io.BytesIO(), pagesize=A4)
+        start = time.perf_counter()
+        renderer.draw_page(c, record)
+        c.showPage()
+        middle = time.perf_counter()
+        c.save()
+        draw += middle - start
+        save += time.perf_counter() - middle
+    count = max(1, len(records))
+    return {'sample': len(records), 'draw_ms': round(draw / count * 1000, 3), 'save_ms': round(save / count * 1000, 3)}
+
+# One roster size
+
+def synthesise(rows, options):
+    """Write a roster of `rows` students and their photos into a new work directory"""
+    workdir = tempfile.mkdtemp(prefix=f"hallticket_bench_{rows}_", dir=options['workdir'])
+    started = time.perf_counter()
+    roster_path, images_dir = make_roster(rows, workdir, options['format'], options['distinct_photos'],
+                                          options['photo_size'], options['photo_ratio'])
+    return workdir, roster_path, images_dir, time.perf_counter() - started
+
+def run_pipeline(workdir, roster_path, images_dir, options, timer, sizes):
+    """Every stage on the whole roster at once, as the web app's ZIP delivery does"""
+    with timer.stage('parse'):
+        df = read_roster(roster_path)
+    with timer.stage('match'):
+        photo_index = build_photo_index(images_dir)
+        apply_photo_index(df, photo_index)
+    with timer.stage('prepare'):
+        records = prepare_records(df, known_photos=set(photo_index.values()))
+    timer.count_photos(records)
+    # A fresh derivative directory, so photos are really resized rather than found in an earlier run's cache
+    derivatives = PhotoDerivatives(directory=os.path.join(workdir, "derivatives"))
+    with timer.stage('resize'):
+        photo_report = derivatives.apply(records)
+
+    renderer = TicketRenderer("COMPUTER SCIENCE ENGINEERING", options['logo'])
+    # Waiting on the workers counts as render time, the rest as zip time
+    rendered = timer.timed(renderer.iter_render(records, workers=options['workers']), 'render')
+    with timer.stage('zip'):
+        results = write_zip(pdf_sizes(timer.tally(rendered), sizes), os.path.join(workdir, "hall_tickets.zip"))
+    latencies = [r['elapsed_ms'] for r in results if r['success']]
+    return latencies, len(results) - len(latencies), photo_report, time_pdf_save(renderer, records[:SAVE_SAMPLE])
+
+def run_bounded(workdir, roster_path, images_dir, options, timer, sizes):
+    """The roster streamed in chunks within a memory budget (generate_bounded)"""
+    with timer.stage('match'):
+        photo_index = build_photo_index(images_dir)
+    latencies = []
+
+    def measure(result):
+        if result['success']:
+            latencies.append(result['elapsed_ms'])
+            sizes.append(len(result['data']))
+
+    renderer = TicketRenderer("COMPUTER SCIENCE ENGINEERING", options['logo'])
+    summary = generate_bounded(renderer, roster_path, os.path.join(workdir, "hall_tickets.zip"),
+                               Budget(options['memory_mb']), photo_index=photo_index, workers=options['workers'],
+                               progress=measure, timer=timer,
+                               derivatives=PhotoDerivatives(directory=os.path.join(workdir, "derivatives")))
+    return latencies, summary['failed_count'], summary['photos'], None
+
+def run_size(rows, data, options):
+    """Run every pipeline stage on a synthesised roster of `rows` students; returns the result dict"""
+    workdir, roster_path, images_dir, synth_seconds = data
+    timer = BatchTimer()
+    sizes = []
+    run = run_bounded if options['bounded'] else run_pipeline
+    latencies, failed, photo_report, pdf_save = run(workdir, roster_path, images_dir, options, timer, sizes)
+    stages = timer.summary()['stages_seconds']
+    batch_seconds = stages.get('render', 0) + stages.get('zip', 0)
+
+    generated = len(latencies)
+    pipeline_seconds = sum(timer.stages.values())
+    own_rss, children_rss = peak_rss_mb()
+    return {
+        'students': rows,
+        'generated': generated,
+        'failed': failed,
+        'photos_matched': timer.counters['photo_hits'],
+        'workers': resolve_workers(options['workers']),
+        'bounded': options['bounded'],
+        'synthesis_seconds': round(synth_seconds, 3),
+        'stages_seconds': stages,
+        'pipeline_seconds': round(pipeline_seconds, 3),
+        'tickets_per_second': round(generated / batch_seconds, 1) if batch_seconds else None,
+        'end_to_end_tickets_per_second': round(generated / pipeline_seconds, 1) if pipeline_seconds else None,
+        'ticket_latency_ms': {'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+                              'max': max(latencies) if latencies else None},
+        'pdf_save': pdf_save,
+        'peak_rss_mb': own_rss,
+        'peak_worker_rss_mb': children_rss,
+        'output_bytes': {'zip': os.path.getsize(os.path.join(workdir, "hall_tickets.zip")), 'pdfs': sum(sizes),
+                         'per_ticket': round(sum(sizes) / generated) if generated else None,
+                         'photo_source': photo_report['source_bytes'],
+                         'photo_embedded': photo_report['embedded_bytes']},
+    }
+
+def run_isolated(rows, options):
+    # Synthesis and measurement each get a fresh process, so a size's peak RSS is its pipeline's own -
+    # not the synthetic roster's, nor left over from a smaller run
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        data = pool.submit(synthesise, rows, options).result()
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(run_size, rows, data, options).result()
+    finally:
+        if not options['keep']:
+            shutil.rmtree(data[0], ignore_errors=True)
+
+# Reporting
+
+def environment():
+    """What the numbers were measured on, so JSON files from different versions can be compared"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'layout_version': LAYOUT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def print_result(result):
+    stages = result['stages_seconds']
+    latency = result['ticket_latency_ms']
+    print(f"\n📊 {result['students']} students ({result['generated']} generated, {result['failed']} failed, "
+          f"{result['workers']} worker(s){', bounded' if result['bounded'] else ''})")
+    for name, seconds in stages.items():
+        print(f"   {name:<12} {seconds:8.3f}s")
+    print(f"   throughput   {result['tickets_per_second']} tickets/s rendering, "
+          f"{result['end_to_end_tickets_per_second']} tickets/s end to end")
+    save = f" (of which PDF save ≈ {result['pdf_save']['save_ms']} ms)" if result['pdf_save'] else ''
+    print(f"   latency      p50 {latency['p50']} ms, p95 {latency['p95']} ms per ticket{save}")
+    print(f"   peak RSS     {result['peak_rss_mb']} MB main, {result['peak_worker_rss_mb']} MB largest worker")
+    print(f"   output       {result['output_bytes']['zip'] / 1024 / 1024:.1f} MB ZIP, "
+          f"{result['output_bytes']['per_ticket'] / 1024:.1f} KB per ticket")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"comma-separated roster sizes (default {DEFAULT_SIZES}; e.g. 100,1000,10000,50000)")
+    parser.add_argument('--workers', type=int, default=None, help="render worker processes (default: HALLTICKET_WORKERS or CPU count)")
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help="roster file format")
+    parser.add_argument('--distinct-photos', type=int, default=50, help="distinct source photos, shared by all students")
+    parser.add_argument('--photo-size', default='1200x1600', help="source photo size in pixels, WxH")
+    parser.add_argument('--photo-ratio', type=float, default=0.9, help="fraction of students with a photo")
+    parser.add_argument('--logo', default='logo.jpg' if os.path.exists('logo.jpg') else None, help="logo image")
+    parser.add_argument('--workdir', default=None, help="where synthetic data is written (default: system temp dir)")
+    parser.add_argument('--keep', action='store_true', help="keep the synthetic data and ZIPs")
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    parser.add_argument('--bounded', action='store_true', help="stream the roster in chunks (generate_bounded)")
+    parser.add_argument('--memory-mb', type=int, default=None,
+                        help="memory budget for --bounded (default: HALLTICKET_MEMORY_MB or 512)")
+    parser.add_argument('--max-rss-mb', type=float, default=None,
+                        help="exit with status 1 if a size's peak RSS passes this (default with --bounded: the budget)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    width, height = (int(value) for value in args.photo_size.lower().split('x'))
+    options = {'workers': args.workers, 'format': args.format, 'distinct_photos': args.distinct_photos,
+               'photo_size': (width, height), 'photo_ratio': args.photo_ratio,
+               'logo': os.path.abspath(args.logo) if args.logo else None, 'workdir': args.workdir, 'keep': args.keep,
+               'bounded': args.bounded, 'memory_mb': args.memory_mb}
+    max_rss = args.max_rss_mb
+    if max_rss is None and args.bounded:
+        max_rss = Budget(args.memory_mb).memory_mb
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    print("⏱️ Hall ticket pipeline benchmark")
+    report = {'environment': environment(), 'options': dict(options, photo_size=args.photo_size), 'results': []}
+    for rows in sizes:
+        result = run_isolated(rows, options)
+        report['results'].append(result)
+        print_result(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    # Peak RSS of the main process, the one a memory budget constrains
+    over = [result for result in report['results']
+            if max_rss is not None and result['peak_rss_mb'] is not None and result['peak_rss_mb'] > max_rss]
+    for result in over:
+        print(f"❌ {result['students']} students peaked at {result['peak_rss_mb']} MB, over the {max_rss} MB limit")
+    return 1 if over else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
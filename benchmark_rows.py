@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-row preparation overhead: the old iterrows draw-loop work vs prepare_records
+"""
+
+import argparse
+import os
+import pickle
+import time
+import pandas as pd
+from hallticket import TicketRecord, prepare_records, dataframe_to_records
+
+def make_roster(rows, photo_dir="photos"):
+    """Synthetic roster shaped like dummy_students.xlsx, with a mix of present, missing and empty photos"""
+    photos = [os.path.join(photo_dir, name) for name in sorted(os.listdir(photo_dir))] if os.path.isdir(photo_dir) else []
+    photo_cycle = photos + [os.path.join(photo_dir, "missing.jpg"), None, ""]
+    return pd.DataFrame({
+        'Seat No': [f"3GN21CS{i:05d}" for i in range(rows)],
+        'Exam No': [f"E{236000 + i}" for i in range(rows)],
+        'Name': [f"Student {i}" for i in range(rows)],
+        'Date': ["14-05-2025"] * rows,
+        'Exam Center': ["GN"] * rows,
+        'Subjects Applied': ["21CS81 - Machine Learning, 21CS82 - Software Engineering, 21CS83, 21CS84"] * rows,
+        'Photo Path': [photo_cycle[i % len(photo_cycle)] for i in range(rows)],
+    })
+
+def prepare_with_iterrows(df):
+    """What every entry point used to do per row inside the draw loop"""
+    prepared = []
+    for _, row in df.iterrows():
+        subjects = [sub.strip() for sub in str(row['Subjects Applied']).split(",")]
+        photo_path = row.get('Photo Path', '')
+        has_photo = pd.notna(photo_path) and str(photo_path).strip() != '' and os.path.exists(str(photo_path))
+        details = f"1. UNIVERSITY SEAT NO.: {row['Seat No']}     No: {row['Exam No']}     Date: {row['Date']}"
+        name = f"2. NAME OF THE CANDIDATE: {row['Name']}"
+        center = f"Exam Center: {row['Exam Center']}"
+        prepared.append((details, name, center, subjects, photo_path if has_photo else None))
+    return prepared
+
+def touch_records(records):
+    # The attribute reads the render loop does, without the drawing
+    for record in records:
+        record.details_line, record.name_line, record.center_line, record.subjects, record.photo_path
+
+def _fields(record):
+    return tuple(getattr(record, name) for name in TicketRecord.__slots__)
+
+def timed(func, *args, repeat=3):
+    """Best wall time of `repeat` runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time per-row preparation: the old iterrows loop vs prepare_records")
+    parser.add_argument('rows', nargs='?', type=int, default=10000, help="synthetic roster rows (default 10000)")
+    parser.add_argument('--photo-dir', default="photos", help="photos to cycle through in the roster (default photos/)")
+    args = parser.parse_args(argv)
+    if args.rows < 1:
+        parser.error("rows must be at least 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = args.rows
+    df = make_roster(rows, args.photo_dir)
+    print(f"📊 Per-row preparation overhead on {rows} synthetic rows")
+
+    # Both paths must produce the same strings before their timings mean anything
+    records = prepare_records(df)
+    for record, (details, name, center, subjects, photo) in zip(records, prepare_with_iterrows(df)):
+        assert (record.details_line, record.name_line, record.center_line, list(record.subjects), record.photo_path) == \
+               (details, name, center, subjects, photo), record
+    sample = df.head(50).to_dict('records')
+    for raw, record in zip(sample, records):
+        assert _fields(TicketRecord.from_row(raw)) == _fields(record), record
+
+    before = timed(prepare_with_iterrows, df)
+    after_prepare = timed(prepare_records, df)
+    after_touch = timed(touch_records, records)
+    after = after_prepare + after_touch
+
+    print(f"   iterrows + per-row formatting : {before:.3f}s ({before / rows * 1e6:.1f} µs/row)")
+    print(f"   prepare_records + attr reads  : {after:.3f}s ({after / rows * 1e6:.1f} µs/row)")
+    print(f"   speed-up                      : {before / after:.1f}x")
+
+    # Records are pickled to worker processes, so their size matters too
+    dict_bytes = len(pickle.dumps(dataframe_to_records(df)))
+    record_bytes = len(pickle.dumps(records))
+    print(f"   pickled dict rows             : {dict_bytes / 1024:.0f} KB")
+    print(f"   pickled TicketRecords         : {record_bytes / 1024:.0f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Debug script to check the candidate images workflow
 import pandas as pd
 import os
 from pathlib import Path
+from hallticket import build_photo_index, match_photos
 
 def check_excel_data():
     """Check Excel file data"""
@@ -83,18 +84,13 @@ def simulate_matching(df, image_dirs):
         
         print(f"   Using image directory: {images_path}")
         
-        for _, row in df.iterrows():
-            seat_no = str(row['Seat No'])
-            matched = False
-            
-            for ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
-                img_path = os.path.join(images_path, f"{seat_no}.{ext}")
-                if os.path.exists(img_path):
-                    print(f"   ✅ Match found: {seat_no} → {img_path}")
-                    matched = True
-                    break
-            
-            if not matched:
+        # Same lookup the web app uses: one directory scan, then a vectorised seat number match
+        photo_index = build_photo_index(images_path)
+        matches = match_photos(df['Seat No'], photo_index)
+        for seat_no, img_path in zip(df['Seat No'], matches):
+            if pd.notna(img_path):
+                print(f"   ✅ Match found: {seat_no} → {img_path}")
+            else:
                 print(f"   ❌ No image found for seat number: {seat_no}")
     
     else:
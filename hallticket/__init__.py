@@ -0,0 +1,30 @@
+"""
+Shared hall ticket generation helpers used by the web app, CLI and GUI versions
+"""
+
+from .engine import render_batch, iter_render, map_ordered, resolve_workers, dataframe_to_records, warm_pool
+from .records import TicketRecord, prepare_records, resolve_photo_paths, REQUIRED_COLUMNS
+from .validation import ValidationReport, validate_roster, combine_reports
+from .roster import read_roster, iter_roster, preview_roster, count_rows, ROSTER_COLUMNS, ROSTER_EXTENSIONS
+from .workbooks import Workbook, WorkbookCache
+from .storage import StorageManager, session_of
+from .sessions import SessionStore, new_session_id, check_session_id, process_alive
+from .photos import build_photo_index, match_photos, apply_photo_index, normalise_seat_no
+from .ingest import ingest_images, resolve_image_workers
+from .cachedir import CacheFiles, default_cache_dir, private_dir
+from .derivatives import PhotoDerivatives, photo_derivatives
+from .render_cache import RenderCache, render_cache
+from .jobs import Job, JobQueue
+from .metrics import Metrics, BatchTimer, metrics, configure_logging
+from .jobfile import BatchJob, load_job_file
+from .bounded import Budget, generate_bounded, current_rss_mb, peak_rss_mb
+from .checkpoint import Checkpoint, checkpoint_path, CHECKPOINT_SUFFIX
+from .shards import (ShardManifest, parse_shard, shard_of, select_shard, roster_digest, plan_merge, merge_to_zip,
+                     merge_to_pdf)
+from .profiling import profile_run, summarise_profile, PROFILE_SUFFIX
+from .images import ImageCache, image_cache, draw_image
+from .template import TicketTemplate, get_template, copy_positions, subject_rows, max_subjects, draw_static_page
+from .sinks import write_zip, stream_zip, iter_volumes, write_merged, volume_filename
+from .renderer import TicketRenderer, LAYOUT_VERSION
+from .incremental import (BatchManifest, RosterDiff, PreviousOutputs, diff_roster, roster_fields, iter_incremental,
+                          iter_volumes_incremental, remove_stale_tickets, manifest_path)
@@ -0,0 +1,193 @@
+"""
+Bounded-memory generation - stream a roster of any size through the renderer into a ZIP, within a memory and disk budget
+"""
+
+import logging
+import os
+import sys
+import zipfile
+from .derivatives import photo_derivatives
+from .engine import DEFAULT_CHUNK_SIZE, warm_pool
+from .metrics import BatchTimer
+from .photos import apply_photo_index
+from .records import prepare_records
+from .roster import DEFAULT_CHUNK_ROWS, iter_roster
+from .validation import WARNING, combine_reports, validate_roster
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+MEMORY_ENV_VAR = 'HALLTICKET_MEMORY_MB'  # memory a bounded run may use in the writing process
+DISK_ENV_VAR = 'HALLTICKET_DISK_MB'      # size the output ZIP may reach, 0 = no limit
+DEFAULT_MEMORY_MB = 512
+MB = 1024 * 1024
+MIN_ROSTER_ROWS = 500
+MAX_FAILED_LISTED = 100  # failures kept in the summary; the count covers all of them
+
+# Rough cost of what the budget is spent on, so chunk sizes can be worked out from it
+TICKET_BYTES = 256 * 1024  # a ticket in flight: its record, the PDF, and the copy pickled back from a worker
+ROW_BYTES = 4 * 1024       # a roster row as DataFrame cells plus its TicketRecord
+IN_FLIGHT_SHARE = 4        # 1/4 of the budget for rendered tickets waiting to be written
+ROSTER_SHARE = 8           # 1/8 for the roster chunk being rendered
+
+def _env_mb(name, default):
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+def current_rss_mb():
+    """Resident memory of this process right now, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / MB, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb():
+    """(this process, largest finished child) peak resident memory in MB, or (None, None) without `resource`"""
+    try:
+        import resource
+    except ImportError:
+        return None, None  # Windows
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / MB
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / MB
+    return round(own, 1), round(children, 1)
+
+class Budget:
+    """
+    How much memory and disk a bounded run may use, and the chunk sizes that follow from it.
+
+    `memory_mb` covers the writing process (interpreter and libraries included); each render
+    worker holds one chunk of DEFAULT_CHUNK_SIZE tickets at a time on top of that. `disk_mb`
+    caps the output ZIP, 0 means no limit. Unset values come from HALLTICKET_MEMORY_MB and
+    HALLTICKET_DISK_MB.
+    """
+
+    def __init__(self, memory_mb=None, disk_mb=None):
+        self.memory_mb = _env_mb(MEMORY_ENV_VAR, DEFAULT_MEMORY_MB) if memory_mb is None else int(memory_mb)
+        self.disk_mb = _env_mb(DISK_ENV_VAR, 0) if disk_mb is None else int(disk_mb)
+
+    def __repr__(self):
+        return f"Budget(memory_mb={self.memory_mb}, disk_mb={self.disk_mb})"
+
+    def roster_rows(self):
+        """Roster rows read, prepared and rendered at a time"""
+        rows = self.memory_mb * MB // ROSTER_SHARE // ROW_BYTES
+        return max(MIN_ROSTER_ROWS, min(DEFAULT_CHUNK_ROWS, rows))
+
+    def max_pending(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Render chunks the workers may run ahead of the ZIP writer"""
+        tickets = self.memory_mb * MB // IN_FLIGHT_SHARE // TICKET_BYTES
+        return max(1, tickets // chunk_size)
+
+    def check_disk(self, written, tickets):
+        """Raise ValueError once `written` bytes of output pass the disk budget"""
+        if self.disk_mb and written > self.disk_mb * MB:
+            raise ValueError(f"Output passed the disk budget of {self.disk_mb} MB after {tickets} tickets "
+                             f"(set {DISK_ENV_VAR} higher, or split the roster)")
+
+    def to_dict(self):
+        return {'memory_mb': self.memory_mb, 'disk_mb': self.disk_mb, 'roster_rows': self.roster_rows(),
+                'max_pending': self.max_pending()}
+
+def _roster_chunks(roster, rows):
+    # A path is read lazily; an already-parsed DataFrame is handed out in slices
+    if isinstance(roster, str):
+        return iter_roster(roster, chunk_rows=rows)
+    return (roster.iloc[start:start + rows].copy() for start in range(0, len(roster), rows))
+
+def _add_photo_report(total, report):
+    for key, value in report.items():
+        if key == 'failed':
+            total['failed'].extend(value[:MAX_FAILED_LISTED - len(total['failed'])])
+        else:
+            total[key] = total.get(key, 0) + value
+
+def _roster_progress(progress, offset):
+    # iter_render numbers a chunk's rows from 0; progress callers (Job.record) key on the row's place in the roster
+    if progress is None:
+        return None
+    return lambda result: progress(dict(result, index=result['index'] + offset))
+
+def generate_bounded(renderer, roster, zip_path, budget=None, subjects=None, photo_index=None, workers=None,
+                     progress=None, cache=None, timer=None, derivatives=photo_derivatives):
+    """
+    Render a roster into a ZIP at `zip_path`, holding only a few chunks of it in memory at once.
+
+    `roster` is a file path (read lazily with iter_roster) or a DataFrame. Each chunk of
+    budget.roster_rows() rows is prepared, rendered with at most budget.max_pending() chunks
+    ahead of the writer, written into the ZIP and released before the next is read. `subjects`
+    replaces the Subjects Applied column, `photo_index` (from build_photo_index) fills in photos
+    and `derivatives` shrinks them. Each chunk is validated before rendering and rows with errors
+    are skipped; the Seat Nos seen so far are kept, so a seat repeated in a later chunk is caught.
+    `progress` gets each row's result with 'index' counted from the start of the roster.
+    If memory still climbs past the budget, rendering drops to one chunk ahead. The ZIP appears
+    only once complete; ValueError is raised for a bad roster or when the disk budget runs out.
+    Returns a summary: counts, the first failures, the validation report of all chunks combined
+    (see combine_reports), bytes written and peak memory.
+    """
+    budget = budget or Budget()
+    timer = timer or BatchTimer()
+    max_pending = budget.max_pending()
+    summary = {'total_students': 0, 'generated_count': 0, 'cached_count': 0, 'failed_count': 0, 'failed': [],
+               'skipped_count': 0, 'warning_count': 0, 'validation': None, 'bytes_written': 0, 'chunks': 0}
+    photos = {'failed': []}
+    known_photos = set(photo_index.values()) if photo_index else ()
+    seen = {}  # Seat No -> row, across chunks
+    partial = f"{zip_path}.{os.getpid()}.tmp"
+    try:
+        with warm_pool(workers), timer.stage('zip'), zipfile.ZipFile(partial, 'w') as zipf:
+            for df in timer.timed(_roster_chunks(roster, budget.roster_rows()), 'parse'):
+                if subjects:
+                    df['Subjects Applied'] = subjects
+                if photo_index:
+                    with timer.stage('match'):
+                        apply_photo_index(df, photo_index)
+                with timer.stage('validate'):
+                    report = validate_roster(df, known_photos=known_photos, offset=summary['total_students'],
+                                             seen=seen)
+                with timer.stage('prepare'):
+                    records = prepare_records(df, known_photos=known_photos)
+                    summary['skipped_count'] += report.mark(records)
+                summary['warning_count'] += report.count(WARNING)
+                summary['validation'] = combine_reports(summary['validation'], report)
+                del df, report
+                timer.count_photos(records)
+                with timer.stage('resize'):
+                    _add_photo_report(photos, derivatives.apply(records))
+
+                results = renderer.iter_render(records, workers=workers, cache=cache, max_pending=max_pending,
+                                               progress=_roster_progress(progress, summary['total_students']))
+                for result in timer.tally(timer.timed(results, 'render')):
+                    summary['total_students'] += 1
+                    if result['success']:
+                        zipf.writestr(result['filename'], result['data'])
+                        summary['bytes_written'] += len(result['data'])
+                        summary['generated_count'] += 1
+                        summary['cached_count'] += bool(result.get('cached'))
+                        budget.check_disk(summary['bytes_written'], summary['generated_count'])
+                    else:
+                        summary['failed_count'] += 1
+                        if len(summary['failed']) < MAX_FAILED_LISTED:
+                            summary['failed'].append({'seat_no': result['seat_no'], 'error': result['error']})
+                del records, results
+                summary['chunks'] += 1
+
+                rss = current_rss_mb()
+                if rss is not None and rss > budget.memory_mb and max_pending > 1:
+                    logger.warning("Memory at %.0f MB, over the %d MB budget; rendering one chunk ahead from now on",
+                                   rss, budget.memory_mb)
+                    max_pending = 1
+        os.replace(partial, zip_path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    summary['photos'] = photos
+    summary['peak_rss_mb'] = peak_rss_mb()[0]
+    summary['budget'] = dict(budget.to_dict(), max_pending=max_pending)
+    return summary
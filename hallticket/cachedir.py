@@ -0,0 +1,113 @@
+"""
+Cache directories - private, size-bounded folders for the caches that outlive a run (photo derivatives, rendered tickets)
+"""
+
+import os
+import stat
+import threading
+
+# Configuration
+CACHE_DIR_ENV_VAR = 'HALLTICKET_CACHE_DIR'
+# Per-user default for the CLI; the web app points HALLTICKET_CACHE_DIR at its instance folder
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'hallticket')
+EVICT_TO = 0.9  # eviction trims a cache to this fraction of its bound, so it doesn't run on every write
+
+_checked = set()  # directories already made and checked by this process
+_checked_lock = threading.Lock()
+
+def private_dir(path):
+    """
+    Create `path` (and missing parents) readable by this user only, and return it.
+
+    Cached files are trusted as they are, so a directory owned by another user, or one other
+    users may write to, is refused with a ValueError instead of being used.
+    """
+    path = os.path.abspath(path)
+    with _checked_lock:
+        if path in _checked:
+            return path
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise ValueError(f"Cache directory {path} belongs to another user; set {CACHE_DIR_ENV_VAR} to a folder of your own")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ValueError(f"Cache directory {path} is writable by other users; set {CACHE_DIR_ENV_VAR} to a private folder")
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        os.chmod(path, 0o700)
+    with _checked_lock:
+        _checked.add(path)
+    return path
+
+def default_cache_dir():
+    """Base directory for caches that outlive a run (HALLTICKET_CACHE_DIR, else ~/.cache/hallticket), checked by private_dir"""
+    return private_dir(os.environ.get(CACHE_DIR_ENV_VAR) or DEFAULT_CACHE_DIR)
+
+def resolve_max_bytes(env_var, default_mb, max_mb=None):
+    """Size bound in bytes from `max_mb`, else the `env_var` setting in MB, else `default_mb`"""
+    if max_mb is None:
+        max_mb = os.environ.get(env_var, default_mb)
+    try:
+        return max(0, int(float(max_mb) * 1024 * 1024))
+    except (TypeError, ValueError):
+        return default_mb * 1024 * 1024
+
+class CacheFiles:
+    """
+    Size-bounded LRU over the files ending in `suffix` anywhere under a cache directory.
+
+    Callers refresh a file's mtime when they use it and report the bytes they add; once the total
+    passes `max_bytes` the least recently used files are deleted down to EVICT_TO of the bound.
+    """
+
+    def __init__(self, max_bytes, suffix):
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.size = None  # bytes on disk, scanned lazily and then tracked
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def entries(self, root):
+        """(mtime, size, path) of every cached file under `root`"""
+        entries = []
+        for directory, subdirs, files in os.walk(root):
+            for name in files:
+                if name.endswith(self.suffix):
+                    path = os.path.join(directory, name)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def added(self, root, size, keep_after=None):
+        """Count `size` new bytes under `root`, evicting if that takes the total past the bound"""
+        with self._lock:
+            if self.size is None:
+                self.size = sum(size for mtime, size, path in self.entries(root))
+            else:
+                self.size += size
+            over = self.size > self.max_bytes
+        if over:
+            self.evict(root, keep_after)
+
+    def evict(self, root, keep_after=None):
+        """Delete least recently used files until under EVICT_TO of the bound; files used after `keep_after` stay"""
+        entries = sorted(self.entries(root))
+        total = sum(size for mtime, size, path in entries)
+        target = self.max_bytes * EVICT_TO
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= target or keep_after is not None and mtime >= keep_after:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.size = total
+            self.evictions += removed
+        return removed
@@ -0,0 +1,155 @@
+"""
+Checkpointed runs - a journal of the tickets a batch has finished, so a crashed run resumes where it stopped
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = '.checkpoint.jsonl'
+
+# Local file header in front of every ZIP entry: signature, versions, flags, method, time, date, crc, sizes, name and extra lengths
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+
+def checkpoint_path(directory, batch_name):
+    """Where the journal of a batch called `batch_name` lives, e.g. output/hall_tickets_<ts>.checkpoint.jsonl"""
+    return os.path.join(directory, f"{batch_name}{CHECKPOINT_SUFFIX}")
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _read_stored(f, offset, size):
+    # Bytes of the uncompressed ZIP entry whose header starts at `offset`; works on archives never closed
+    try:
+        f.seek(offset)
+        header = f.read(LOCAL_HEADER.size)
+        if len(header) != LOCAL_HEADER.size:
+            return None
+        fields = LOCAL_HEADER.unpack(header)
+        if fields[0] != LOCAL_HEADER_SIGNATURE or fields[3] != zipfile.ZIP_STORED:
+            return None
+        f.seek(offset + LOCAL_HEADER.size + fields[9] + fields[10])
+        data = f.read(size)
+    except (OSError, ValueError, struct.error):
+        return None
+    return data if len(data) == size else None
+
+class Checkpoint:
+    """
+    Append-only journal of a run's finished tickets: Seat No, cache key, filename, size and SHA-1.
+
+    Each line is flushed as soon as its ticket is written, so a crashed or killed run loses at most
+    the tickets in flight. Tickets go either to per-student files in `directory` or into a ZIP, in
+    which case each line also holds the entry's offset in the archive.
+
+    With `resume` the journal already at `path` is read first. A ticket it lists counts as done only
+    if the student still has the same cache key and the file - or the entry in `archive`, the ZIP
+    the earlier run was writing - still has the recorded size and hash; truncated writes and edited
+    rows are rendered again. A journal from another department, logo or layout resumes nothing.
+    The new run then journals every ticket again, resumed ones included.
+    """
+
+    def __init__(self, path, diff, directory=None, archive=None):
+        self.path = path
+        self.signature = diff.signature
+        self.keys = diff.keys
+        self.directory = directory
+        self.earlier = {}  # Seat No -> journal entry of the interrupted run
+        self.resumed = 0
+        self._verified = {}  # row index -> entry, so a resumed ticket isn't hashed twice
+        self._archive = open(archive, 'rb') if archive and os.path.exists(archive) else None
+        self._file = None
+
+    @classmethod
+    def open(cls, path, diff, resume=False, directory=None, archive=None):
+        """Start the journal of a run at `path`, reading the earlier one back first when resuming"""
+        checkpoint = cls(path, diff, directory, archive)
+        if resume:
+            checkpoint.earlier = checkpoint._load()
+            logger.debug("Checkpoint %s lists %d finished tickets", os.path.basename(path), len(checkpoint.earlier))
+        checkpoint._file = open(path, 'w', encoding='utf8')
+        checkpoint._write({'version': CHECKPOINT_VERSION, 'signature': checkpoint.signature})
+        return checkpoint
+
+    def _load(self):
+        entries = {}
+        try:
+            with open(self.path, encoding='utf8') as f:
+                header = json.loads(f.readline() or 'null')
+                if not isinstance(header, dict) or header.get('version') != CHECKPOINT_VERSION \
+                        or header.get('signature') != self.signature:
+                    return entries
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # the half-written last line of a killed run
+                    entries[entry['seat_no']] = entry
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return entries
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def _read(self, entry):
+        if self.directory is None:
+            if self._archive is None or 'offset' not in entry:
+                return None
+            return _read_stored(self._archive, entry['offset'], entry['size'])
+        path = os.path.join(self.directory, entry['filename'])
+        try:
+            if os.path.getsize(path) != entry['size']:
+                return None  # cheap check first: a truncated file is never read
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def completed(self, index, record, filename):
+        """Result for a ticket the earlier run finished and that is still intact, or None if it must be rendered"""
+        entry = self.earlier.get(record.seat_no)
+        key = self.keys[index]
+        if entry is None or key is None or entry.get('key') != key or entry.get('filename') != filename:
+            return None
+        data = self._read(entry)
+        if data is None or len(data) != entry['size'] or _digest(data) != entry['sha1']:
+            return None
+        self.resumed += 1
+        self._verified[index] = entry
+        return {'index': index, 'seat_no': record.seat_no, 'success': True, 'filename': filename,
+                'data': None if self.directory is not None else data, 'error': None, 'cached': False,
+                'reused': False, 'resumed': True}
+
+    def record(self, result, offset=None):
+        """Journal a written ticket; `offset` is where its entry starts in the ZIP being written"""
+        if self._file is None or not result['success'] or self.keys[result['index']] is None:
+            return
+        entry = self._verified.pop(result['index'], None)
+        if entry is None:
+            data = result['data']
+            if data is None:
+                with open(os.path.join(self.directory, result['filename']), 'rb') as f:
+                    data = f.read()
+            entry = {'seat_no': result['seat_no'], 'key': self.keys[result['index']], 'filename': result['filename'],
+                     'size': len(data), 'sha1': _digest(data)}
+        entry = dict(entry)
+        entry.pop('offset', None)
+        if offset is not None:
+            entry['offset'] = offset
+        self._write(entry)
+
+    def close(self):
+        for f in (self._file, self._archive):
+            if f is not None:
+                f.close()
+        self._file = self._archive = None
@@ -0,0 +1,136 @@
+"""
+Pre-sized photo derivatives - one small JPEG per source photo, sized for the ticket's photo slot
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from .cachedir import CacheFiles, default_cache_dir, private_dir, resolve_max_bytes
+from .ingest import resolve_image_workers
+
+# Configuration
+PHOTO_CACHE_ENV_VAR = 'HALLTICKET_PHOTO_CACHE_MB'  # size bound of the derivative store in MB, 0 = no limit
+DEFAULT_MAX_MB = 256
+KEEP_RECENT = 3600  # seconds; derivatives used this recently are never evicted, a running batch may still draw them
+PHOTO_SLOT_POINTS = 100  # the photo is drawn 100x100 pt on each copy
+TARGET_DPI = 300
+TARGET_PIXELS = round(PHOTO_SLOT_POINTS / 72 * TARGET_DPI)  # 417 px
+JPEG_QUALITY = 85
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_digests = {}  # (path, mtime, size) -> content hash, so unchanged files are hashed once per process
+_digests_lock = threading.Lock()
+
+def content_digest(path):
+    """Memoised file_digest, re-hashing only when the file's mtime or size changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        digest = file_digest(path)
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+class PhotoDerivatives:
+    """
+    Store of slot-sized JPEGs keyed by the content hash of their source photo.
+
+    A derivative is made once per distinct source and reused by every ticket, copy and later run
+    that points at the same image. Sources that are already small JPEGs are used as they are.
+    The store lives in a private_dir and is bounded like the render cache (see CacheFiles), least
+    recently used derivatives going first - but never one used in the last KEEP_RECENT seconds.
+    """
+
+    def __init__(self, directory=None, pixels=TARGET_PIXELS, quality=JPEG_QUALITY, max_bytes=None):
+        self.directory = directory
+        self.pixels = pixels
+        self.quality = quality
+        self.files = CacheFiles(resolve_max_bytes(PHOTO_CACHE_ENV_VAR, DEFAULT_MAX_MB) if max_bytes is None
+                                else max_bytes, '.jpg')
+
+    def _directory(self):
+        return private_dir(self.directory or os.path.join(default_cache_dir(), 'photos'))
+
+    def get(self, source_path):
+        """Return (path to draw, created) for a source photo; `created` is True if a new derivative was written"""
+        directory = self._directory()
+        target = os.path.join(directory, f"{content_digest(source_path)}_{self.pixels}.jpg")
+        if os.path.exists(target):
+            try:
+                os.utime(target)  # most recently used, so eviction keeps it
+                return target, False
+            except OSError:
+                pass  # evicted in between: make it again
+
+        with Image.open(source_path) as img:
+            if img.format == 'JPEG' and max(img.size) <= self.pixels:
+                return source_path, False
+            img.draft('RGB', (self.pixels, self.pixels))
+            img.thumbnail((self.pixels, self.pixels), Image.Resampling.LANCZOS)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            # Write then rename, so concurrent runs never see a half-written derivative
+            partial = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(partial, 'JPEG', quality=self.quality, optimize=True)
+        os.replace(partial, target)
+        if self.files.max_bytes:
+            self.files.added(directory, os.path.getsize(target), keep_after=time.time() - KEEP_RECENT)
+        return target, True
+
+    def apply(self, records, workers=None):
+        """
+        Point each record's photo at its derivative and return a report for the batch.
+
+        Distinct sources are processed once on a thread pool. `bytes_saved` is how much less photo
+        data the batch's PDFs embed (every ticket embeds its photo once, shared by both copies),
+        measured from file sizes - exact for JPEG sources, an underestimate for PNG and others.
+        """
+        sources = sorted({record.photo_path for record in records if record.photo_path is not None})
+        resolved, failed = {}, []
+
+        def derive(source):
+            try:
+                return source, self.get(source), None
+            except Exception as e:
+                return source, None, str(e)
+
+        with ThreadPoolExecutor(max_workers=min(resolve_image_workers(workers), max(1, len(sources)))) as pool:
+            for source, result, error in pool.map(derive, sources):
+                if result is None:
+                    failed.append({'photo_path': source, 'error': error})
+                else:
+                    resolved[source] = result
+
+        report = {'photos': len(sources), 'created': 0, 'reused': 0, 'unchanged': 0, 'failed': failed,
+                  'source_bytes': 0, 'embedded_bytes': 0, 'bytes_saved': 0}
+        sizes = {}
+        for source, (path, created) in resolved.items():
+            if path == source:
+                report['unchanged'] += 1
+            else:
+                report['created' if created else 'reused'] += 1
+            sizes[source] = (os.path.getsize(source), os.path.getsize(path))
+
+        for record in records:
+            if record.photo_path in resolved:
+                source_size, embedded_size = sizes[record.photo_path]
+                report['source_bytes'] += source_size
+                report['embedded_bytes'] += embedded_size
+                record.photo_path = resolved[record.photo_path][0]
+        report['bytes_saved'] = report['source_bytes'] - report['embedded_bytes']
+        return report
+
+# One store per process; the files themselves are shared by every process and run
+photo_derivatives = PhotoDerivatives()
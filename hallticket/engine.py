@@ -0,0 +1,211 @@
+"""
+Batch rendering engine - fans student rows out across a process pool
+"""
+
+import collections
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .records import row_error, seat_number
+
+logger = logging.getLogger(__name__)
+
+# Pool kept alive by warm_pool() and used by every map_ordered call inside it - one per thread, so
+# concurrent jobs (e.g. JobQueue workers) never share, or shut down, each other's pool
+_local = threading.local()
+
+# Configuration
+WORKERS_ENV_VAR = 'HALLTICKET_WORKERS'
+DEFAULT_CHUNK_SIZE = 25
+
+def resolve_workers(workers=None):
+    """Work out how many worker processes to use (1 means serial mode)"""
+    if workers in (None, '', 0, '0'):
+        workers = os.environ.get(WORKERS_ENV_VAR) or os.cpu_count() or 1
+    try:
+        workers = int(workers)
+    except (TypeError, ValueError):
+        workers = 1
+    return max(1, workers)
+
+def dataframe_to_records(df):
+    """Convert a DataFrame into plain dicts, which pickle far cheaper than pandas Series"""
+    return df.to_dict('records')
+
+def _render_row(render, index, row, render_kwargs):
+    result = {'index': index, 'seat_no': seat_number(row), 'success': False, 'filename': None, 'data': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        output = render(row, **render_kwargs)
+        # Renderers either write a file and return its name, or return (filename, pdf_bytes)
+        if isinstance(output, tuple):
+            result['filename'], result['data'] = output
+        else:
+            result['filename'] = output
+        result['success'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+def skipped_result(index, row):
+    """Failed result for a row validation rejected, produced without rendering it"""
+    return {'index': index, 'seat_no': seat_number(row), 'success': False, 'filename': None, 'data': None,
+            'error': row_error(row), 'skipped': True}
+
+def _render_chunk(render, start, rows, render_kwargs):
+    # Runs inside a worker process - one task per contiguous row range
+    return [_render_row(render, start + offset, row, render_kwargs) for offset, row in enumerate(rows)]
+
+def _iter_serial(render, rows, render_kwargs):
+    for index, row in enumerate(rows):
+        yield _render_row(render, index, row, render_kwargs)
+
+def iter_render(render, rows, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, max_pending=None,
+                **render_kwargs):
+    """
+    Render every row with `render(row, **render_kwargs)`, yielding one result dict per row.
+
+    `render` must pickle into worker processes: a module-level function, or a bound method of a
+    picklable object such as TicketRenderer.
+    Rows are split into contiguous ranges of `chunk_size`; results are always yielded in
+    the original row order, as soon as the chunk holding them has finished. Records marked
+    invalid by validation are never sent to a worker; their failed result is yielded in place. `progress`,
+    if given, is called with each result just before it is yielded. `max_pending` bounds
+    the chunks in flight (see map_ordered).
+    """
+    for result in _iter_results(render, rows, workers, chunk_size, max_pending, render_kwargs):
+        if progress:
+            progress(result)
+        yield result
+
+def _chunks(rows, chunk_size):
+    # (start, rows) ranges, sliced off as the pool asks for them
+    rows = iter(rows)
+    for start in itertools.count(0, chunk_size):
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+
+def _iter_results(render, rows, workers, chunk_size, max_pending, render_kwargs):
+    rows = list(rows)
+    invalid = {index for index, row in enumerate(rows) if row_error(row)}
+    if invalid:
+        rendered = _iter_results(render, [row for index, row in enumerate(rows) if index not in invalid], workers,
+                                 chunk_size, max_pending, render_kwargs)
+        for index, row in enumerate(rows):
+            if index in invalid:
+                yield skipped_result(index, row)
+            else:
+                result = next(rendered)
+                result['index'] = index
+                yield result
+        return
+    chunk_size = max(1, int(chunk_size or DEFAULT_CHUNK_SIZE))
+
+    # Small batches are not worth the cost of starting worker processes
+    if resolve_workers(workers) == 1 or len(rows) <= chunk_size:
+        yield from _iter_serial(render, rows, render_kwargs)
+        return
+
+    tasks = ((render, start, chunk, render_kwargs) for start, chunk in _chunks(rows, chunk_size))
+    for chunk_results in map_ordered(_render_chunk, tasks, workers, max_pending):
+        yield from chunk_results
+
+@contextmanager
+def warm_pool(workers=None):
+    """
+    Keep one process pool running for every batch rendered inside the block.
+
+    Multi-batch runs then start their workers once, and each worker's template, font and logo
+    caches stay warm from one batch to the next. Batches asking for one worker still run serially.
+    The pool belongs to the calling thread: batches rendered by other threads start their own.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1 or getattr(_local, 'pool', None) is not None:
+        yield
+        return
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        logger.warning("Process pool unavailable (%s), batches will start their own", e)
+        yield
+        return
+    _local.pool = pool
+    try:
+        yield
+    finally:
+        _local.pool = None
+        # Every task was submitted by this thread's map_ordered calls, which cancel what they leave queued
+        pool.shutdown()
+
+def _pool_for(workers, task_count):
+    pool = getattr(_local, 'pool', None)
+    if pool is not None:
+        return nullcontext(pool)
+    return ProcessPoolExecutor(max_workers=min(workers, task_count))
+
+def map_ordered(func, tasks, workers=None, max_pending=None):
+    """
+    Run `func(*task)` for every task across the process pool, yielding return values in task order.
+
+    Inside warm_pool() the calling thread's pool is used instead of starting a new one.
+    With `max_pending`, at most that many tasks are submitted ahead of the consumer and `tasks`
+    is read lazily, so a slow consumer (e.g. the ZIP writer) holds back the workers instead of
+    finished results piling up in memory. Without it every task is submitted at once.
+    If the pool cannot start or breaks part way, the remaining tasks run serially instead.
+    """
+    workers = resolve_workers(workers)
+    if max_pending is None:
+        tasks = list(tasks)
+        if len(tasks) <= 1:
+            workers = 1
+        pool_size = min(workers, max(1, len(tasks)))
+    else:
+        max_pending = max(1, int(max_pending))
+        pool_size = min(workers, max_pending)
+    tasks = iter(tasks)
+    if workers == 1:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    pending = collections.deque()  # (task, future) submitted but not yet yielded, oldest first
+    try:
+        with _pool_for(workers, pool_size) as pool:
+            try:
+                for task in tasks:
+                    pending.append((task, None))  # kept for the serial fallback if submit fails
+                    pending[-1] = (task, pool.submit(func, *task))
+                    if max_pending is not None and len(pending) >= max_pending:
+                        value = pending[0][1].result()
+                        pending.popleft()
+                        yield value
+                while pending:
+                    value = pending[0][1].result()
+                    pending.popleft()
+                    yield value
+            finally:
+                # Stop queued tasks if the consumer goes away (e.g. a client aborting a download)
+                for task, future in pending:
+                    if future is not None:
+                        future.cancel()
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        # Platforms without working multiprocessing (e.g. serverless sandboxes) fall back to serial mode
+        logger.warning("Process pool unavailable (%s), running remaining work serially", e)
+        if isinstance(e, BrokenProcessPool):
+            _local.pool = None  # later batches start a fresh pool of their own
+        for task, future in pending:
+            yield func(*task)
+        for task in tasks:
+            yield func(*task)
+
+def render_batch(render, rows, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, **render_kwargs):
+    """Render every row and return the list of result dicts in row order (see iter_render)"""
+    return list(iter_render(render, rows, workers=workers, chunk_size=chunk_size, progress=progress, **render_kwargs))
@@ -0,0 +1,122 @@
+"""
+Process-wide cache of pre-encoded images (the college logo) shared by every canvas in a batch
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from reportlab.pdfbase import pdfdoc
+from reportlab.lib.utils import ImageReader
+
+# Configuration
+DEFAULT_MAX_ENTRIES = 16
+
+class CachedImage:
+    """An image decoded and encoded into a PDF image XObject once, ready to add to any canvas"""
+
+    def __init__(self, path, mask=None):
+        self.path = path
+        self.mask = mask
+        # Same naming scheme reportlab uses for ImageReader sources, so identical images share a name
+        reader = ImageReader(path)
+        signature = reader.getRGBData() + str(mask).encode('utf8')
+        self.name = pdfdoc._digester(signature)
+        self.xobject = pdfdoc.PDFImageXObject(self.name, path, mask=mask)
+        self.xobject.name = self.name
+        self.smask = getattr(self.xobject, '_smask', None)
+        if self.smask is not None:
+            del self.xobject._smask
+        self.width = self.xobject.width
+        self.height = self.xobject.height
+
+    def register(self, doc):
+        """Add the image XObject to a PDF document once and return its internal name"""
+        reg_name = doc.getXObjectName(self.name)
+        if not doc.idToObject.get(reg_name):
+            # reportlab tags an object with the document it was registered in, so each document
+            # gets a shallow copy; the encoded stream content itself is shared, not duplicated
+            xobject = copy.copy(self.xobject)
+            doc.Reference(xobject, reg_name)
+            doc.addForm(self.name, xobject)
+            if self.smask is not None:
+                smask_name = doc.getXObjectName(self.smask.name)
+                if not doc.idToObject.get(smask_name):
+                    doc.Reference(copy.copy(self.smask), smask_name)
+                xobject.smask = pdfdoc.PDFObjectReference(smask_name)
+        return reg_name
+
+    def draw(self, c, x, y, width, height):
+        """Place the image on the current page of `c`, adding its XObject to the document only once"""
+        reg_name = self.register(c._doc)
+        c._currentPageHasImages = 1
+        c.saveState()
+        c.translate(x, y)
+        c.scale(width, height)
+        c._code.append("/%s Do" % reg_name)
+        c.restoreState()
+        c._formsinuse.append(self.name)
+
+class ImageCache:
+    """Bounded LRU cache of CachedImage objects keyed by (path, mtime, mask)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, mask=None):
+        """Return the cached image for `path`, loading it on first use or after the file changes"""
+        try:
+            key = (os.path.abspath(path), os.path.getmtime(path), str(mask))
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedImage(path, mask)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# One cache per process; worker processes each warm their own copy
+image_cache = ImageCache()
+
+def draw_image(c, path, x, y, width, height, mask=None):
+    """drawImage replacement that reuses the cached, pre-encoded image for `path`"""
+    try:
+        entry = image_cache.get(path, mask)
+    except Exception:
+        entry = None
+    if entry is None:
+        # Unreadable or unusual images go through reportlab's normal path
+        c.drawImage(path, x, y, width=width, height=height, mask=mask)
+        return
+    entry.draw(c, x, y, width, height)
@@ -0,0 +1,396 @@
+"""
+Incremental regeneration - diff a new roster against an earlier batch's manifest and re-render only what changed
+"""
+
+import hashlib
+import io
+import json
+import os
+import zipfile
+from .engine import map_ordered
+from .records import REQUIRED_COLUMNS, _text
+from .renderer import _file_key, layout_signature
+from .sinks import _resolve_volume_size, render_volume
+
+# Configuration
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+
+ADDED = 'added'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+def _pypdf():
+    # Optional: without pypdf, merged runs reuse whole unchanged volumes only
+    try:
+        import pypdf
+    except ImportError:
+        return None
+    return pypdf
+
+def manifest_path(directory, batch_name):
+    """Where the manifest of a batch called `batch_name` lives, e.g. output/hall_tickets_<ts>.manifest.json"""
+    return os.path.join(directory, f"{batch_name}{MANIFEST_SUFFIX}")
+
+def roster_fields(df):
+    """Text of every required column per row (column-wise), used to name the fields that changed"""
+    columns = [col for col in REQUIRED_COLUMNS if col in df.columns]
+    texts = [_text(df[col]) for col in columns]
+    return [dict(zip(columns, values)) for values in zip(*texts)]
+
+def batch_signature(renderer):
+    """Hash of what every ticket in a batch shares: layout, department and logo contents"""
+    parts = (layout_signature(), renderer.department_name, _file_key(renderer.logo_path))
+    return hashlib.sha1(repr(parts).encode('utf8')).hexdigest()
+
+def _volume_digest(keys):
+    # A merged volume can be reused only if it holds the same tickets in the same order
+    return hashlib.sha1('\n'.join(keys).encode('utf8')).hexdigest()
+
+class BatchManifest:
+    """
+    Record of a finished batch: Seat No -> cache key, filename and field values, plus the files written.
+
+    `outputs` describes where the tickets went: {'kind': 'files'}, {'kind': 'zip', 'archive': name}
+    or {'kind': 'merged', 'archive': name or None, 'volume_size': n, 'volumes': [{'filename', 'digest', 'pages'}]},
+    where `pages` lists the cache key of the ticket on each page of the volume.
+    """
+
+    def __init__(self, signature, students, outputs=None):
+        self.signature = signature
+        self.students = students
+        self.outputs = outputs or {}
+
+    @classmethod
+    def build(cls, renderer, records, fields, diff, results, outputs=None):
+        """Manifest for a batch just written; students whose ticket failed are left out so the next run retries them"""
+        succeeded = {result['index'] for result in results if result['success']}
+        students = {}
+        for index, (record, row_fields, key) in enumerate(zip(records, fields, diff.keys)):
+            if index in succeeded and key is not None:
+                students[record.seat_no] = {'key': key, 'filename': renderer.filename(record), 'fields': row_fields}
+        if outputs and outputs.get('kind') == 'merged':
+            # Page by page, so a later run can splice single unchanged tickets out of a volume
+            size = _resolve_volume_size(outputs.get('volume_size'), len(records))
+            pages = [[] for volume in outputs['volumes']]
+            for result in sorted(results, key=lambda result: result['index']):
+                if result['success']:
+                    pages[result['index'] // size].append(diff.keys[result['index']])
+            outputs = dict(outputs, volumes=[dict(volume, pages=keys) for volume, keys in zip(outputs['volumes'], pages)])
+        return cls(diff.signature, students, outputs)
+
+    def to_dict(self):
+        return {'version': MANIFEST_VERSION, 'signature': self.signature, 'outputs': self.outputs,
+                'students': self.students}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {data.get('version')}")
+        return cls(data['signature'], data['students'], data.get('outputs'))
+
+    @classmethod
+    def load(cls, path):
+        """Read a manifest file; raises ValueError if it is not a batch manifest"""
+        try:
+            with open(path, encoding='utf8') as f:
+                return cls.from_dict(json.load(f))
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Not a batch manifest: {path} ({e})")
+
+    def save(self, path):
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, 'w', encoding='utf8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(partial, path)
+
+class RosterDiff:
+    """Per-row status of a new roster against an earlier manifest (added, changed or unchanged) and the removed seats"""
+
+    def __init__(self, signature, keys, status, changed_fields, removed):
+        self.signature = signature
+        self.keys = keys
+        self.status = status
+        self.changed_fields = changed_fields
+        self.removed = removed
+
+    def count(self, status):
+        return sum(1 for value in self.status if value == status)
+
+    @property
+    def affected(self):
+        """Row indices that have to be rendered"""
+        return [index for index, value in enumerate(self.status) if value != UNCHANGED]
+
+    def summary(self, seat_numbers):
+        """JSON-friendly report: counts plus the added and removed seats and each changed seat's fields"""
+        return {
+            'added': self.count(ADDED),
+            'changed': self.count(CHANGED),
+            'unchanged': self.count(UNCHANGED),
+            'removed': len(self.removed),
+            'added_seats': [seat for seat, value in zip(seat_numbers, self.status) if value == ADDED],
+            'removed_seats': self.removed,
+            'changed_fields': {seat_numbers[index]: fields for index, fields in self.changed_fields.items()}
+        }
+
+def diff_roster(renderer, records, fields, manifest=None):
+    """
+    Compare prepared records (and their roster_fields) with an earlier batch, keyed on Seat No.
+
+    A student is unchanged when their ticket's cache key matches the manifest - same fields, photo
+    contents, department, logo and layout. Changed students list the columns that differ, or 'Photo'
+    when only the photo did; a different department, logo or layout marks everyone changed.
+    """
+    signature = batch_signature(renderer)
+    same_batch = manifest is not None and manifest.signature == signature
+    previous = manifest.students if manifest is not None else {}
+
+    keys, status, changed_fields = [], [], {}
+    for index, (record, row_fields) in enumerate(zip(records, fields)):
+        try:
+            key = None if record.error else renderer.cache_key(record)
+        except Exception:
+            key = None  # unpreparable or invalid row - rendering reports the error
+        keys.append(key)
+
+        entry = previous.get(record.seat_no)
+        if entry is None:
+            status.append(ADDED)
+        elif same_batch and key is not None and entry['key'] == key:
+            status.append(UNCHANGED)
+        else:
+            status.append(CHANGED)
+            old_fields = entry.get('fields', {})
+            differing = [col for col, value in row_fields.items() if old_fields.get(col) != value]
+            if not same_batch:
+                differing.append('Layout')
+            changed_fields[index] = differing or ['Photo']
+
+    seats = {record.seat_no for record in records}
+    removed = [seat for seat in previous if seat not in seats]
+    return RosterDiff(signature, keys, status, changed_fields, removed)
+
+def _inside(directory, name):
+    # Names come from a manifest, which may have been uploaded: only plain files directly in `directory` qualify
+    if not isinstance(name, str) or name in ('', '.', '..') or os.path.basename(name) != name:
+        return None
+    path = os.path.join(directory, name)
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(directory):
+        return None  # a symlink out of the folder
+    return path
+
+class PreviousOutputs:
+    """
+    Read access to the files an earlier batch wrote, so unchanged entries can be copied instead of redrawn.
+
+    File and archive names from the manifest are only opened as plain files directly in `directory`.
+    """
+
+    def __init__(self, manifest, directory):
+        self.outputs = manifest.outputs if manifest is not None else {}
+        self.directory = directory
+        self._archive = None
+        self._readers = {}
+
+    def _read(self, name):
+        archive = self.outputs.get('archive')
+        try:
+            if archive:
+                if self._archive is None:
+                    path = _inside(self.directory, archive)
+                    if path is None:
+                        return None
+                    self._archive = zipfile.ZipFile(path)
+                return self._archive.read(name)
+            path = _inside(self.directory, name)
+            if path is None:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except (OSError, KeyError, TypeError, zipfile.BadZipFile):
+            return None  # moved, deleted or never written - the caller renders it again
+
+    def ticket(self, filename):
+        """PDF bytes of an unchanged student's ticket, or None"""
+        if self.outputs.get('kind') not in ('zip', 'files'):
+            return None
+        return self._read(filename)
+
+    def volume(self, number, digest, volume_size):
+        """Bytes of merged volume `number` if it held exactly the tickets hashed into `digest`, or None"""
+        if self.outputs.get('kind') != 'merged' or self.outputs.get('volume_size') != volume_size:
+            return None
+        volumes = self.outputs.get('volumes', [])
+        if number > len(volumes) or volumes[number - 1]['digest'] != digest:
+            return None
+        return self._read(volumes[number - 1]['filename'])
+
+    def page_index(self):
+        """
+        Ticket cache key -> (volume number, page number) for every page of an earlier merged batch.
+
+        Empty if that batch was not merged, its manifest predates per-page keys, or pypdf is missing.
+        """
+        if self.outputs.get('kind') != 'merged' or _pypdf() is None:
+            return {}
+        return {key: (number, page) for number, volume in enumerate(self.outputs.get('volumes', []), 1)
+                for page, key in enumerate(volume.get('pages') or []) if isinstance(key, str)}
+
+    def page(self, number, page):
+        """Page `page` of merged volume `number` as a pypdf page object, or None if it cannot be read"""
+        if number not in self._readers:
+            pypdf = _pypdf()
+            volumes = self.outputs.get('volumes', [])
+            data = self._read(volumes[number - 1]['filename']) if pypdf and number <= len(volumes) else None
+            try:
+                self._readers[number] = pypdf.PdfReader(io.BytesIO(data)) if data is not None else None
+            except pypdf.errors.PdfReadError:
+                self._readers[number] = None
+        reader = self._readers[number]
+        if reader is None or page >= len(reader.pages):
+            return None
+        return reader.pages[page]
+
+    def close(self):
+        self._readers = {}
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+def iter_incremental(renderer, records, diff, previous, workers=None, output_dir=None, progress=None, cache=None,
+                     checkpoint=None):
+    """
+    Yield a result per record in row order, rendering only the students the diff marks as affected.
+
+    Unchanged tickets are spliced in from `previous` (PreviousOutputs); when the previous batch wrote
+    per-student files into the same `output_dir`, those files are left alone. Anything that cannot be found is rendered after all.
+    With a `checkpoint` (see Checkpoint), tickets an interrupted run already finished are taken from it,
+    and every file written to `output_dir` is journaled.
+    Results carry `reused` (and `cached`, see TicketRenderer.iter_render, or `resumed`).
+    """
+    records = list(records)
+    done = {}
+    if checkpoint is not None:
+        for index, record in enumerate(records):
+            result = checkpoint.completed(index, record, renderer.filename(record))
+            if result is not None:
+                done[index] = result
+    rendered = renderer.iter_render([records[index] for index in diff.affected if index not in done],
+                                    workers=workers, output_dir=output_dir, cache=cache)
+    for index, (record, status) in enumerate(zip(records, diff.status)):
+        if index in done:
+            result = done.pop(index)
+        elif status != UNCHANGED:
+            result = next(rendered)
+        else:
+            result = _reuse(renderer, index, record, previous, output_dir)
+            if result is None:
+                result = next(renderer.iter_render([record], workers=1, output_dir=output_dir, cache=cache))
+        result.setdefault('reused', False)
+        result['index'] = index
+        if checkpoint is not None and output_dir is not None:
+            checkpoint.record(result)
+        if progress:
+            progress(result)
+        yield result
+
+def _reuse(renderer, index, record, previous, output_dir):
+    filename = renderer.filename(record)
+    data = None
+    # A file already in `output_dir` is only trusted if the previous batch wrote it there
+    in_place = previous.outputs.get('kind') == 'files' and output_dir is not None
+    if not (in_place and os.path.exists(os.path.join(output_dir, filename))):
+        data = previous.ticket(filename)
+        if data is None:
+            return None
+        if output_dir is not None:
+            with open(os.path.join(output_dir, filename), 'wb') as f:
+                f.write(data)
+            data = None
+    return {'index': index, 'seat_no': record.seat_no, 'success': True, 'filename': filename,
+            'data': data, 'error': None, 'cached': False, 'reused': True}
+
+def remove_stale_tickets(output_dir, diff, manifest):
+    """Delete the per-student files of seats no longer in the roster; returns the filenames removed"""
+    removed = []
+    for seat_no in diff.removed:
+        filename = manifest.students[seat_no].get('filename')
+        path = _inside(output_dir, filename)
+        if path is not None and os.path.isfile(path):
+            os.remove(path)
+            removed.append(filename)
+    return removed
+
+def iter_volumes_incremental(renderer, records, diff, previous, volume_size=None, workers=None, progress=None):
+    """
+    Yield (volume_number, pdf_bytes, results, digest) for a merged run, reusing what is unchanged.
+
+    A volume that holds exactly the same tickets in the same order is copied from `previous` as it is.
+    In any other volume only the added and changed students are drawn (in parallel across volumes);
+    pages of unchanged students are spliced in from the earlier volumes with pypdf. Results of copied
+    pages carry `reused`.
+    """
+    records = list(records)
+    size = _resolve_volume_size(volume_size, len(records))
+    pages = previous.page_index()
+    volumes = []
+    for number, start in enumerate(range(0, len(records), size), 1):
+        keys = diff.keys[start:start + size]
+        statuses = diff.status[start:start + size]
+        stable = None not in keys and all(status == UNCHANGED for status in statuses)
+        digest = _volume_digest(keys) if None not in keys else None
+        data = previous.volume(number, digest, volume_size or 0) if stable else None
+        kept = {}
+        if data is None:
+            for offset, (key, status) in enumerate(zip(keys, statuses)):
+                if status == UNCHANGED and key in pages:
+                    page = previous.page(*pages[key])
+                    if page is not None:
+                        kept[offset] = page
+        volumes.append((number, start, digest, data, kept))
+
+    tasks = [(renderer.draw_page, start, [record for offset, record in enumerate(records[start:start + size])
+                                          if offset not in kept], {})
+             for number, start, digest, data, kept in volumes if data is None]
+    rendered = map_ordered(render_volume, tasks, workers)
+    for number, start, digest, data, kept in volumes:
+        if data is None:
+            data, results = next(rendered)
+            if kept:
+                data, results = _splice(records[start:start + size], start, kept, data, results)
+            for result in results:
+                result.setdefault('reused', False)
+        else:
+            results = [_kept_result(start + offset, record) for offset, record in enumerate(records[start:start + size])]
+        if progress:
+            for result in results:
+                progress(result)
+        yield number, data, results, digest
+
+def _kept_result(index, record):
+    return {'index': index, 'seat_no': record.seat_no, 'success': True, 'filename': None, 'data': None,
+            'error': None, 'reused': True}
+
+def _splice(records, start, kept, data, drawn):
+    # The volume in row order: kept pages from the earlier batch, drawn pages for everyone else
+    pypdf = _pypdf()
+    writer = pypdf.PdfWriter()
+    drawn_pages = iter(pypdf.PdfReader(io.BytesIO(data)).pages)
+    drawn = iter(drawn)
+    results = []
+    for offset, record in enumerate(records):
+        if offset in kept:
+            writer.add_page(kept[offset])
+            results.append(_kept_result(start + offset, record))
+            continue
+        result = next(drawn)
+        result.update(index=start + offset, reused=False)  # drawn as a shorter volume, numbered from `start`
+        if result['success']:
+            writer.add_page(next(drawn_pages))
+        results.append(result)
+    if hasattr(writer, 'compress_identical_objects'):
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue(), results
@@ -0,0 +1,90 @@
+"""
+Candidate image ingestion - decode uploads straight from their streams, thumbnail them on a thread pool
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, UnidentifiedImageError
+from werkzeug.utils import secure_filename
+
+# Configuration
+THUMBNAIL_SIZE = (200, 200)
+IMAGE_WORKERS_ENV_VAR = 'HALLTICKET_IMAGE_WORKERS'
+
+def resolve_image_workers(workers=None):
+    """Threads for image ingestion; Pillow releases the GIL while decoding and resizing"""
+    if workers in (None, '', 0, '0'):
+        workers = os.environ.get(IMAGE_WORKERS_ENV_VAR) or min(8, (os.cpu_count() or 1) + 4)
+    try:
+        workers = int(workers)
+    except (TypeError, ValueError):
+        workers = 1
+    return max(1, workers)
+
+def target_name(filename):
+    """(seat_no, stored filename) for an upload named 'SeatNo.ext' or 'SeatNo_Name.ext'"""
+    filename = secure_filename(filename)
+    seat_no = filename.split('_')[0].split('.')[0]
+    ext = filename.rsplit('.', 1)[1].lower()
+    return seat_no, f"{seat_no}.{ext}"
+
+def thumbnail_to_file(stream, file_path, size=THUMBNAIL_SIZE):
+    """Decode an image from `stream`, shrink it to fit `size` and save it to `file_path`"""
+    with Image.open(stream) as img:
+        # JPEG only: let the decoder downscale by 1/2, 1/4 or 1/8 while decoding, far cheaper than a full
+        # decode (recent Pillow does this inside thumbnail() too; doing it here keeps it explicit on any version)
+        img.draft(img.mode, (size[0] * 2, size[1] * 2))
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        img.save(file_path, optimize=True)
+
+def _ingest_one(upload, images_dir):
+    filename, stream, seat_no, new_filename = upload
+    started = time.perf_counter()
+    file_path = os.path.join(images_dir, new_filename)
+    entry = {'filename': filename, 'seat_no': seat_no}
+    try:
+        thumbnail_to_file(stream, file_path)
+        entry.update({'filename': new_filename, 'path': file_path, 'original_filename': filename})
+        ok = True
+    except Exception as e:
+        # Pillow could not decode it, so reportlab could not draw it either - don't store it
+        entry['error'] = 'Not a readable image file' if isinstance(e, UnidentifiedImageError) else str(e)
+        ok = False
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    entry['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return ok, entry
+
+def ingest_images(files, images_dir, allowed_extensions, workers=None):
+    """
+    Thumbnail every uploaded file into `images_dir` and return (images, failed).
+
+    `files` are (filename, stream) pairs in upload order; results keep that order. As before, a
+    later upload for the same seat number replaces an earlier one, so only the last is processed.
+    """
+    images, failed, uploads = [], [], []
+    last_for_target = {}
+    for filename, stream in files:
+        if not filename:
+            continue
+        if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+            failed.append({'filename': filename, 'error': 'Unsupported file type', 'elapsed_ms': 0.0})
+            continue
+        seat_no, new_filename = target_name(filename)
+        last_for_target[new_filename] = len(uploads)
+        uploads.append((filename, stream, seat_no, new_filename))
+
+    work = []
+    for position, upload in enumerate(uploads):
+        if last_for_target[upload[3]] == position:
+            work.append(upload)
+        else:
+            failed.append({'filename': upload[0], 'seat_no': upload[2], 'elapsed_ms': 0.0,
+                           'error': f'Replaced by a later upload for seat number {upload[2]}'})
+
+    workers = min(resolve_image_workers(workers), max(1, len(work)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for ok, entry in pool.map(lambda upload: _ingest_one(upload, images_dir), work):
+            (images if ok else failed).append(entry)
+    return images, failed
@@ -0,0 +1,127 @@
+"""
+Batch job files - a YAML or JSON list of rosters and departments for unattended CLI runs
+"""
+
+import json
+import os
+import re
+
+# Settings a job may have; top-level values in the file are defaults for every job
+JOB_SETTINGS = ('roster', 'department', 'logo', 'subjects', 'merged', 'volume_size', 'output_dir', 'previous',
+                'workers')
+PATH_SETTINGS = ('roster', 'logo', 'output_dir', 'previous')
+DEFAULT_DEPARTMENT = "INFORMATION SCIENCE ENGINEERING"
+DEFAULT_OUTPUT_DIR = "output"
+
+# previous: auto (use the manifest in the output directory if there is one), none, or a manifest path
+PREVIOUS_AUTO = 'auto'
+PREVIOUS_NONE = 'none'
+
+class BatchJob:
+    """One roster to generate: where it comes from, how the tickets look and where they go"""
+
+    def __init__(self, roster, department=DEFAULT_DEPARTMENT, logo=None, subjects=None, merged=False,
+                 volume_size=0, output_dir=None, previous=PREVIOUS_AUTO, workers=None):
+        self.roster = roster
+        self.department = department
+        self.logo = logo
+        self.subjects = subjects
+        self.merged = merged
+        self.volume_size = volume_size
+        self.output_dir = output_dir
+        self.previous = previous
+        self.workers = workers
+
+    def __repr__(self):
+        return f"BatchJob({self.roster!r}, {self.department!r})"
+
+    @property
+    def name(self):
+        """Short label for progress output: the department, or the roster file name"""
+        return self.department or os.path.basename(self.roster)
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_') or 'batch'
+
+def _parse(path, text):
+    loads = json.loads
+    if path.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML job files need PyYAML (pip install pyyaml); JSON job files work without it")
+        loads = yaml.safe_load
+    try:
+        return loads(text)
+    except Exception as e:
+        raise ValueError(f"Could not parse job file {path}: {e}")
+
+def _subjects(value, where):
+    # A list of "CODE - Name" entries, or one string with one subject per line
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.splitlines()
+    if not isinstance(value, list):
+        raise ValueError(f"{where}: subjects must be a list or a multi-line string")
+    return [str(subject).strip() for subject in value if str(subject).strip()] or None
+
+def load_job_file(path):
+    """
+    Read a job file into BatchJobs; raises ValueError for anything malformed.
+
+    The file holds `jobs:` (a list of settings per roster) plus optional top-level defaults.
+    Relative paths are taken from the job file's folder. Jobs without `output_dir` write into
+    <default output_dir>/<department>, so departments sharing a file never overwrite each other.
+    """
+    with open(path, encoding='utf8') as f:
+        data = _parse(path, f.read())
+    if isinstance(data, list):
+        data = {'jobs': data}
+    if not isinstance(data, dict) or not isinstance(data.get('jobs'), list) or not data['jobs']:
+        raise ValueError(f"{path}: expected a non-empty 'jobs' list")
+
+    unknown = set(data) - set(JOB_SETTINGS) - {'jobs'}
+    if unknown:
+        raise ValueError(f"{path}: unknown settings {', '.join(sorted(unknown))}")
+    defaults = {key: data[key] for key in JOB_SETTINGS if key in data}
+    base = os.path.dirname(os.path.abspath(path))
+    root_output = defaults.pop('output_dir', DEFAULT_OUTPUT_DIR)
+
+    jobs, stems, output_dirs = [], set(), set()
+    for number, entry in enumerate(data['jobs'], 1):
+        where = f"{path}: job {number}"
+        if isinstance(entry, str):
+            entry = {'roster': entry}
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected a mapping of settings")
+        unknown = set(entry) - set(JOB_SETTINGS)
+        if unknown:
+            raise ValueError(f"{where}: unknown settings {', '.join(sorted(unknown))}")
+        settings = dict(defaults, **entry)
+        if not settings.get('roster'):
+            raise ValueError(f"{where}: 'roster' is required")
+        settings['department'] = str(settings.get('department') or DEFAULT_DEPARTMENT)
+        settings['subjects'] = _subjects(settings.get('subjects'), where)
+        settings['merged'] = bool(settings.get('merged', False))
+        settings['volume_size'] = int(settings.get('volume_size') or 0)
+        if 'output_dir' not in settings:
+            stem = _slug(settings['department'])
+            if stem in stems:
+                stem = f"{stem}_{_slug(os.path.splitext(os.path.basename(settings['roster']))[0])}"
+            stems.add(stem)
+            settings['output_dir'] = os.path.join(root_output, stem)
+        previous = settings.get('previous', PREVIOUS_AUTO)
+        previous = PREVIOUS_NONE if previous in (None, False) else str(previous)
+        settings['previous'] = previous if previous.lower() not in (PREVIOUS_AUTO, PREVIOUS_NONE) else previous.lower()
+
+        for key in PATH_SETTINGS:
+            value = settings.get(key)
+            if value and not (key == 'previous' and value in (PREVIOUS_AUTO, PREVIOUS_NONE)):
+                settings[key] = os.path.join(base, os.path.expanduser(str(value)))
+        if settings['output_dir'] in output_dirs:
+            # Each directory holds one batch's manifest
+            raise ValueError(f"{where}: output_dir {settings['output_dir']} is used by another job")
+        output_dirs.add(settings['output_dir'])
+        jobs.append(BatchJob(**settings))
+    return jobs
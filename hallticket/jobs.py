@@ -0,0 +1,235 @@
+"""
+In-process job queue so long generation runs don't block an HTTP request
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import uuid
+from .sessions import process_alive
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DEFAULT_JOB_WORKERS = 2
+MAX_FINISHED_JOBS = 200
+PUBLISH_SECONDS = 1.0  # a running job's progress is written to the status folder at most this often
+STATUS_TTL = 24 * 3600  # status files untouched for this long are removed, whichever process wrote them
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+class Job:
+    """A single generation run and its progress counters"""
+
+    def __init__(self, job_id, publish=None):
+        self.id = job_id
+        self.status = QUEUED
+        self.total = 0
+        self.outcomes = {}  # row index -> True/False, so retried rows are never double counted
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._publish = publish  # writes the status where other processes can read it
+        self._published = 0.0
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+        self.publish()
+
+    def record(self, result):
+        """Progress callback for render_batch - store one row's success/failure"""
+        with self._lock:
+            self.outcomes[result['index']] = result['success']
+        if self._publish is not None and time.monotonic() - self._published >= PUBLISH_SECONDS:
+            self.publish()
+
+    def publish(self):
+        """Hand the current status to the queue's status folder, if it has one"""
+        if self._publish is not None:
+            self._published = time.monotonic()
+            self._publish(self)
+
+    def to_dict(self):
+        with self._lock:
+            done = sum(1 for ok in self.outcomes.values() if ok)
+            failed = len(self.outcomes) - done
+            total = self.total
+        processed = done + failed
+        remaining = max(0, total - processed)
+
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        eta = None
+        if self.status == RUNNING and processed:
+            eta = round(elapsed / processed * remaining, 1)
+        elif self.status in (COMPLETED, FAILED):
+            eta = 0.0
+
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'total': total,
+            'done': done,
+            'failed': failed,
+            'remaining': remaining,
+            'elapsed_seconds': round(elapsed, 1),
+            'eta_seconds': eta,
+            'result': self.result,
+            'error': self.error
+        }
+
+class JobQueue:
+    """
+    FIFO queue of jobs executed by a small pool of background threads.
+
+    A job runs in the process that queued it. With a `status_dir`, each job's status is also
+    written there as <job id>.json (on every state change, and at most every PUBLISH_SECONDS while
+    it runs), so status() answers for the jobs of every process sharing the folder.
+    """
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, max_finished=MAX_FINISHED_JOBS, status_dir=None):
+        self.workers = max(1, int(workers))
+        self.max_finished = max_finished
+        self.status_dir = status_dir
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_started(self):
+        # Threads are started lazily so importing the app never spawns them
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'hallticket-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def create(self):
+        """A new queued Job, not yet given anything to run: its id can be handed out (e.g. to pin files) first"""
+        job = Job(uuid.uuid4().hex, self._write_status if self.status_dir else None)
+        with self._lock:
+            self._jobs[job.id] = job
+            pruned = self._prune()
+        job.publish()
+        self._remove_status(pruned)
+        return job
+
+    def submit(self, func, *args, job=None, **kwargs):
+        """Queue `func(job, *args, **kwargs)` on `job` (a new one by default) and return the Job immediately"""
+        job = job or self.create()
+        self._ensure_started()
+        self._queue.put((job, func, args, kwargs))
+        return job
+
+    def execute(self, func, *args, job=None, **kwargs):
+        """Run `func(job, *args, **kwargs)` on the calling thread and return the finished Job"""
+        return self.run(job or self.create(), func, *args, **kwargs)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Status dict of a job queued by this or, through the status folder, any other process; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not self.status_dir or not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.status_dir, f"{job_id}.json"), encoding='utf8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+        pid = status.pop('pid', None)
+        if status['status'] in (QUEUED, RUNNING) and pid and not process_alive(pid):
+            status.update(status=FAILED, eta_seconds=0.0, error='The worker process running this job exited')
+        return status
+
+    def run(self, job, func, *args, **kwargs):
+        """Execute a job on the current thread"""
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.publish()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = COMPLETED
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job.publish()
+        return job
+
+    def _write_status(self, job):
+        path = os.path.join(self.status_dir, f"{job.id}.json")
+        partial = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(partial, 'w', encoding='utf8') as f:
+                json.dump(dict(job.to_dict(), pid=os.getpid()), f, default=str)
+            os.replace(partial, path)
+        except OSError as e:
+            logger.warning("Could not write the status of job %s: %s", job.id, e)
+
+    def _remove_status(self, job_ids):
+        # The pruned jobs' status files, and any a process left behind longer than STATUS_TTL ago
+        if not self.status_dir:
+            return
+        paths = [os.path.join(self.status_dir, f"{job_id}.json") for job_id in job_ids]
+        cutoff = time.time() - STATUS_TTL
+        try:
+            entries = list(os.scandir(self.status_dir))
+        except OSError:
+            entries = []
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    paths.append(entry.path)
+            except OSError:
+                continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """Jobs known to the queue by status, and how many are waiting for a thread"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        counts = {status: statuses.count(status) for status in (QUEUED, RUNNING, COMPLETED, FAILED)}
+        return {'jobs': counts, 'waiting': self._queue.qsize(), 'workers': self.workers}
+
+    def _worker(self):
+        while True:
+            job, func, args, kwargs = self._queue.get()
+            try:
+                self.run(job, func, *args, **kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        # Forget the oldest finished jobs once too many have piled up; returns their ids
+        finished = [job for job in self._jobs.values() if job.status in (COMPLETED, FAILED)]
+        excess = max(0, len(finished) - self.max_finished)
+        pruned = [job.id for job in sorted(finished, key=lambda job: job.finished_at)[:excess]]
+        for job_id in pruned:
+            del self._jobs[job_id]
+        return pruned
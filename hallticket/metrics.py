@@ -0,0 +1,226 @@
+"""
+Instrumentation - per-stage timers and batch counters, exported as Prometheus text or a JSON summary
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Configuration
+LOG_LEVEL_ENV_VAR = 'HALLTICKET_LOG_LEVEL'  # DEBUG shows per-ticket lines, WARNING only problems
+DEFAULT_LOG_LEVEL = 'INFO'
+
+# Counters every batch reports, with their Prometheus help text
+COUNTERS = {
+    'batches': 'Generation runs started',
+    'tickets_rendered': 'Tickets drawn',
+    'tickets_failed': 'Tickets that could not be drawn',
+    'tickets_skipped': 'Tickets not drawn because roster validation rejected the row',
+    'tickets_cached': 'Tickets served from the render cache',
+    'tickets_reused': 'Tickets copied from a previous batch',
+    'photo_hits': 'Students with a photo found',
+    'photo_misses': 'Students without a photo',
+}
+
+# Upper bounds (seconds) of the per-ticket render time histogram
+TICKET_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def configure_logging(level=None, fmt='%(asctime)s %(levelname)s %(name)s: %(message)s'):
+    """Set up root logging at `level`, or HALLTICKET_LOG_LEVEL (default INFO)"""
+    level = (level or os.environ.get(LOG_LEVEL_ENV_VAR) or DEFAULT_LOG_LEVEL).upper()
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), format=fmt)
+
+class Metrics:
+    """
+    Process-wide totals: seconds and runs per stage, the COUNTERS and a histogram of per-ticket render time.
+
+    Each run records into its own BatchTimer, which adds to these totals as it goes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_runs = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.ticket_buckets = [0] * len(TICKET_BUCKETS)
+        self.ticket_count = 0
+        self.ticket_seconds = 0.0
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_runs[stage] = self.stage_runs.get(stage, 0) + 1
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_ticket(self, seconds):
+        with self._lock:
+            self.ticket_count += 1
+            self.ticket_seconds += seconds
+            for i, bound in enumerate(TICKET_BUCKETS):
+                if seconds <= bound:
+                    self.ticket_buckets[i] += 1
+
+    def batch(self):
+        """A BatchTimer for one run, feeding these totals"""
+        return BatchTimer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'stages_seconds': {stage: round(seconds, 4) for stage, seconds in self.stage_seconds.items()},
+                'stage_runs': dict(self.stage_runs),
+                'counters': dict(self.counters),
+                'tickets_timed': self.ticket_count,
+                'ticket_seconds': round(self.ticket_seconds, 4)
+            }
+
+    def prometheus(self, caches=None, gauges=None):
+        """
+        The totals in Prometheus text exposition format.
+
+        `caches` maps a cache name to its stats() dict (hits, misses, evictions, entries/size_bytes);
+        `gauges` maps extra metric names to (help, label name, {label value: value}).
+        """
+        with self._lock:
+            stage_seconds = dict(self.stage_seconds)
+            stage_runs = dict(self.stage_runs)
+            counters = dict(self.counters)
+            buckets = list(self.ticket_buckets)
+            ticket_count, ticket_seconds = self.ticket_count, self.ticket_seconds
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP hallticket_{name} {help_text}")
+            lines.append(f"# TYPE hallticket_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"hallticket_{name}{labels} {value}")
+
+        metric('stage_seconds_total', 'counter', 'Time spent in each pipeline stage',
+               [(f'{{stage="{stage}"}}', round(seconds, 6)) for stage, seconds in sorted(stage_seconds.items())])
+        metric('stage_runs_total', 'counter', 'Times each pipeline stage ran',
+               [(f'{{stage="{stage}"}}', runs) for stage, runs in sorted(stage_runs.items())])
+        for name, value in counters.items():
+            metric(f'{name}_total', 'counter', COUNTERS.get(name, name.replace('_', ' ')), [('', value)])
+
+        samples = [(f'{{le="{bound}"}}', count) for bound, count in zip(TICKET_BUCKETS, buckets)]
+        samples.append(('{le="+Inf"}', ticket_count))
+        lines.append("# HELP hallticket_ticket_render_seconds Time to draw and save one ticket")
+        lines.append("# TYPE hallticket_ticket_render_seconds histogram")
+        lines.extend(f"hallticket_ticket_render_seconds_bucket{labels} {value}" for labels, value in samples)
+        lines.append(f"hallticket_ticket_render_seconds_sum {round(ticket_seconds, 6)}")
+        lines.append(f"hallticket_ticket_render_seconds_count {ticket_count}")
+
+        caches = caches or {}
+        for key, kind, help_text in (('hits', 'counter', 'Cache lookups that found an entry'),
+                                     ('misses', 'counter', 'Cache lookups that found nothing'),
+                                     ('evictions', 'counter', 'Cache entries dropped'),
+                                     ('entries', 'gauge', 'Entries currently cached'),
+                                     ('size_bytes', 'gauge', 'Bytes currently cached')):
+            samples = [(f'{{cache="{name}"}}', stats[key]) for name, stats in sorted(caches.items())
+                       if stats.get(key) is not None]
+            if samples:
+                metric(f'cache_{key}_total' if kind == 'counter' else f'cache_{key}', kind, help_text, samples)
+
+        for name, (help_text, label, values) in (gauges or {}).items():
+            metric(name, 'gauge', help_text, [(f'{{{label}="{value_label}"}}', value) for value_label, value in values.items()])
+        return '\n'.join(lines) + '\n'
+
+class BatchTimer:
+    """
+    Stage timings and counters of one run, also added to the process-wide Metrics.
+
+    Stage times are exclusive: time spent in a stage nested inside another (or charged by timed())
+    is not counted again in the enclosing one, so the stages of a run add up to its wall time.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._nested = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage `name`"""
+        started = time.perf_counter()
+        nested = self._nested
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            self._add_stage(name, wall - (self._nested - nested))
+            self._nested = nested + wall
+
+    def timed(self, items, name):
+        """Pass `items` through, charging the time spent waiting for each one to stage `name`"""
+        items = iter(items)
+        waited = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                nested = self._nested
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    wall = time.perf_counter() - started
+                    waited += wall - (self._nested - nested)
+                    self._nested = nested + wall
+                yield item
+        finally:
+            self._add_stage(name, waited)  # once per run, however many items
+
+    def tally(self, results):
+        """Pass render results through, counting rendered, failed, cached and reused tickets"""
+        for result in results:
+            self.record(result)
+            yield result
+
+    def record(self, result):
+        """Count one render result (usable as a progress callback)"""
+        if result.get('skipped'):
+            self.inc('tickets_skipped')
+        elif not result['success']:
+            self.inc('tickets_failed')
+        elif result.get('reused'):
+            self.inc('tickets_reused')
+        elif result.get('cached'):
+            self.inc('tickets_cached')
+        else:
+            self.inc('tickets_rendered')
+            if result.get('elapsed_ms') is not None and self.metrics is not None:
+                self.metrics.observe_ticket(result['elapsed_ms'] / 1000)
+
+    def count_photos(self, records):
+        """Count students whose photo was found (records come from prepare_records)"""
+        hits = sum(1 for record in records if record.photo_path is not None)
+        self.inc('photo_hits', hits)
+        self.inc('photo_misses', len(records) - hits)
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self.metrics is not None:
+            self.metrics.inc(name, value)
+
+    def _add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.metrics is not None:
+            self.metrics.observe_stage(name, seconds)
+
+    def summary(self):
+        """JSON-friendly timings and counters of this run"""
+        return {
+            'stages_seconds': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'total_seconds': round(sum(self.stages.values()), 4),
+            'counters': dict(self.counters)
+        }
+
+# One set of totals per process, served by /metrics
+metrics = Metrics()
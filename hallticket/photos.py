@@ -0,0 +1,57 @@
+"""
+Candidate photo index - one directory scan, then seat numbers are matched with a dictionary lookup
+"""
+
+import os
+
+# Same extensions the upload form accepts, in the order they are preferred when a seat has several
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'bmp')
+
+def normalise_seat_no(value):
+    """Case- and whitespace-insensitive key for a seat number"""
+    return str(value).strip().upper()
+
+def seat_from_filename(filename):
+    """Seat number part of 'SeatNo.ext' or 'SeatNo_Name.ext', or None if it is not an image"""
+    stem, dot, ext = filename.rpartition('.')
+    if not dot or ext.lower() not in IMAGE_EXTENSIONS:
+        return None
+    seat_no = stem.split('_')[0]
+    return normalise_seat_no(seat_no) if seat_no.strip() else None
+
+def build_photo_index(directory):
+    """
+    Map normalised seat number -> photo path for every image in `directory`, using a single scandir.
+
+    When a seat has several images, a plain 'SeatNo.ext' wins over 'SeatNo_Name.ext', then the
+    extension order in IMAGE_EXTENSIONS decides.
+    """
+    index, ranks = {}, {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return index
+
+    for entry in entries:
+        seat_no = seat_from_filename(entry.name)
+        if seat_no is None or not entry.is_file():
+            continue
+        stem, ext = entry.name.rsplit('.', 1)
+        rank = ('_' in stem, IMAGE_EXTENSIONS.index(ext.lower()))
+        if seat_no not in ranks or rank < ranks[seat_no]:
+            index[seat_no] = entry.path
+            ranks[seat_no] = rank
+    return index
+
+def match_photos(seat_numbers, index):
+    """Photo path for each seat number in a Series (NaN where there is none), as one vectorised map"""
+    return seat_numbers.map(str).str.strip().str.upper().map(index)
+
+def apply_photo_index(df, index):
+    """Fill df['Photo Path'] from the index, keeping any existing path for unmatched students; returns the match count"""
+    matched = match_photos(df['Seat No'], index)
+    if 'Photo Path' in df.columns:
+        df['Photo Path'] = matched.astype(object).where(matched.notna(), df['Photo Path'])
+    else:
+        df['Photo Path'] = matched
+    return int(matched.notna().sum())
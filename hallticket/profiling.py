@@ -0,0 +1,105 @@
+"""
+Profiling - run one batch under cProfile, save the stats and summarise the hot functions by library
+"""
+
+import cProfile
+import os
+import pstats
+import sysconfig
+import time
+
+# Configuration
+DEFAULT_TOP = 20
+PROFILE_SUFFIX = '.prof'  # pstats format: python -m pstats, snakeviz, etc.
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+def _library(filename):
+    """Which library a profiled function belongs to: a site-packages name, 'hallticket', 'stdlib' or 'app'"""
+    if filename == '~':
+        return None  # C builtin - charged to whoever called it
+    if filename.startswith('<'):
+        return 'stdlib'  # <frozen importlib._bootstrap> and friends
+    path = os.path.abspath(filename)
+    parts = path.split(os.sep)
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts[:-1]:
+            return parts[parts.index(marker) + 1].split('.')[0]
+    if path.startswith(_PACKAGE_DIR):
+        return 'hallticket'
+    if path.startswith(_STDLIB_DIR):
+        return 'stdlib'
+    return 'app'
+
+def _location(filename, line):
+    if filename == '~':
+        return 'builtin'
+    parts = os.path.abspath(filename).split(os.sep)
+    for marker in ('site-packages', 'dist-packages'):
+        if marker in parts[:-1]:
+            parts = parts[parts.index(marker) + 1:]
+            break
+    else:
+        parts = parts[-2:]
+    return f"{'/'.join(parts)}:{line}"
+
+def summarise_profile(stats, top=DEFAULT_TOP):
+    """
+    Hot-function summary of a pstats.Stats: own time per library and the `top` functions by own time.
+
+    Time inside C builtins (zlib, Pillow's codecs, numpy kernels) is charged to the library that
+    called them, so reportlab's compression counts as reportlab and image decoding as PIL.
+    """
+    by_library = {}
+    for (filename, line, name), (cc, calls, own, cumulative, callers) in stats.stats.items():
+        library = _library(filename)
+        if library is not None:
+            by_library[library] = by_library.get(library, 0.0) + own
+            continue
+        charged = 0.0
+        for (caller_file, caller_line, caller_name), (_, _, caller_own, _) in callers.items():
+            caller_library = _library(caller_file) or 'builtins'
+            by_library[caller_library] = by_library.get(caller_library, 0.0) + caller_own
+            charged += caller_own
+        if own > charged:
+            by_library['builtins'] = by_library.get('builtins', 0.0) + own - charged
+
+    hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return {
+        'total_seconds': round(stats.total_tt, 4),
+        'by_library': {library: round(seconds, 4)
+                       for library, seconds in sorted(by_library.items(), key=lambda item: item[1], reverse=True)
+                       if round(seconds, 4)},
+        'top': [{'function': name, 'location': _location(filename, line), 'library': _library(filename) or 'builtins',
+                 'calls': calls, 'own_seconds': round(own, 4), 'cumulative_seconds': round(cumulative, 4)}
+                for (filename, line, name), (cc, calls, own, cumulative, callers) in hottest]
+    }
+
+def profile_run(func, *args, path=None, top=DEFAULT_TOP, **kwargs):
+    """
+    Call `func(*args, **kwargs)` under cProfile and return (its result, hot-function summary).
+
+    Only the calling thread is profiled, so callers render serially to keep drawing in the profile.
+    With `path` the raw stats are saved there too; `path` may also be a function of the result, for
+    output names only known once the run is over. If another profiler is already active
+    (Python 3.12+ allows only one), the call runs unprofiled and the summary says why.
+    """
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        return func(*args, **kwargs), {'error': f'Profiler unavailable: {e}'}
+    try:
+        value = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+    summary = summarise_profile(pstats.Stats(profiler), top)
+    summary['wall_seconds'] = round(time.perf_counter() - started, 4)
+    if callable(path):
+        path = path(value)
+    if path is not None:
+        profiler.dump_stats(path)
+        summary['profile_path'] = path
+    return value, summary
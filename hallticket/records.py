@@ -0,0 +1,132 @@
+"""
+Row preparation - turns the roster DataFrame into compact, pre-formatted ticket records in one vectorised pass
+"""
+
+import os
+from typing import Any, List, Mapping, Optional, Tuple, Union
+
+REQUIRED_COLUMNS = ['Seat No', 'Exam No', 'Name', 'Date', 'Exam Center', 'Subjects Applied']
+PHOTO_COLUMN = 'Photo Path'
+
+SEAT_LABEL = "1. UNIVERSITY SEAT NO.: "
+EXAM_NO_LABEL = "     No: "
+DATE_LABEL = "     Date: "
+NAME_LABEL = "2. NAME OF THE CANDIDATE: "
+CENTER_LABEL = "Exam Center: "
+
+class TicketRecord:
+    """
+    Everything the render loop needs for one student, already formatted as plain strings.
+
+    `error` is set by ValidationReport.mark() for rows that failed validation; they are skipped, not drawn.
+    """
+
+    __slots__ = ('seat_no', 'details_line', 'name_line', 'center_line', 'subjects', 'photo_path', 'error')
+
+    def __init__(self, seat_no: str, details_line: str, name_line: str, center_line: str,
+                 subjects: Tuple[str, ...], photo_path: Optional[str] = None, error: Optional[str] = None) -> None:
+        self.seat_no = seat_no
+        self.details_line = details_line
+        self.name_line = name_line
+        self.center_line = center_line
+        self.subjects = subjects
+        self.photo_path = photo_path
+        self.error = error
+
+    def __reduce__(self):
+        # Pickle as a flat tuple - records are shipped to worker processes in bulk
+        return (TicketRecord, tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        return f"TicketRecord({self.seat_no!r}, subjects={len(self.subjects)}, photo={self.photo_path!r})"
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> 'TicketRecord':
+        """Prepare a single raw row (dict or Series) the same way prepare_records does a whole DataFrame"""
+        photo_path = row.get(PHOTO_COLUMN)
+        if not _has_value(photo_path) or not os.path.exists(str(photo_path)):
+            photo_path = None
+        return cls(
+            str(row['Seat No']),
+            f"{SEAT_LABEL}{row['Seat No']}{EXAM_NO_LABEL}{row['Exam No']}{DATE_LABEL}{row['Date']}",
+            f"{NAME_LABEL}{row['Name']}",
+            f"{CENTER_LABEL}{row['Exam Center']}",
+            tuple(sub.strip() for sub in str(row['Subjects Applied']).split(",")),
+            None if photo_path is None else str(photo_path)
+        )
+
+Row = Union[TicketRecord, Mapping[str, Any]]
+
+def _has_value(value: Any) -> bool:
+    # Empty Excel cells arrive as NaN (a float that is not equal to itself) or None
+    if value is None or value != value:
+        return False
+    return str(value).strip() != ''
+
+def _text(series):
+    # str() of every cell (NaN -> 'nan', Timestamps in full), exactly as the old f-strings formatted them
+    return series.map(str)
+
+def _shared(values):
+    # One object per distinct value: rosters repeat subjects and centres, and pickle only stores shared objects once
+    canonical = {}
+    return [canonical.setdefault(value, value) for value in values]
+
+def split_subjects(series):
+    """Tuple of stripped subject names per row; each distinct 'Subjects Applied' text is split only once"""
+    texts = _text(series)
+    distinct = texts.drop_duplicates()
+    split = dict(zip(distinct, distinct.str.strip().str.split(r'\s*,\s*', regex=True).map(tuple)))
+    return texts.map(split)
+
+def resolve_photo_paths(series, known_photos=()):
+    """
+    List of photo paths that exist on disk, None elsewhere; each distinct path is checked only once.
+
+    Paths in `known_photos` (e.g. straight from a photo index scan) are trusted without a stat.
+    """
+    paths = _text(series)
+    present = series.notna() & paths.str.strip().ne('')
+    exists = {path: path in known_photos or os.path.exists(path) for path in paths[present].unique()}
+    found = present & paths.map(lambda path: exists.get(path, False))
+    return [path if ok else None for path, ok in zip(paths, found)]
+
+def prepare_records(df, known_photos=()) -> List[TicketRecord]:
+    """
+    Convert the roster into TicketRecords with column-wise pandas string operations.
+
+    Subjects are split, photo paths resolved and display lines formatted once per column rather
+    than once per row, so rendering never touches pandas. `known_photos` is passed on to
+    resolve_photo_paths. Raises ValueError on missing columns.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f'Missing required columns: {", ".join(missing)}')
+
+    seat = _text(df['Seat No'])
+    details = SEAT_LABEL + seat + EXAM_NO_LABEL + _text(df['Exam No']) + DATE_LABEL + _text(df['Date'])
+    names = NAME_LABEL + _text(df['Name'])
+    centers = _shared(CENTER_LABEL + _text(df['Exam Center']))
+    subjects = split_subjects(df['Subjects Applied'])
+    if PHOTO_COLUMN in df.columns:
+        photos = resolve_photo_paths(df[PHOTO_COLUMN], known_photos)
+    else:
+        photos = [None] * len(df)
+
+    return [TicketRecord(*fields) for fields in zip(seat, details, names, centers, subjects, photos)]
+
+def as_record(row: Row) -> TicketRecord:
+    """Pass prepared records through, prepare raw rows on the fly"""
+    if isinstance(row, TicketRecord):
+        return row
+    return TicketRecord.from_row(row)
+
+def row_error(row: Row) -> Optional[str]:
+    """Why validation rejected a prepared record, or None for a row to render"""
+    return row.error if isinstance(row, TicketRecord) else None
+
+def seat_number(row: Row) -> Any:
+    """Seat number of a prepared record or a raw row, for result reporting"""
+    if isinstance(row, TicketRecord):
+        return row.seat_no
+    return row.get('Seat No')
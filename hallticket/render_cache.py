@@ -0,0 +1,116 @@
+"""
+Persistent render cache - finished ticket PDFs stored on disk under a hash of everything that shaped them
+"""
+
+import logging
+import os
+import threading
+from .cachedir import CacheFiles, default_cache_dir, private_dir, resolve_max_bytes
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+RENDER_CACHE_ENV_VAR = 'HALLTICKET_RENDER_CACHE_MB'  # size bound in MB, 0 disables the cache
+DEFAULT_MAX_MB = 512
+
+class RenderCache:
+    """
+    Content-addressed store of rendered PDFs with a size-bounded LRU on local disk (see CacheFiles).
+
+    Keys are hex digests (see TicketRenderer.cache_key). Reading an entry refreshes its mtime,
+    and when the total size passes `max_bytes` the least recently used entries are deleted.
+    Several processes may share a directory; writes are atomic renames. A directory that fails
+    the private_dir check turns the cache off instead of serving files others could have planted.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory
+        self.files = CacheFiles(resolve_max_bytes(RENDER_CACHE_ENV_VAR, DEFAULT_MAX_MB) if max_bytes is None
+                                else max_bytes, '.pdf')
+        self._lock = threading.Lock()
+        self._refused = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self):
+        return self.files.max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        self.files.max_bytes = value
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self._root() is not None
+
+    def _root(self):
+        if self._refused:
+            return None
+        try:
+            return private_dir(self.directory or os.path.join(default_cache_dir(), 'renders'))
+        except (OSError, ValueError) as e:
+            logger.warning("Render cache disabled: %s", e)
+            self._refused = True
+            return None
+
+    def _path(self, key):
+        # Two-level fan-out keeps directories small for big rosters
+        return os.path.join(self._root(), key[:2], f"{key}.pdf")
+
+    def contains(self, key):
+        """Whether `key` is stored (counted as a hit or miss - the batch lookup happens here)"""
+        if not self.enabled:
+            return False
+        found = os.path.exists(self._path(key))
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def get(self, key):
+        """Cached PDF bytes for `key`, or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store PDF bytes under `key`, evicting old entries if the cache grows past its bound"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+        self.files.added(self._root(), len(data))
+
+    def evict(self):
+        """Delete least recently used entries until the cache is back under EVICT_TO of its bound"""
+        root = self._root()
+        return self.files.evict(root) if root is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'directory': self._root(),
+                'max_bytes': self.max_bytes,
+                'size_bytes': self.files.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.files.evictions
+            }
+
+# One cache object per process; the files are shared by every process and run
+render_cache = RenderCache()
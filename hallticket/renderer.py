@@ -0,0 +1,208 @@
+"""
+TicketRenderer - the single implementation of a hall ticket page, used by the web app, CLI, GUI and API
+"""
+
+import hashlib
+import io
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import reportlab
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .derivatives import content_digest
+from .engine import DEFAULT_CHUNK_SIZE, iter_render
+from .images import draw_image
+from .records import Row, TicketRecord, as_record, row_error, seat_number
+from .render_cache import RenderCache
+from .sinks import iter_volumes, write_merged
+from .template import COLLEGE_NAME, EXAM_TITLE, FOOTER_NOTE, copy_positions, get_template, subject_rows
+
+Result = Dict[str, Any]
+Progress = Optional[Callable[[Result], None]]
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a drawing change alters what a ticket looks like, so cached renders are not reused
+LAYOUT_VERSION = 1
+
+# Layout of the per-student fields (the rest of the page comes from the template)
+PHOTO_SIZE = 100
+PHOTO_RIGHT_MARGIN = 150  # photo x = page width - this
+PHOTO_TOP_OFFSET = 80     # photo top aligned with the university seat number line
+
+def layout_signature() -> str:
+    """Everything outside the row that changes a ticket's PDF: layout version, reportlab and fixed texts"""
+    return repr((LAYOUT_VERSION, reportlab.Version, COLLEGE_NAME, EXAM_TITLE, FOOTER_NOTE))
+
+def _file_key(path: Optional[str]) -> str:
+    if not path:
+        return ''
+    try:
+        return content_digest(path)
+    except OSError:
+        return 'missing'
+
+class TicketRenderer:
+    """
+    Draws hall tickets for one department and logo.
+
+    Instances hold only plain settings, so bound methods pickle cheaply into worker processes;
+    the static template and logo caches they rely on are rebuilt once per process.
+    """
+
+    def __init__(self, department_name: str, logo_path: Optional[str] = None) -> None:
+        self.department_name = department_name
+        self.logo_path = logo_path
+
+    def __repr__(self) -> str:
+        return f"TicketRenderer({self.department_name!r}, {self.logo_path!r})"
+
+    @staticmethod
+    def filename(row: Row) -> str:
+        return f"hallticket_{seat_number(row)}.pdf"
+
+    def cache_key(self, row: Row) -> str:
+        """Content address of a ticket: hash of its fields, department, logo and photo contents and layout"""
+        record = as_record(row)
+        parts = (layout_signature(), self.department_name, _file_key(self.logo_path), _file_key(record.photo_path),
+                 record.seat_no, record.details_line, record.name_line, record.center_line, record.subjects)
+        return hashlib.sha1(repr(parts).encode('utf8')).hexdigest()
+
+    # Drawing
+
+    def draw_page(self, c: canvas.Canvas, row: Row) -> None:
+        """Draw both copies of one student's ticket onto the current page of `c`"""
+        record = as_record(row)
+
+        # Static layer (boxes, header, notes, signatures, footer) is recorded once and reused as a form
+        get_template(self.department_name, self.logo_path).draw(c, len(record.subjects))
+        for label, y in copy_positions():
+            self.draw_fields(c, record, y)
+
+    def draw_fields(self, c: canvas.Canvas, record: TicketRecord, y_start: float) -> None:
+        """Draw one copy's student-specific fields over the static template layer"""
+        # Student details
+        c.setFont("Helvetica", 10)
+        c.drawString(50, y_start-80, record.details_line)
+        c.drawString(50, y_start-100, record.name_line)
+
+        # Subjects (signature boxes come from the template)
+        sub_ys, y = subject_rows(y_start, len(record.subjects))
+        for sub, sub_y in zip(record.subjects, sub_ys):
+            c.drawString(70, sub_y, sub)
+        y -= 20
+
+        self.draw_photo(c, record, y_start)
+
+        # Exam Center
+        c.setFont("Helvetica", 10)
+        c.drawString(50, y-30, record.center_line)
+
+    def draw_photo(self, c: canvas.Canvas, record: TicketRecord, y_start: float) -> None:
+        """Draw the candidate photo, if preparation found one on disk"""
+        if record.photo_path is None:
+            return
+        width, height = A4
+        try:
+            # Cached, so the second copy on the page reuses the image decoded for the first
+            draw_image(c, record.photo_path, width - PHOTO_RIGHT_MARGIN, y_start - PHOTO_TOP_OFFSET - PHOTO_SIZE,
+                       PHOTO_SIZE, PHOTO_SIZE)
+        except Exception as e:
+            # A broken photo should not cost the student their ticket
+            logger.warning("Error drawing image for %s: %s", record.seat_no, e)
+
+    # Single tickets
+
+    def render_to_bytes(self, row: Row) -> bytes:
+        """Render one student's ticket in memory and return the PDF bytes"""
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4)
+        self.draw_page(c, row)
+        c.showPage()
+        c.save()
+        return buffer.getvalue()
+
+    def render(self, row: Row) -> Tuple[str, bytes]:
+        """(filename, pdf_bytes) for one student - the in-memory render callable for batches"""
+        return self.filename(row), self.render_to_bytes(row)
+
+    def render_to_file(self, row: Row, output_dir: str = '.') -> str:
+        """Write one student's ticket into `output_dir` and return its filename"""
+        filename = self.filename(row)
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(self.render_to_bytes(row))
+        return filename
+
+    # Batches
+
+    def iter_render(self, rows: Iterable[Row], workers: Optional[int] = None, output_dir: Optional[str] = None,
+                    progress: Progress = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    cache: Optional[RenderCache] = None, max_pending: Optional[int] = None) -> Iterator[Result]:
+        """
+        Render every row across the worker pool, yielding result dicts in row order.
+
+        With `output_dir` each ticket is written to disk and only its filename is returned;
+        without it the PDF bytes are carried in each result's `data`. With an enabled `cache`,
+        students whose cache_key is already stored are served from it and only the rest are rendered.
+        `max_pending` bounds the chunks rendered ahead of the consumer.
+        """
+        if cache is not None and cache.enabled:
+            return self._iter_cached(list(rows), workers, output_dir, progress, chunk_size, cache, max_pending)
+        if output_dir is None:
+            return iter_render(self.render, rows, workers=workers, chunk_size=chunk_size, progress=progress,
+                               max_pending=max_pending)
+        return iter_render(self.render_to_file, rows, workers=workers, chunk_size=chunk_size, progress=progress,
+                           max_pending=max_pending, output_dir=output_dir)
+
+    def _iter_cached(self, rows: List[Row], workers: Optional[int], output_dir: Optional[str], progress: Progress,
+                     chunk_size: int, cache: RenderCache, max_pending: Optional[int] = None) -> Iterator[Result]:
+        keys = []
+        for row in rows:
+            try:
+                keys.append(self.cache_key(row))
+            except Exception:
+                keys.append(None)  # unpreparable row - let the normal render path report the error
+        hits = [key is not None and not row_error(row) and cache.contains(key) for row, key in zip(rows, keys)]
+
+        # Only changed students go to the pool; cached bytes are read lazily, one ticket at a time
+        rendered = iter_render(self.render, [row for row, hit in zip(rows, hits) if not hit],
+                               workers=workers, chunk_size=chunk_size, max_pending=max_pending)
+        for index, (row, key, hit) in enumerate(zip(rows, keys, hits)):
+            data = cache.get(key) if hit else None
+            if data is not None:
+                result = {'index': index, 'seat_no': seat_number(row), 'success': True, 'filename': self.filename(row),
+                          'data': data, 'error': None, 'cached': True}
+            else:
+                # A hit evicted since the lookup is rendered here instead
+                result = next(rendered) if not hit else next(iter_render(self.render, [row], workers=1))
+                result.update(index=index, cached=False)
+                if result['success'] and key is not None:
+                    cache.put(key, result['data'])
+
+            if output_dir is not None and result['success']:
+                with open(os.path.join(output_dir, result['filename']), 'wb') as f:
+                    f.write(result['data'])
+                result['data'] = None
+            if progress:
+                progress(result)
+            yield result
+
+    def render_batch(self, rows: Iterable[Row], workers: Optional[int] = None, output_dir: Optional[str] = None,
+                     progress: Progress = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     cache: Optional[RenderCache] = None) -> List[Result]:
+        """Render every row and return the list of result dicts (see iter_render)"""
+        return list(self.iter_render(rows, workers, output_dir, progress, chunk_size, cache))
+
+    def iter_volumes(self, rows: Iterable[Row], volume_size: Optional[int] = None, workers: Optional[int] = None,
+                     progress: Progress = None) -> Iterator[Tuple[int, bytes, List[Result]]]:
+        """Yield (volume_number, pdf_bytes, results) for a merged print run, one page per student"""
+        return iter_volumes(self.draw_page, rows, volume_size, workers, progress)
+
+    def write_merged(self, rows: Iterable[Row], output_dir: str, basename: str = "hall_tickets",
+                     volume_size: Optional[int] = None, workers: Optional[int] = None,
+                     progress: Progress = None) -> Tuple[List[str], List[Result]]:
+        """Write the merged PDF (or its volumes) into `output_dir` and return (filenames, results)"""
+        return write_merged(self.draw_page, rows, output_dir, basename, volume_size, workers, progress)
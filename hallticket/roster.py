@@ -0,0 +1,190 @@
+"""
+Roster ingestion - reads only the columns a ticket uses, streaming rows from .xlsx, CSV or Parquet
+"""
+
+import itertools
+from contextlib import closing
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from .records import PHOTO_COLUMN, REQUIRED_COLUMNS
+
+# Configuration
+ROSTER_COLUMNS = REQUIRED_COLUMNS + [PHOTO_COLUMN]
+ROSTER_EXTENSIONS = {'xlsx', 'xls', 'csv', 'parquet'}
+DEFAULT_CHUNK_ROWS = 5000
+PREVIEW_ROWS = 3
+# CSV text exactly as written: no numeric parsing (leading zeros in seat numbers survive), only empty cells are missing
+CSV_OPTIONS = dict(dtype=str, keep_default_na=False, na_values=[''])
+
+def roster_format(path):
+    """'xlsx', 'xls', 'csv' or 'parquet' from the file extension; raises ValueError for anything else"""
+    ext = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    if ext not in ROSTER_EXTENSIONS:
+        raise ValueError(f"Unsupported roster format '.{ext}'. Please use .xlsx, .xls, .csv or .parquet")
+    return ext
+
+# .xlsx
+
+def _cell_value(value):
+    # As pandas' openpyxl engine gives cells: whole floats as int, blanks and error values (#N/A, ...) missing
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (not value or value in ERROR_CODES):
+        return None
+    return value
+
+def _xlsx_rows(path, columns=None):
+    """
+    Yield the header row (every column name) of the first worksheet, then one list of values per data row.
+
+    The sheet is read with openpyxl's read-only mode, which streams rows instead of building the whole
+    workbook. Data rows hold only the `columns` the header has, in the order given (None means every
+    column); a name that appears twice resolves to its first column. Rows without any value are skipped.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()  # the stored <dimension> may be stale; read the cells that are there, as pandas does
+        rows = (row for row in sheet.iter_rows(values_only=True) if any(value is not None for value in row))
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [_cell_value(value) for value in header]
+        while header and header[-1] is None:
+            header.pop()
+        positions = range(len(header)) if columns is None else [header.index(name) for name in columns if name in header]
+        yield header
+        for row in rows:
+            yield [_cell_value(row[index]) if index < len(row) else None for index in positions]
+    finally:
+        workbook.close()
+
+def _present(header, columns):
+    return [name for name in columns if name in header]
+
+def _frame(names, rows):
+    # Column-wise construction, so pandas infers each column's dtype (dates become datetime64);
+    # empty cells end up NaN in every column, as pd.read_excel gives them
+    if not rows:
+        return pd.DataFrame(columns=names)  # object columns, as pd.read_excel gives a sheet with no rows
+    df = pd.DataFrame(dict(zip(names, map(list, zip(*rows)))), columns=names)
+    for name in df.columns[df.dtypes == object]:
+        df[name] = df[name].replace({None: np.nan})
+    return df
+
+def _label_columns(header):
+    # Column labels as pandas gives them: blank headers 'Unnamed: i', repeats 'Name.1', 'Name.2', ...
+    labels, seen = [], {}
+    for index, name in enumerate(header):
+        label = f'Unnamed: {index}' if name is None else name
+        if label in seen:
+            seen[label] += 1
+            label = f'{label}.{seen[label]}'
+        else:
+            seen[label] = 0
+        labels.append(label)
+    return labels
+
+def _iter_xlsx(path, columns, chunk_rows, nrows):
+    with closing(_xlsx_rows(path, columns)) as rows:
+        header = next(rows, [])
+        names = _present(header, columns)
+        if nrows is not None:
+            rows = itertools.islice(rows, nrows)  # stops reading the sheet once enough rows are in
+        batch, emitted = [], False
+        for values in rows:
+            batch.append(values)
+            if chunk_rows and len(batch) >= chunk_rows:
+                yield _frame(names, batch)
+                batch, emitted = [], True
+        if batch or not emitted:
+            yield _frame(names, batch)
+
+def _iter_csv(path, columns, chunk_rows, nrows):
+    options = dict(CSV_OPTIONS, usecols=lambda name: name in columns, nrows=nrows)
+    if not chunk_rows:
+        df = pd.read_csv(path, **options)
+        yield df[_present(df.columns, columns)]
+        return
+    emitted = False
+    with pd.read_csv(path, chunksize=chunk_rows, **options) as chunks:
+        for df in chunks:
+            yield df[_present(df.columns, columns)]
+            emitted = True
+    if not emitted:
+        yield from _iter_csv(path, columns, None, 0)  # no rows: still one frame with the columns, like .xlsx
+
+def _parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError('Reading .parquet rosters needs pyarrow (pip install pyarrow)')
+    return pq.ParquetFile(path)
+
+def _iter_parquet(path, columns, chunk_rows, nrows):
+    parquet = _parquet_file(path)
+    names = _present(parquet.schema_arrow.names, columns)
+    remaining = parquet.metadata.num_rows if nrows is None else min(nrows, parquet.metadata.num_rows)
+    if not chunk_rows or remaining == 0:
+        yield parquet.read(columns=names).to_pandas().head(remaining)
+        return
+    for batch in parquet.iter_batches(batch_size=min(chunk_rows, remaining), columns=names):
+        yield batch.to_pandas().head(remaining)
+        remaining -= batch.num_rows
+        if remaining <= 0:
+            return
+
+def _iter_xls(path, columns, chunk_rows, nrows):
+    # Legacy .xls goes through pandas (xlrd); projection still skips unused columns
+    df = pd.read_excel(path, usecols=lambda name: name in columns, nrows=nrows)
+    df = df[_present(df.columns, columns)]
+    chunk_rows = chunk_rows or max(1, len(df))
+    for start in range(0, max(1, len(df)), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+READERS = {'xlsx': _iter_xlsx, 'csv': _iter_csv, 'parquet': _iter_parquet, 'xls': _iter_xls}
+
+def iter_roster(path, columns=ROSTER_COLUMNS, chunk_rows=DEFAULT_CHUNK_ROWS, nrows=None):
+    """
+    Yield the roster at `path` as DataFrames of at most `chunk_rows` rows, lazily, in file order.
+
+    Only `columns` are read (those the file lacks are left out, so callers still see which are
+    missing). `nrows` stops after that many data rows. .xlsx sheets are streamed row by row, CSV is
+    read as text, Parquet in record batches.
+    """
+    return READERS[roster_format(path)](path, columns, chunk_rows, nrows)
+
+def read_roster(path, columns=ROSTER_COLUMNS, nrows=None):
+    """The whole roster (or its first `nrows` rows) as one DataFrame of just the ticket columns"""
+    return next(iter_roster(path, columns, chunk_rows=None, nrows=nrows))
+
+def count_rows(path):
+    """Number of data rows, without converting any cell values where the format allows"""
+    fmt = roster_format(path)
+    if fmt == 'xlsx':
+        with closing(_xlsx_rows(path, [])) as rows:
+            next(rows, None)
+            return sum(1 for values in rows)
+    if fmt == 'csv':
+        with pd.read_csv(path, usecols=[0], dtype=str, chunksize=50000) as chunks:
+            return sum(len(chunk) for chunk in chunks)
+    if fmt == 'parquet':
+        return _parquet_file(path).metadata.num_rows
+    return len(pd.read_excel(path, usecols=[0]))
+
+def preview_roster(path, nrows=PREVIEW_ROWS):
+    """Every column name, the row count and the first `nrows` rows, without loading the whole roster"""
+    fmt = roster_format(path)
+    if fmt == 'xlsx':
+        with closing(_xlsx_rows(path)) as rows:
+            columns = _label_columns(next(rows, []))
+            sample = _frame(columns, list(itertools.islice(rows, nrows)))
+    elif fmt == 'csv':
+        sample = pd.read_csv(path, nrows=nrows, **CSV_OPTIONS)  # read as generation reads it
+    elif fmt == 'parquet':
+        sample = next(_iter_parquet(path, _parquet_file(path).schema_arrow.names, None, nrows))
+    else:
+        sample = pd.read_excel(path, nrows=nrows)
+    return {'columns': list(sample.columns), 'row_count': count_rows(path), 'sample_data': sample.to_dict('records')}
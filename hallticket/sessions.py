@@ -0,0 +1,122 @@
+"""
+Upload sessions - collision-free session ids, per-session locks and atomic publishing of session folders
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: sessions are locked between threads of one process only
+
+# Configuration
+CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# ULIDs, plus the second-resolution timestamps older uploads were named with, so their folders still resolve
+SESSION_ID_PATTERN = re.compile(r'^(?:[0-9A-HJKMNP-TV-Z]{26}|\d{8}_\d{6})$')
+
+def new_session_id():
+    """A ULID: 48 bits of milliseconds then 80 random bits, 26 characters that sort by creation time"""
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), 'big')
+    return ''.join(CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+def process_alive(pid):
+    """Whether process `pid` (on this machine) is still running; assumed so where that can't be checked"""
+    if os.name == 'nt':
+        return True  # os.kill() would terminate it rather than probe it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # e.g. PermissionError: it exists, under another user
+    return True
+
+def check_session_id(session_id):
+    """The session id in canonical form; raises ValueError for anything that isn't one (e.g. a path)"""
+    session_id = str(session_id).strip()
+    if not SESSION_ID_PATTERN.match(session_id.upper()):
+        raise ValueError(f"Invalid session id: {session_id[:40]!r}")
+    return session_id.upper()
+
+class SessionStore:
+    """
+    Session folders named `<prefix><id>` under `root`, safe to share between threads and processes.
+
+    create() stages files in a private folder and renames it into place once complete, so other
+    requests see a session with all of its files or not at all; staging into an existing session
+    moves the new files in one atomic rename each. lock() serialises writers of one session across
+    threads and, where fcntl exists, across processes (gunicorn workers) through a lock file
+    beside the folder. Staging folders and lock files start with the session's name, so storage
+    eviction removes them together with it.
+    """
+
+    def __init__(self, root, prefix):
+        self.root = root
+        self.prefix = prefix
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def name(self, session_id):
+        return f"{self.prefix}{check_session_id(session_id)}"
+
+    def path(self, session_id):
+        """Folder of a session (whether or not it exists yet); raises ValueError for an invalid id"""
+        return os.path.join(self.root, self.name(session_id))
+
+    def exists(self, session_id):
+        return os.path.isdir(self.path(session_id))
+
+    @contextmanager
+    def lock(self, session_id):
+        """Hold the session's lock for the enclosed block"""
+        if fcntl is None:
+            with self._guard:
+                lock = self._locks.setdefault(check_session_id(session_id), threading.Lock())
+            with lock:
+                yield
+            return
+        # Each open() is its own lock holder, so this excludes other threads as well as other processes
+        with open(f"{self.path(session_id)}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def create(self, session_id=None):
+        """
+        Yield (session_id, staging folder) to write into; a new id unless `session_id` is given.
+
+        When the block finishes the staged files are published to the session; if it raises
+        they are discarded and the session is left as it was.
+        """
+        session_id = check_session_id(session_id) if session_id else new_session_id()
+        staging = f"{self.path(session_id)}.{new_session_id()}.tmp"
+        os.makedirs(staging)
+        try:
+            yield session_id, staging
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.publish(session_id, staging)
+
+    def publish(self, session_id, staging):
+        """Move a staging folder's files into the session: a rename for a new session, one per file otherwise"""
+        target = self.path(session_id)
+        try:
+            os.rename(staging, target)  # atomic on its own - no lock needed for a new session
+            return
+        except OSError:
+            if not os.path.isdir(target):
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        with self.lock(session_id):
+            for name in os.listdir(staging):
+                os.replace(os.path.join(staging, name), os.path.join(target, name))
+            shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,189 @@
+"""
+Sharded generation - split a roster across machines by Seat No hash, then merge and verify the shards' tickets
+"""
+
+import hashlib
+import json
+import math
+import os
+import zipfile
+from .photos import normalise_seat_no
+from .records import _text
+from .sinks import _resolve_volume_size, volume_filename
+
+# Configuration
+SHARD_MANIFEST_VERSION = 1
+SHARD_MANIFEST_NAME = 'hall_tickets.shard.json'
+MAX_LISTED = 10  # missing seats named in a problem message
+
+def parse_shard(text):
+    """'2/4' -> (2, 4): shard 2 of 4, numbered from 1; raises ValueError for anything else"""
+    index, slash, count = str(text).partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N (e.g. 2/4), got '{text}'")
+    if not slash or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard must look like i/N with 1 <= i <= N, got '{text}'")
+    return index, count
+
+def shard_of(seat_no, count):
+    """The shard (1..count) a seat number belongs to - the same on every machine and Python version"""
+    digest = hashlib.sha1(normalise_seat_no(seat_no).encode('utf8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+def select_shard(df, index, count):
+    """The roster rows of shard `index` of `count`; the DataFrame index keeps each row's position in the full roster"""
+    shards = _text(df['Seat No']).map(lambda seat: shard_of(seat, count))
+    return df[(shards == index).to_numpy()]
+
+def roster_digest(df):
+    """Hash of the roster's seat numbers in row order, so shards and merges can tell they read the same file"""
+    seats = _text(df['Seat No']).map(normalise_seat_no)
+    return hashlib.sha1('\n'.join(seats).encode('utf8')).hexdigest()
+
+class ShardManifest:
+    """
+    What one shard rendered: its place in the split, the full roster's size and digest, and a ticket per row.
+
+    `tickets` holds {'row', 'seat_no', 'filename'} for every ticket written, `failed` holds
+    {'row', 'seat_no', 'error'} for rows that could not be rendered.
+    """
+
+    def __init__(self, index, count, roster_rows, roster_digest, tickets, failed):
+        self.index = index
+        self.count = count
+        self.roster_rows = roster_rows
+        self.roster_digest = roster_digest
+        self.tickets = tickets
+        self.failed = failed
+
+    @classmethod
+    def build(cls, index, count, roster_rows, digest, rows, results):
+        """Manifest of a finished shard; `rows` maps each result's index to its row in the full roster"""
+        tickets, failed = [], []
+        for result in results:
+            row = int(rows[result['index']])
+            if result['success']:
+                tickets.append({'row': row, 'seat_no': result['seat_no'], 'filename': result['filename']})
+            else:
+                failed.append({'row': row, 'seat_no': result['seat_no'], 'error': result['error']})
+        return cls(index, count, roster_rows, digest, tickets, failed)
+
+    def to_dict(self):
+        return {'version': SHARD_MANIFEST_VERSION, 'shard': self.index, 'shards': self.count,
+                'roster_rows': self.roster_rows, 'roster_digest': self.roster_digest,
+                'tickets': self.tickets, 'failed': self.failed}
+
+    @classmethod
+    def load(cls, path):
+        """Read a shard manifest, or the one inside a shard's output folder; raises ValueError if it isn't one"""
+        if os.path.isdir(path):
+            path = os.path.join(path, SHARD_MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf8') as f:
+                data = json.load(f)
+            if data.get('version') != SHARD_MANIFEST_VERSION:
+                raise ValueError(f"Unsupported shard manifest version: {data.get('version')}")
+            return cls(data['shard'], data['shards'], data['roster_rows'], data['roster_digest'],
+                       data['tickets'], data['failed'])
+        except (OSError, KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Not a shard manifest: {path} ({e})")
+
+    def save(self, directory):
+        path = os.path.join(directory, SHARD_MANIFEST_NAME)
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, 'w', encoding='utf8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(partial, path)
+        return path
+
+def _listed(seats):
+    names = ', '.join(str(seat) for seat in seats[:MAX_LISTED])
+    return names + (f" and {len(seats) - MAX_LISTED} more" if len(seats) > MAX_LISTED else '')
+
+def plan_merge(shards, df):
+    """
+    Check shard outputs against the full roster and list their tickets in roster order.
+
+    `shards` is a list of (ShardManifest, directory). Returns (paths, problems): the ticket PDFs
+    in row order, and a description of everything that makes the set incomplete - missing or
+    repeated shards, a different roster, failed or missing tickets. Merge only if problems is empty.
+    """
+    problems = []
+    seats = list(_text(df['Seat No']))
+    digest = roster_digest(df)
+
+    counts = {manifest.count for manifest, directory in shards}
+    if len(counts) != 1:
+        problems.append(f"Shards come from different splits: {', '.join(f'{m.index}/{m.count}' for m, d in shards)}")
+    else:
+        count = counts.pop()
+        numbers = [manifest.index for manifest, directory in shards]
+        missing = sorted(set(range(1, count + 1)) - set(numbers))
+        repeated = sorted({number for number in numbers if numbers.count(number) > 1})
+        if missing:
+            problems.append(f"Missing shard(s) {', '.join(f'{n}/{count}' for n in missing)}")
+        if repeated:
+            problems.append(f"Shard(s) given more than once: {', '.join(f'{n}/{count}' for n in repeated)}")
+
+    for manifest, directory in shards:
+        if manifest.roster_rows != len(df) or manifest.roster_digest != digest:
+            problems.append(f"Shard {manifest.index}/{manifest.count} in {directory} was generated from a different "
+                            f"roster ({manifest.roster_rows} rows, this one has {len(df)})")
+        if manifest.failed:
+            problems.append(f"Shard {manifest.index}/{manifest.count} failed {len(manifest.failed)} ticket(s): "
+                            f"{_listed([entry['seat_no'] for entry in manifest.failed])}")
+
+    paths = [None] * len(df)
+    absent = []
+    for manifest, directory in shards:
+        for ticket in manifest.tickets:
+            row = ticket['row']
+            if not 0 <= row < len(df) or normalise_seat_no(seats[row]) != normalise_seat_no(ticket['seat_no']):
+                continue  # a different roster - reported above
+            path = os.path.join(directory, ticket['filename'])
+            if not os.path.exists(path):
+                absent.append(ticket['seat_no'])
+            paths[row] = path
+    if absent:
+        problems.append(f"{len(absent)} ticket file(s) listed but not found: {_listed(absent)}")
+
+    uncovered = [seats[row] for row, path in enumerate(paths) if path is None]
+    if uncovered:
+        problems.append(f"{len(uncovered)} of {len(df)} students have no ticket: {_listed(uncovered)}")
+    return paths, problems
+
+def merge_to_zip(paths, zip_path):
+    """Write the shards' ticket PDFs into one ZIP, in roster order"""
+    with zipfile.ZipFile(zip_path, 'w') as zipf:
+        for path in paths:
+            zipf.write(path, os.path.basename(path))
+    return zip_path
+
+def merge_to_pdf(paths, output_dir, basename='hall_tickets', volume_size=None):
+    """
+    Concatenate the shards' ticket PDFs into one merged PDF (or volumes of `volume_size` pages) in roster order.
+
+    Needs pypdf; identical objects such as the logo are stored once per volume, as in a direct merged run.
+    Returns the filenames written.
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise ValueError("Merging shards into a single PDF needs pypdf (pip install pypdf); a ZIP merge works without it")
+
+    size = _resolve_volume_size(volume_size, len(paths))
+    volume_count = max(1, math.ceil(len(paths) / size))
+    filenames = []
+    for number, start in enumerate(range(0, len(paths), size), 1):
+        writer = PdfWriter()
+        for path in paths[start:start + size]:
+            writer.append(path)
+        if hasattr(writer, 'compress_identical_objects'):
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        filename = volume_filename(basename, number, volume_count)
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            writer.write(f)
+        filenames.append(filename)
+    return filenames
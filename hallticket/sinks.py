@@ -0,0 +1,142 @@
+"""
+Output sinks - ZIP archives of per-student PDFs and merged multi-page PDFs for bulk printing
+"""
+
+import io
+import logging
+import math
+import os
+import zipfile
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from .engine import map_ordered
+from .records import row_error, seat_number
+
+logger = logging.getLogger(__name__)
+
+class _StreamBuffer:
+    """Write-only file object that collects bytes until the streaming generator drains them"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def write_zip(results, fileobj, checkpoint=None):
+    """
+    Write each successful (filename, data) result into a ZIP archive at `fileobj`.
+
+    `results` may be a generator; each PDF is added and released as soon as it is rendered.
+    Every result is passed through and returned so callers can count successes and failures.
+    With a `checkpoint` each entry is journaled with its offset, so an interrupted run can resume.
+    """
+    seen = []
+    with zipfile.ZipFile(fileobj, 'w') as zipf:
+        for result in results:
+            if result['success'] and result['data'] is not None:
+                zipf.writestr(result['filename'], result['data'])
+                if checkpoint is not None:
+                    checkpoint.record(result, zipf.getinfo(result['filename']).header_offset)
+                result['data'] = None  # the bytes now live in the archive
+            seen.append(result)
+    return seen
+
+def stream_zip(results):
+    """Yield a ZIP archive in chunks, one entry per rendered ticket, for a chunked HTTP response"""
+    buffer = _StreamBuffer()
+    # zipfile falls back to data descriptors when the target cannot seek, so nothing is buffered whole
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for result in results:
+            if result['success'] and result['data'] is not None:
+                zipf.writestr(result['filename'], result['data'])
+                chunk = buffer.drain()
+                if chunk:
+                    yield chunk
+            else:
+                logger.warning("Skipping ticket for %s: %s", result['seat_no'], result['error'])
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
+
+def _discard_partial_page(c, mark):
+    # Drop drawing operations a failed row left on the current page so the next student starts clean
+    del c._code[mark:]
+
+def render_volume(draw_page, start, rows, draw_kwargs):
+    """
+    Draw `rows` onto one multi-page canvas, one page per student, and return (pdf_bytes, results).
+
+    Images drawn from the same file (the logo) are stored once per document by reportlab and
+    referenced from every page, and standard fonts are declared once, so each extra page only
+    adds its own content stream.
+    """
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    results = []
+    for offset, row in enumerate(rows):
+        result = {'index': start + offset, 'seat_no': seat_number(row), 'success': False,
+                  'filename': None, 'data': None, 'error': None}
+        if row_error(row):
+            result.update(error=row_error(row), skipped=True)  # rejected by validation, left out of the volume
+            results.append(result)
+            continue
+        mark = len(c._code)
+        try:
+            draw_page(c, row, **draw_kwargs)
+            c.showPage()
+            result['success'] = True
+        except Exception as e:
+            _discard_partial_page(c, mark)
+            result['error'] = str(e)
+        results.append(result)
+    c.save()
+    return buffer.getvalue(), results
+
+def _resolve_volume_size(volume_size, row_count):
+    # 0/None means a single volume holding every student
+    return int(volume_size or 0) or max(1, row_count)
+
+def iter_volumes(draw_page, rows, volume_size=None, workers=None, progress=None, **draw_kwargs):
+    """
+    Yield (volume_number, pdf_bytes, results) for a merged print run, in row order.
+
+    With `volume_size` set, the roster is split into volumes of at most that many pages to bound
+    file size; separate volumes are independent documents, so they render in parallel.
+    """
+    rows = list(rows)
+    volume_size = _resolve_volume_size(volume_size, len(rows))
+    tasks = [(draw_page, start, rows[start:start + volume_size], draw_kwargs) for start in range(0, len(rows), volume_size)]
+    for number, (data, results) in enumerate(map_ordered(render_volume, tasks, workers), 1):
+        if progress:
+            for result in results:
+                progress(result)
+        yield number, data, results
+
+def volume_filename(basename, number, volume_count):
+    """hall_tickets.pdf for a single volume, hall_tickets_vol01.pdf etc. when split"""
+    if volume_count == 1:
+        return f"{basename}.pdf"
+    return f"{basename}_vol{number:0{max(2, len(str(volume_count)))}d}.pdf"
+
+def write_merged(draw_page, rows, output_dir, basename, volume_size=None, workers=None, progress=None, **draw_kwargs):
+    """Write the merged PDF (or its volumes) into `output_dir` and return (filenames, results)"""
+    rows = list(rows)
+    volume_count = max(1, math.ceil(len(rows) / _resolve_volume_size(volume_size, len(rows))))
+    filenames, all_results = [], []
+    for number, data, results in iter_volumes(draw_page, rows, volume_size, workers, progress, **draw_kwargs):
+        filename = volume_filename(basename, number, volume_count)
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(data)
+        filenames.append(filename)
+        all_results.extend(results)
+    return filenames, all_results
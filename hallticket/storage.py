@@ -0,0 +1,341 @@
+"""
+Storage lifecycle - keeps output/ and uploads/ within byte quotas and TTLs by evicting whole sessions in the background
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from .sessions import process_alive
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SWEEP_ENV_VAR = 'HALLTICKET_STORAGE_SWEEP'  # seconds between background sweeps
+DEFAULT_INTERVAL = 5 * 60
+GRACE_SECONDS = 10 * 60  # sessions written or used this recently are never evicted - a job may still be writing them
+EVICT_TO = 0.9  # quota eviction trims a directory to this fraction of its quota, so it doesn't run on every sweep
+INDEX_NAME = '.storage_index.json'
+PIN_DIR = '.pins'  # a marker file <session>@<owner> per session a job reads, holding the pinning process id
+
+# Files of one batch (ZIP, changes ZIP, manifest, merged PDF) share its batch id and are evicted together
+BATCH_PATTERN = re.compile(r'^hall_tickets_\d{8}_\d{6}(?:_[0-9a-f]{8})?')
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+def session_of(name):
+    """The session a top-level file or folder belongs to: its batch id, or its name up to the first dot"""
+    match = BATCH_PATTERN.match(name)
+    return match.group(0) if match else name.split('.', 1)[0]
+
+def _measure(path):
+    # (bytes, newest mtime) of a file, or of everything under a folder
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0, 0.0
+    if not os.path.isdir(path):
+        return stat.st_size, stat.st_mtime
+    size, newest = 0, stat.st_mtime
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += stat.st_size
+            newest = max(newest, stat.st_mtime)
+    return size, newest
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class StorageArea:
+    """One managed directory: its quota, TTL, last-use index and eviction counters"""
+
+    def __init__(self, directory, max_bytes=0, ttl=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.used = self._load_index()  # session -> last download or other use
+        self._lock = threading.Lock()  # guards `used`, which requests update while a sweep runs
+        self.size_bytes = None
+        self.sessions = None
+        self.pinned_count = None
+        self.oldest = None
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), encoding='utf8') as f:
+                return {str(name): float(used) for name, used in json.load(f).get('used', {}).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def touch(self, name):
+        with self._lock:
+            self.used[session_of(name)] = time.time()
+
+    def _pin_dir(self):
+        return os.path.join(self.directory, PIN_DIR)
+
+    def pin(self, name, owner):
+        """Mark the session of `name` as read by `owner` (a job id); markers are files, so every process sees them"""
+        os.makedirs(self._pin_dir(), exist_ok=True)
+        with open(os.path.join(self._pin_dir(), f"{session_of(name)}@{owner}"), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def unpin(self, owner):
+        """Remove every marker of `owner`, whichever process made it; returns the sessions let go"""
+        released = []
+        for marker in self._markers():
+            session, _, marker_owner = marker.rpartition('@')
+            if marker_owner == owner:
+                try:
+                    os.remove(os.path.join(self._pin_dir(), marker))
+                except OSError:
+                    continue
+                released.append(session)
+                self.touch(session)  # its grace period starts when the job lets go
+        return released
+
+    def _markers(self):
+        try:
+            return os.listdir(self._pin_dir())
+        except OSError:
+            return []
+
+    def pinned(self):
+        """Sessions pinned by a job in any process; markers of processes that have died are removed"""
+        sessions = set()
+        for marker in self._markers():
+            path = os.path.join(self._pin_dir(), marker)
+            try:
+                with open(path, encoding='utf8') as f:
+                    pid = int(f.read() or 0)
+            except (OSError, ValueError):
+                continue  # being written or removed right now
+            if pid and not process_alive(pid):
+                logger.warning("Dropping pin %s left by exited process %d", marker, pid)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            sessions.add(marker.rpartition('@')[0])
+        return sessions
+
+    def _merge_index(self):
+        # Called with the lock held: other processes record uses in the same index, the latest use wins
+        for name, used in self._load_index().items():
+            if used > self.used.get(name, 0.0):
+                self.used[name] = used
+
+    def save_index(self, keep=None):
+        """Write the last-use index, merged with the other processes' uses; only sessions in `keep` when given"""
+        path = self._index_path()
+        partial = f"{path}.{os.getpid()}.tmp"
+        with self._lock:
+            self._merge_index()
+            if keep is not None:
+                self.used = {name: used for name, used in self.used.items() if name in keep}
+            used = dict(self.used)
+        try:
+            with open(partial, 'w', encoding='utf8') as f:
+                json.dump({'used': used}, f)
+            os.replace(partial, path)
+        except OSError as e:
+            logger.warning("Could not save storage index %s: %s", path, e)
+
+    def scan(self):
+        """{session: {'paths', 'bytes', 'last_used'}} for everything in the directory"""
+        sessions = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return sessions
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue  # the index, and anything else hidden
+            size, mtime = _measure(entry.path)
+            session = sessions.setdefault(session_of(entry.name), {'paths': [], 'bytes': 0, 'last_used': 0.0})
+            session['paths'].append(entry.path)
+            session['bytes'] += size
+            session['last_used'] = max(session['last_used'], mtime)
+        with self._lock:
+            self._merge_index()
+            used = dict(self.used)
+        for name, session in sessions.items():
+            session['last_used'] = max(session['last_used'], used.get(name, 0.0))
+        return sessions
+
+    def sweep(self, now, grace):
+        """Evict expired sessions, then the least recently used until under quota; returns the sessions removed"""
+        sessions = self.scan()
+        total = sum(session['bytes'] for session in sessions.values())
+        evicted = []
+        pinned = self.pinned()
+        by_age = sorted(sessions.items(), key=lambda item: item[1]['last_used'])
+        for name, session in by_age:
+            if now - session['last_used'] < grace:
+                break  # sorted by age, so everything after this is recent too
+            if name in pinned:
+                continue
+            expired = self.ttl and now - session['last_used'] > self.ttl
+            over_quota = self.max_bytes and total > self.max_bytes * EVICT_TO
+            if not (expired or over_quota):
+                continue
+            for path in session['paths']:
+                _remove(path)
+            total -= session['bytes']
+            evicted.append(name)
+            self.evicted_bytes += session['bytes']
+            del sessions[name]
+
+        self.evictions += len(evicted)
+        self.size_bytes = total
+        self.sessions = len(sessions)
+        self.pinned_count = len(pinned)
+        self.oldest = min((session['last_used'] for session in sessions.values()), default=None)
+        self.save_index(keep=sessions)
+        return evicted
+
+    def stats(self, now):
+        return {
+            'directory': self.directory,
+            'size_bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'sessions': self.sessions,
+            'pinned': self.pinned_count,
+            'oldest_seconds': round(now - self.oldest) if self.oldest else None,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes
+        }
+
+class StorageManager:
+    """
+    Byte quotas and TTLs for the directories generated files and uploads pile up in.
+
+    Everything in a directory is grouped into sessions (see session_of); a session's age is its
+    newest file or its last use recorded with touch(), kept in a small index file in the directory
+    that every process merges its uses into.
+    A background thread sweeps every `interval` seconds: sessions unused for longer than the TTL
+    go first, then the least recently used until the directory is back under its quota. Sessions
+    younger than `grace` are never removed, so requests are not disturbed, and neither are sessions
+    pinned by a job (see pin()) for however long it runs. Pins are marker files, so a sweeper in
+    one worker process respects the jobs of all the others.
+    """
+
+    def __init__(self, interval=None, grace=GRACE_SECONDS):
+        self.interval = _env_int(SWEEP_ENV_VAR, DEFAULT_INTERVAL) if interval is None else interval
+        self.grace = grace
+        self._areas = {}
+        self._lock = threading.Lock()      # guards the area list and sweep counters, never held while sweeping
+        self._sweeping = threading.Lock()  # one sweep at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self.sweeps = 0
+        self.last_sweep = None
+        self.sweep_seconds = None
+
+    def add(self, directory, max_mb=0, ttl=0):
+        """Manage `directory`: keep it under `max_mb` MB, removing sessions unused for `ttl` seconds (0 = no limit)"""
+        with self._lock:
+            self._areas[directory] = StorageArea(directory, int(float(max_mb) * 1024 * 1024), int(ttl))
+
+    def touch(self, directory, name):
+        """Record that `name` (a file in a managed directory) was just used, e.g. downloaded"""
+        with self._lock:
+            area = self._areas.get(directory)
+        if area is not None:
+            area.touch(name)
+
+    def pin(self, directory, name, owner):
+        """Keep the session of `name` from eviction until unpin(owner), e.g. while job `owner` reads it"""
+        with self._lock:
+            area = self._areas.get(directory)
+        if area is not None:
+            area.pin(name, owner)
+
+    def unpin(self, owner):
+        """Release every session `owner` pinned, in any directory and from any process"""
+        with self._lock:
+            areas = list(self._areas.values())
+        for area in areas:
+            area.unpin(owner)
+
+    def sweep(self):
+        """Run one sweep of every directory now and return {directory: [evicted sessions]}"""
+        with self._sweeping:
+            started = time.perf_counter()
+            now = time.time()
+            with self._lock:
+                areas = list(self._areas.items())
+            evicted = {}
+            for directory, area in areas:
+                evicted[directory] = area.sweep(now, self.grace)
+                for name in evicted[directory]:
+                    logger.info("Evicted %s from %s", name, directory)
+        with self._lock:
+            self.sweeps += 1
+            self.last_sweep = now
+            self.sweep_seconds = round(time.perf_counter() - started, 4)
+        return evicted
+
+    def start(self):
+        """Start the background sweeper (once); the first sweep runs straight away"""
+        with self._lock:
+            if self._thread is not None or not self.interval:
+                return
+            self._thread = threading.Thread(target=self._run, name='storage-sweeper', daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Ask the background sweeper to sweep now instead of at its next interval"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Storage sweep failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def usage(self):
+        """Current size, quota and eviction counters of every managed directory (as of the last sweep)"""
+        now = time.time()
+        with self._lock:
+            return {
+                'directories': [area.stats(now) for area in self._areas.values()],
+                'interval_seconds': self.interval,
+                'grace_seconds': self.grace,
+                'sweeps': self.sweeps,
+                'last_sweep_seconds_ago': round(now - self.last_sweep) if self.last_sweep else None,
+                'sweep_seconds': self.sweep_seconds,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
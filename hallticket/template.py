@@ -0,0 +1,192 @@
+"""
+Static ticket layer - everything that is identical for every student, recorded once and replayed as a form
+"""
+
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
+from .images import draw_image, image_cache
+
+# Configuration
+COLLEGE_NAME = "GURU NANAK DEV ENGINEERING COLLEGE, BIDAR"
+EXAM_TITLE = "ADMISSION TICKET FOR B.E EXAMINATION JUNE / JULY 2025"
+FOOTER_NOTE = "Candidate must read the instructions provided in the answer booklet before commencement of examination."
+LOGO_MASK = 'auto'
+BOX_DEPTH = 320  # a copy's box ends this far below its header line
+MAX_TEMPLATES = 8
+
+_FONT_NAME = re.compile(r'/F\d+\b')
+
+def copy_positions():
+    """(copy label, y_start) for the two copies printed on every page"""
+    width, height = A4
+    return [("STUDENT COPY", height-50), ("COLLEGE COPY", height/2-30)]
+
+def subject_rows(y_start, subject_count):
+    """y position of each subject line, and the y left below them for the notes"""
+    ys = [y_start - 140 - 20 * i for i in range(subject_count)]
+    return ys, y_start - 140 - 20 * subject_count
+
+def max_subjects():
+    """Most subjects a copy has room for: the signature line below the last one must stay inside the box"""
+    count = 0
+    # The notes take 20pt below the subject rows and the signatures sit 70pt under them
+    while subject_rows(0, count + 1)[1] - 90 >= -BOX_DEPTH + 10:
+        count += 1
+    return count
+
+def draw_static_copy(c, y_start, copy_label, department_name, logo_path, subject_count):
+    """Draw the parts of one copy that do not depend on the student"""
+    width, height = A4
+
+    # Draw outer box for ticket (top above logo)
+    box_left = 30
+    box_right = width - 30
+    box_top = y_start + 40
+    box_bottom = y_start - BOX_DEPTH
+    box_width = box_right - box_left
+    box_height = box_top - box_bottom
+    c.setLineWidth(1)
+    c.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
+
+    # College Logo
+    if logo_path and os.path.exists(logo_path):
+        try:
+            draw_image(c, logo_path, 40, y_start-30, width=60, height=60, mask=LOGO_MASK)
+        except:
+            pass
+
+    # Header
+    c.setFont("Helvetica-Bold", 13)
+    c.drawCentredString(width/2, y_start, COLLEGE_NAME)
+    c.setLineWidth(1)
+
+    # Department name
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(width/2, y_start-20, department_name.upper())
+    c.setLineWidth(0.8)
+
+    # Exam title
+    c.setFont("Helvetica-Bold", 11)
+    c.drawCentredString(width/2, y_start-40, EXAM_TITLE)
+    c.setLineWidth(0.5)
+    c.line(40, y_start-50, width-40, y_start-50)
+
+    # Copy Label
+    c.setFont("Helvetica-Bold", 10)
+    c.drawRightString(width-40, y_start-40, copy_label)
+
+    # Subjects heading and signature boxes
+    c.setFont("Helvetica", 10)
+    c.drawString(50, y_start-120, "3. SUBJECTS APPLIED:")
+    ys, y = subject_rows(y_start, subject_count)
+    for sub_y in ys:
+        c.rect(200, sub_y-5, 60, 15)
+
+    # Note
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(70, y, "Note: Please verify the eligibility of candidate before issuing the admission ticket.")
+    y -= 20
+    c.drawString(70, y, "This is Electronically Generated Admission Ticket.")
+
+    # Signature placeholders
+    c.setFont("Helvetica", 10)
+    c.drawString(50, y-70, "Signature of the Candidate")
+    c.drawString(250, y-70, "Signature of the Principal with seal")
+    c.drawString(450, y-70, "Signature of the Hod")
+
+def draw_static_page(c, department_name, logo_path, subject_count):
+    """Draw the static layer of a whole page: both copies, separators and footer"""
+    width, height = A4
+    for label, y in copy_positions():
+        draw_static_copy(c, y, label, department_name, logo_path, subject_count)
+        c.setLineWidth(0.5)
+        c.line(40, y-280, width-40, y-280)
+
+    # Footer note
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawCentredString(width/2, 30, FOOTER_NOTE)
+
+class TicketTemplate:
+    """
+    The static layer for one department and logo.
+
+    Each layout (one per subject count) is drawn once on a scratch canvas and its content stream
+    recorded. Drawing it on a real canvas defines a form XObject from the recorded operations the
+    first time a document needs it, then every page just references that form.
+    """
+
+    def __init__(self, department_name, logo_path):
+        self.department_name = department_name
+        self.logo_path = logo_path
+        self.key = pdfdoc._digester(f"{department_name}|{logo_path}".encode('utf8'))
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def _record(self, subject_count):
+        scratch = canvas.Canvas(io.BytesIO(), pagesize=A4)
+        draw_static_page(scratch, self.department_name, self.logo_path, subject_count)
+        fonts = dict(scratch._doc.fontMapping)
+        images = sorted(set(scratch._formsinuse))
+        return {'code': list(scratch._code), 'fonts': fonts, 'images': images, 'remapped': {}}
+
+    def _layer(self, subject_count):
+        with self._lock:
+            layer = self._layers.get(subject_count)
+            if layer is None:
+                layer = self._layers[subject_count] = self._record(subject_count)
+            return layer
+
+    def _code_for(self, doc, layer):
+        # Font resource names (/F1, /F2...) depend on the order a document first saw each font
+        mapping = {internal: doc.getInternalFontName(psname) for psname, internal in layer['fonts'].items()}
+        if all(internal == target for internal, target in mapping.items()):
+            return layer['code']
+        signature = tuple(sorted(mapping.items()))
+        code = layer['remapped'].get(signature)
+        if code is None:
+            code = [_FONT_NAME.sub(lambda m: mapping.get(m.group(0), m.group(0)), op) for op in layer['code']]
+            layer['remapped'][signature] = code
+        return code
+
+    def form_name(self, subject_count):
+        return f"HallTicketStatic{self.key}_{subject_count}"
+
+    def draw(self, c, subject_count):
+        """Draw the static layer for a page with `subject_count` subjects onto the current page of `c`"""
+        name = self.form_name(subject_count)
+        if not c.hasForm(name):
+            layer = self._layer(subject_count)
+            logo = image_cache.get(self.logo_path, LOGO_MASK) if layer['images'] else None
+            c.beginForm(name)
+            if layer['images'] and (logo is None or layer['images'] != [logo.name]):
+                # The logo did not come from the cache, so the recording can't be replayed - draw it afresh
+                draw_static_page(c, self.department_name, self.logo_path, subject_count)
+            else:
+                if logo is not None:
+                    logo.register(c._doc)
+                c._code.extend(self._code_for(c._doc, layer))
+                c._formsinuse.extend(layer['images'])
+            c.endForm()
+        c.doForm(name)
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+def get_template(department_name, logo_path):
+    """Per-process TicketTemplate for a department/logo pair, so a batch records its layers only once"""
+    key = (department_name, logo_path, os.path.getmtime(logo_path) if logo_path and os.path.exists(logo_path) else None)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = TicketTemplate(department_name, logo_path)
+            while len(_templates) > MAX_TEMPLATES:
+                _templates.popitem(last=False)
+        else:
+            _templates.move_to_end(key)
+        return template
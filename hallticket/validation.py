@@ -0,0 +1,159 @@
+"""
+Pre-flight roster validation - vectorised checks over the whole roster, run once before anything is rendered
+"""
+
+import numpy as np
+import pandas as pd
+from .records import PHOTO_COLUMN, _text, resolve_photo_paths
+from .template import max_subjects
+
+# Configuration
+ERROR = 'error'      # the row is skipped: its ticket would be wrong or unreadable
+WARNING = 'warning'  # the ticket is drawn, but something is probably missing
+MAX_LISTED = 100     # issues of each severity listed in to_dict(); the counts cover all of them
+HEADER_ROWS = 1      # spreadsheet row numbers in messages count the header row
+
+def _blank(series):
+    # Empty cells arrive as NaN/NaT/None or as whitespace-only text
+    return (series.isna() | _text(series).str.strip().eq('')).to_numpy()
+
+class ValidationReport:
+    """
+    Issues found in a roster, grouped by check: (check, severity, row positions, message per row).
+
+    Rows with an error are what mark() flags on the prepared records so rendering skips them;
+    warnings are reported only. `seats` holds each row's Seat No text for the listing, and
+    `offset` is the position of the first row in the whole roster when only a chunk was checked.
+    """
+
+    def __init__(self, rows, seats, checks, offset=0):
+        self.rows = rows
+        self.seats = seats
+        self.checks = checks
+        self.offset = offset
+
+    def _positions(self, severity):
+        found = [positions for check, check_severity, positions, messages in self.checks if check_severity == severity]
+        return np.unique(np.concatenate(found)) if found else np.array([], dtype=int)
+
+    @property
+    def ok(self):
+        """True when no row has an error"""
+        return not any(severity == ERROR and len(positions) for check, severity, positions, messages in self.checks)
+
+    def count(self, severity):
+        return sum(len(positions) for check, check_severity, positions, messages in self.checks
+                   if check_severity == severity)
+
+    def row_errors(self):
+        """Row position -> the errors found in it, joined into one message"""
+        errors = {}
+        for check, severity, positions, messages in self.checks:
+            if severity == ERROR:
+                for position, message in zip(positions, messages):
+                    errors.setdefault(int(position), []).append(message)
+        return {position: '; '.join(messages) for position, messages in errors.items()}
+
+    def mark(self, records):
+        """Set `error` on the records of rows with errors, so the renderer skips them; returns how many"""
+        errors = self.row_errors()
+        for position, message in errors.items():
+            records[position].error = message
+        return len(errors)
+
+    def issues(self, severity, limit=None):
+        """Issue dicts of one severity in row order: row (spreadsheet row number), index (in the whole roster), seat_no, check, message"""
+        listed = []
+        for check, check_severity, positions, messages in self.checks:
+            if check_severity == severity:
+                listed.extend(zip(positions, [check] * len(positions), messages))
+        listed.sort(key=lambda issue: issue[0])
+        return [{'row': self.offset + int(position) + HEADER_ROWS + 1, 'index': self.offset + int(position),
+                 'seat_no': self.seats[position], 'check': check, 'severity': severity, 'message': message}
+                for position, check, message in listed[:limit]]
+
+    def to_dict(self, max_listed=MAX_LISTED):
+        return {
+            'ok': self.ok,
+            'rows': self.rows,
+            'invalid_rows': len(self._positions(ERROR)),
+            'error_count': self.count(ERROR),
+            'warning_count': self.count(WARNING),
+            'checks': {check: len(positions) for check, severity, positions, messages in self.checks if len(positions)},
+            'errors': self.issues(ERROR, max_listed),
+            'warnings': self.issues(WARNING, max_listed)
+        }
+
+def combine_reports(total, report, max_listed=MAX_LISTED):
+    """Fold a chunk's report into `total` (the to_dict() of the chunks so far, or None) and return it"""
+    part = report.to_dict(max_listed)
+    if total is None:
+        return part
+    total['ok'] = total['ok'] and part['ok']
+    for key in ('rows', 'invalid_rows', 'error_count', 'warning_count'):
+        total[key] += part[key]
+    for check, count in part['checks'].items():
+        total['checks'][check] = total['checks'].get(check, 0) + count
+    for key in ('errors', 'warnings'):
+        total[key].extend(part[key][:max(0, max_listed - len(total[key]))])
+    return total
+
+def validate_roster(df, known_photos=(), subject_limit=None, offset=0, seen=None):
+    """
+    Check every row of a roster at once, before rendering; returns a ValidationReport.
+
+    Errors: blank Seat No, Name, Date or Subjects Applied, a Seat No repeated from an earlier row
+    (the earlier row is kept), and more subjects than fit the ticket box (`subject_limit`, by default
+    what the layout has room for). Warnings: blank Exam No or Exam Center, and - when the roster has
+    a Photo Path column - no photo, or one that does not exist (paths in `known_photos` are trusted).
+    Only the columns present are checked; prepare_records reports missing ones. Row numbers in
+    messages are spreadsheet rows, counting from `offset` for a chunk of a larger roster. Pass the
+    same `seen` dict (Seat No -> row position) for every chunk to catch seats repeated across chunks.
+    """
+    subject_limit = subject_limit or max_subjects()
+    seats = list(_text(df['Seat No'])) if 'Seat No' in df.columns else [''] * len(df)
+    checks = []
+
+    def add(check, severity, mask, message):
+        positions = np.flatnonzero(mask)
+        messages = message(positions) if callable(message) else [message] * len(positions)
+        checks.append((check, severity, positions, list(messages)))
+
+    for column, check, severity in (('Seat No', 'missing_seat_no', ERROR), ('Name', 'missing_name', ERROR),
+                                    ('Date', 'missing_date', ERROR), ('Subjects Applied', 'missing_subjects', ERROR),
+                                    ('Exam No', 'missing_exam_no', WARNING),
+                                    ('Exam Center', 'missing_exam_center', WARNING)):
+        if column in df.columns:
+            add(check, severity, _blank(df[column]), f"{column} is empty")
+
+    if 'Seat No' in df.columns:
+        # Same seat (ignoring case and spaces) as an earlier row: both would write the same ticket file
+        keys = pd.Series(_text(df['Seat No']).str.strip().str.upper().to_numpy())
+        given = ~_blank(df['Seat No'])
+        repeated = keys.duplicated(keep='first').to_numpy() & given
+        first = offset + pd.Series(np.arange(len(keys))).groupby(keys.to_numpy()).transform('min').to_numpy()
+        if seen is not None:
+            earlier = keys.map(seen)
+            known = earlier.notna().to_numpy() & given
+            repeated |= known
+            first = np.where(known, earlier.fillna(-1).to_numpy(dtype=np.int64), first)
+            for key, position in zip(keys[given & ~repeated], np.flatnonzero(given & ~repeated)):
+                seen[key] = offset + int(position)
+        add('duplicate_seat_no', ERROR, repeated,
+            lambda positions: [f"Seat No repeats row {first[p] + HEADER_ROWS + 1}" for p in positions])
+
+    if 'Subjects Applied' in df.columns:
+        counts = (_text(df['Subjects Applied']).str.count(',') + 1).to_numpy()
+        add('too_many_subjects', ERROR, (counts > subject_limit) & ~_blank(df['Subjects Applied']),
+            lambda positions: [f"{counts[p]} subjects, the ticket has room for {subject_limit}" for p in positions])
+
+    if PHOTO_COLUMN in df.columns:
+        given = ~_blank(df[PHOTO_COLUMN])
+        found = np.array([path is not None for path in resolve_photo_paths(df[PHOTO_COLUMN], known_photos)],
+                         dtype=bool)
+        paths = _text(df[PHOTO_COLUMN]).to_numpy()
+        add('missing_photo', WARNING, ~given, "No photo")
+        add('photo_not_found', WARNING, given & ~found,
+            lambda positions: [f"Photo not found: {paths[p]}" for p in positions])
+
+    return ValidationReport(len(df), seats, checks, offset)
@@ -0,0 +1,171 @@
+"""
+Workbook cache - a roster uploaded for /preview is kept, parsed in the background, and reused by /upload
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .roster import ROSTER_EXTENSIONS, read_roster, roster_format
+
+# Configuration
+WORKBOOK_TTL_ENV_VAR = 'HALLTICKET_WORKBOOK_TTL'            # seconds a workbook is kept after its last use
+WORKBOOK_CACHE_ENV_VAR = 'HALLTICKET_WORKBOOK_CACHE_SIZE'   # workbooks kept at once
+DEFAULT_TTL = 30 * 60
+DEFAULT_MAX_ENTRIES = 16
+TOKEN_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+class Workbook:
+    """One uploaded roster file and, once parsed, its ticket columns"""
+
+    def __init__(self, token, path):
+        self.token = token
+        self.path = path
+        self.last_used = time.time()
+        self._df = None
+        self._error = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Parse the file once (whoever gets here first); the file stays for other processes and chunked readers"""
+        with self._lock:
+            if self._df is None and self._error is None:
+                if not os.path.exists(self.path):
+                    raise ValueError('Preview expired, please upload the Excel file again')
+                try:
+                    self._df = read_roster(self.path)
+                except Exception as e:
+                    self._error = f'Error reading Excel file: {str(e)}'
+        if self._error:
+            raise ValueError(self._error)
+        return self._df
+
+    def roster(self):
+        """A copy of the parsed roster (callers add columns to it); parses now if that hasn't happened yet"""
+        return self.load().copy()
+
+    def source(self):
+        """For a caller that reads the roster in chunks: the file's path, or a copy of the roster once parsed"""
+        with self._lock:
+            parsed = self._df is not None or self._error is not None
+        return self.roster() if parsed else self.path
+
+    def touch(self):
+        """Record a use; the file's mtime carries it to the other processes sharing the upload folder"""
+        self.last_used = time.time()
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    def idle_since(self):
+        """Last use by this or any other process"""
+        try:
+            return max(self.last_used, os.path.getmtime(self.path))
+        except OSError:
+            return self.last_used
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass  # already removed
+
+class WorkbookCache:
+    """
+    Uploaded rosters by token, bounded in count and evicted after `ttl` seconds without use.
+
+    prefetch() parses a workbook on a background thread, so the work overlaps with the user reading
+    the preview instead of delaying it. Evicted workbooks are forgotten and their file deleted. The
+    file is named by the token, so another process sharing `directory` can pick the workbook up.
+    """
+
+    def __init__(self, directory, max_entries=None, ttl=None):
+        self.directory = directory
+        self.max_entries = _env_int(WORKBOOK_CACHE_ENV_VAR, DEFAULT_MAX_ENTRIES) if max_entries is None else max_entries
+        self.ttl = _env_int(WORKBOOK_TTL_ENV_VAR, DEFAULT_TTL) if ttl is None else ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._parser = ThreadPoolExecutor(max_workers=1, thread_name_prefix='workbook-parse')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add(self, filename, save):
+        """Store an upload - `save(path)` writes it to disk - and return its Workbook; raises ValueError for unsupported files"""
+        token = uuid.uuid4().hex
+        path = os.path.join(self.directory, f"workbook_{token}.{roster_format(filename)}")
+        save(path)
+        workbook = Workbook(token, path)
+        with self._lock:
+            self._entries[token] = workbook
+            stale = self._expired() + self._overflow()
+        self._discard(stale)
+        return workbook
+
+    def prefetch(self, workbook):
+        """Start parsing `workbook` in the background, if nothing has yet"""
+        self._parser.submit(workbook.load)
+
+    def get(self, token):
+        """The Workbook for `token` (stored by this process or another), or None if it is unknown or has expired"""
+        with self._lock:
+            stale = self._expired()
+            workbook = self._entries.get(token)
+            if workbook is None:
+                workbook = self._find(token)
+                if workbook is not None:
+                    self._entries[token] = workbook
+                    stale += self._overflow()
+            if workbook is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                workbook.touch()
+        self._discard(stale)
+        return workbook
+
+    def _find(self, token):
+        # Called with the lock held: a workbook another process stored, found by its file name
+        if not TOKEN_PATTERN.match(token):
+            return None
+        for extension in ROSTER_EXTENSIONS:
+            workbook = Workbook(token, os.path.join(self.directory, f"workbook_{token}.{extension}"))
+            if os.path.exists(workbook.path) and workbook.idle_since() >= time.time() - self.ttl:
+                return workbook
+        return None
+
+    def _expired(self):
+        # Called with the lock held; returns the workbooks removed
+        cutoff = time.time() - self.ttl
+        return [self._entries.pop(token) for token, workbook in list(self._entries.items()) if workbook.idle_since() < cutoff]
+
+    def _overflow(self):
+        # Called with the lock held; least recently used first
+        by_age = sorted(self._entries.values(), key=lambda workbook: workbook.idle_since())
+        return [self._entries.pop(workbook.token) for workbook in by_age[:max(0, len(by_age) - self.max_entries)]]
+
+    def _discard(self, workbooks):
+        for workbook in workbooks:
+            workbook.discard()
+        with self._lock:
+            self.evictions += len(workbooks)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -1,19 +1,19 @@
 import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 import os
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox, Toplevel, Label, Entry, Button, StringVar, Text, Scrollbar, Frame
+# Ticket drawing is shared with the CLI version so worker processes can import it
+from index_cli import generate_tickets
+from hallticket import read_roster
 
-# Initialize tkinter for file dialogs
-root = tk.Tk()
-root.withdraw()  # Hide the main window
+# Hidden tkinter root for file dialogs (created in main so worker processes never open a window)
+root = None
 
 def select_excel_file():
     """Allow user to select an Excel file"""
     file_path = filedialog.askopenfilename(
         title="Select Excel File with Student Data",
-        filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+        filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV / Parquet rosters", "*.csv *.parquet"), ("All files", "*.*")]
     )
     return file_path
 
@@ -117,193 +117,113 @@ def get_custom_subjects():
     
     return subjects if subjects else None
 
-# Get user inputs
-print("🔍 Please select the Excel file containing student data...")
-excel_file = select_excel_file()
-
-if not excel_file:
-    print("❌ No Excel file selected. Exiting.")
-    exit()
-
-print("📝 Please enter the department name...")
-department_name = get_department_name()
-
-print("🖼️ Please select the logo file...")
-logo_path = get_logo_path()
+def get_output_options():
+    """Ask whether to write one PDF per student or a single merged PDF for printing"""
+    merged = messagebox.askyesno(
+        "Output Format",
+        "Create a single merged PDF for bulk printing?\n\nYes = One PDF with a page per student\nNo = One PDF per student"
+    )
+    if not merged:
+        return False, 0
+
+    volume_size = simpledialog.askinteger(
+        "PDF Volumes",
+        "Pages per PDF volume (0 = everything in one file):",
+        initialvalue=0,
+        minvalue=0
+    )
+    return True, volume_size or 0
 
-try:
-    # Load Excel
-    df = pd.read_excel(excel_file)
-    print(f"✅ Loaded Excel file: {os.path.basename(excel_file)}")
-    print(f"📊 Found {len(df)} student records")
-    print(f"🏫 Department: {department_name}")
-    if logo_path:
-        print(f"🖼️ Logo: {os.path.basename(logo_path)}")
-    else:
-        print("🖼️ No logo selected")
-except Exception as e:
-    print(f"❌ Error loading Excel file: {e}")
-    exit()
+def main():
+    global root
 
-# Ask for subject option
-print("📚 Choose subject option...")
-use_custom_subjects = get_subjects_option()
-custom_subjects = None
+    # Initialize tkinter for file dialogs
+    root = tk.Tk()
+    root.withdraw()  # Hide the main window
 
-if use_custom_subjects:
-    print("📝 Please enter the subjects...")
-    custom_subjects = get_custom_subjects()
-    if custom_subjects:
-        print(f"✅ Received {len(custom_subjects)} subjects")
-        for i, subject in enumerate(custom_subjects[:3], 1):  # Show first 3
-            print(f"   {i}. {subject}")
-        if len(custom_subjects) > 3:
-            print(f"   ... and {len(custom_subjects) - 3} more")
-    else:
-        print("❌ No subjects entered. Using subjects from Excel file.")
-        use_custom_subjects = False
-else:
-    print("📊 Will use subjects from Excel file")
+    # Get user inputs
+    print("🔍 Please select the Excel file containing student data...")
+    excel_file = select_excel_file()
 
-# Prepare data with custom subjects if needed
-if use_custom_subjects and custom_subjects:
-    # Replace subjects in dataframe with custom subjects
-    subjects_string = ", ".join(custom_subjects)
-    df['Subjects Applied'] = subjects_string
-    print(f"⚙️ Updated all records with custom subjects")
+    if not excel_file:
+        print("❌ No Excel file selected. Exiting.")
+        return
 
-def draw_ticket(c, row, y_start, copy_label):
-    width, height = A4
+    print("📝 Please enter the department name...")
+    department_name = get_department_name()
 
-    # Draw outer box for ticket (top above logo)
-    box_left = 30
-    box_right = width - 30
-    box_top = y_start + 40  # move box top above logo
-    box_bottom = y_start - 320  # enough to cover all content including signatures
-    box_width = box_right - box_left
-    box_height = box_top - box_bottom
-    c.setLineWidth(1)
-    c.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
+    print("🖼️ Please select the logo file...")
+    logo_path = get_logo_path()
 
-    # College Logo
     try:
-        c.drawImage(logo_path, 40, y_start-30, width=60, height=60, mask='auto')
-    except:
-        pass
-
-    # Header
-    c.setFont("Helvetica-Bold", 13)
-    c.drawCentredString(width/2, y_start, "GURU NANAK DEV ENGINEERING COLLEGE, BIDAR")
-    c.setLineWidth(1)
-    # c.line(40, y_start-10, width-40, y_start-10)  # horizontal line after co
-
-    # Department name (dynamically set by user)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width/2, y_start-20, department_name.upper())
-    c.setLineWidth(0.8)
-    # c.line(40, y_start-30, width-40, y_start-30)  # horizontal line after department name
-
-    # Exam title
-    c.setFont("Helvetica-Bold", 11)
-    c.drawCentredString(width/2, y_start-40, "ADMISSION TICKET FOR B.E EXAMINATION JUNE / JULY 2025")
-    c.setLineWidth(0.5)
-    c.line(40, y_start-50, width-40, y_start-50)  # horizontal line after admission ticket text
-
-    # Copy Label
-    c.setFont("Helvetica-Bold", 10)
-    c.drawRightString(width-40, y_start-40, copy_label)
-
-    # Student details
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y_start-80, f"1. UNIVERSITY SEAT NO.: {row['Seat No']}     No: {row['Exam No']}     Date: {row['Date']}")
-    c.drawString(50, y_start-100, f"2. NAME OF THE CANDIDATE: {row['Name']}")
-
-    # Subjects with signature box
-    c.drawString(50, y_start-120, "3. SUBJECTS APPLIED:")
-    subjects = str(row['Subjects Applied']).split(",")
-    y = y_start - 140
-    for sub in subjects:
-        sub = sub.strip()
-        c.drawString(70, y, sub)
-        c.rect(200, y-5, 60, 15)   # box for signature
-        y -= 20
-
-    # Note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(70, y, "Note: Please verify the eligibility of candidate before issuing the admission ticket.")
-    y -= 20
-    c.drawString(70, y, "This is Electronically Generated Admission Ticket.")
-
-    # Photo
-    if pd.notna(row['Photo Path']):
-        try:
-            c.drawImage(row['Photo Path'], width-150, y_start-130, 100, 100)
-        except:
-            pass
-
-    # Exam Center
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y-30, f"Exam Center: {row['Exam Center']}")
-
-    # Signature placeholders
-    c.drawString(50, y-70, "Signature of the Candidate")
-    c.drawString(250, y-70, "Signature of the Principal with seal")
-    c.drawString(450, y-70, "Signature of the Hod")
-
-def generate_hallticket(row):
-    filename = f"hallticket_{row['Seat No']}.pdf"
-    c = canvas.Canvas(filename, pagesize=A4)
-    width, height = A4
-
-    # Only two copies now
-    copies = ["STUDENT COPY", "COLLEGE COPY"]
-    y_positions = [height-50, height/2-30]  # spaced nicely
-
-    for label, y in zip(copies, y_positions):
-        draw_ticket(c, row, y, label)
-
-        # Horizontal line separator
-        c.setLineWidth(0.5)
-        c.line(40, y-280, width-40, y-280)
-
-    # Footer note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawCentredString(width/2, 30, "Candidate must read the instructions provided in the answer booklet before commencement of examination.")
-
-    c.showPage()
-    c.save()
-    print(f"✅ Generated {filename}")
-
-# Confirmation before generating
-print(f"\n📋 Summary:")
-print(f"   Excel File: {os.path.basename(excel_file)}")
-print(f"   Department: {department_name}")
-print(f"   Students: {len(df)}")
-if logo_path:
-    print(f"   Logo: {os.path.basename(logo_path)}")
+        # Load Excel
+        df = read_roster(excel_file)
+        print(f"✅ Loaded Excel file: {os.path.basename(excel_file)}")
+        print(f"📊 Found {len(df)} student records")
+        print(f"🏫 Department: {department_name}")
+        if logo_path:
+            print(f"🖼️ Logo: {os.path.basename(logo_path)}")
+        else:
+            print("🖼️ No logo selected")
+    except Exception as e:
+        print(f"❌ Error loading Excel file: {e}")
+        return
+
+    # Ask for subject option
+    print("📚 Choose subject option...")
+    use_custom_subjects = get_subjects_option()
+    custom_subjects = None
+
+    if use_custom_subjects:
+        print("📝 Please enter the subjects...")
+        custom_subjects = get_custom_subjects()
+        if custom_subjects:
+            print(f"✅ Received {len(custom_subjects)} subjects")
+            for i, subject in enumerate(custom_subjects[:3], 1):  # Show first 3
+                print(f"   {i}. {subject}")
+            if len(custom_subjects) > 3:
+                print(f"   ... and {len(custom_subjects) - 3} more")
+        else:
+            print("❌ No subjects entered. Using subjects from Excel file.")
+            use_custom_subjects = False
+    else:
+        print("📊 Will use subjects from Excel file")
+
+    # Prepare data with custom subjects if needed
+    if use_custom_subjects and custom_subjects:
+        # Replace subjects in dataframe with custom subjects
+        subjects_string = ", ".join(custom_subjects)
+        df['Subjects Applied'] = subjects_string
+        print(f"⚙️ Updated all records with custom subjects")
+
+    # Ask for output format
+    merged, volume_size = get_output_options()
+
+    # Confirmation before generating
+    print(f"\n📋 Summary:")
+    print(f"   Excel File: {os.path.basename(excel_file)}")
+    print(f"   Department: {department_name}")
+    print(f"   Students: {len(df)}")
+    if logo_path:
+        print(f"   Logo: {os.path.basename(logo_path)}")
 
-confirm = messagebox.askyesno(
-    "Generate Hall Tickets",
-    f"Generate hall tickets for {len(df)} students from {department_name}?"
-)
+    confirm = messagebox.askyesno(
+        "Generate Hall Tickets",
+        f"Generate hall tickets for {len(df)} students from {department_name}?"
+    )
 
-if not confirm:
-    print("❌ Operation cancelled by user.")
-    exit()
+    if not confirm:
+        print("❌ Operation cancelled by user.")
+        return
 
-# Generate hall tickets
-print("\n🔄 Generating hall tickets...")
-generated_count = 0
+    # Generate hall tickets
+    generated_count = generate_tickets(df, department_name, logo_path, merged, volume_size)
 
-for _, row in df.iterrows():
-    try:
-        generate_hallticket(row)
-        generated_count += 1
-    except Exception as e:
-        print(f"❌ Error generating ticket for {row.get('Name', 'Unknown')}: {e}")
+    print(f"\n🎉 Successfully generated {generated_count} out of {len(df)} hall tickets!")
+    print(f"📁 Files saved in: {os.getcwd()}")
 
-print(f"\n🎉 Successfully generated {generated_count} out of {len(df)} hall tickets!")
-print(f"📁 Files saved in: {os.getcwd()}")
+    # Close tkinter root
+    root.destroy()
 
-# Close tkinter root
-root.destroy()
+if __name__ == "__main__":
+    main()
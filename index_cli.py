@@ -1,34 +1,85 @@
-import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+import argparse
+import json
+import logging
+import math
 import os
 import sys
+from hallticket import (TicketRenderer, resolve_workers, prepare_records, photo_derivatives, render_cache,
+                        BatchManifest, PreviousOutputs, diff_roster, roster_fields, iter_incremental,
+                        iter_volumes_incremental, remove_stale_tickets, manifest_path, volume_filename, read_roster,
+                        metrics, configure_logging, profile_run, PROFILE_SUFFIX, warm_pool, BatchJob, load_job_file,
+                        ShardManifest, parse_shard, select_shard, roster_digest, plan_merge, merge_to_zip, merge_to_pdf,
+                        Checkpoint, checkpoint_path, validate_roster)
+from hallticket.jobfile import DEFAULT_DEPARTMENT, PREVIOUS_AUTO, PREVIOUS_NONE
 
-def get_user_inputs():
-    """Get user inputs via command line"""
+# Manifest of the last run in the output directory, read back to regenerate only what changed
+BATCH_NAME = "hall_tickets"
+METRICS_SUFFIX = ".metrics.json"  # stage timings and counters of the last run, next to the manifest
+VALIDATION_SUFFIX = ".validation.json"  # every problem the roster check found in the last run
+
+# Per-ticket lines are logged at DEBUG (HALLTICKET_LOG_LEVEL=DEBUG to see them), problems at WARNING
+logger = logging.getLogger("hallticket.cli")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate hall tickets from an Excel roster. Anything not given as a flag is asked for, "
+                    "unless --yes or --job is used.")
+    parser.add_argument('roster', nargs='?', help="Excel, CSV or Parquet roster")
+    parser.add_argument('previous_manifest', nargs='?', help="manifest of an earlier run to diff against")
+    parser.add_argument('--job', help="YAML or JSON job file listing rosters/departments to generate (implies --yes)")
+    parser.add_argument('-d', '--department', help=f"department name (default {DEFAULT_DEPARTMENT})")
+    parser.add_argument('--logo', help="logo image (default: logo.jpg if present)")
+    parser.add_argument('--subject', action='append', dest='subjects', metavar='"CODE - Name"',
+                        help="custom subject, repeat for each (default: subjects from the roster)")
+    parser.add_argument('--merged', action='store_true', default=None, help="one merged PDF for bulk printing")
+    parser.add_argument('--volume-size', type=int, default=None, help="pages per merged PDF volume (0 = one file)")
+    parser.add_argument('-o', '--output-dir', help="where tickets and the manifest go (default: current directory)")
+    parser.add_argument('--full', action='store_true', help="regenerate everything, ignoring the previous run")
+    parser.add_argument('--check', action='store_true',
+                        help="only check the roster (duplicate seats, empty fields, photos, subject count) and report")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run: keep the tickets its checkpoint lists that are still intact")
+    parser.add_argument('--workers', type=int, default=None, help="render worker processes (default HALLTICKET_WORKERS or CPU count)")
+    parser.add_argument('-y', '--yes', action='store_true', help="never prompt: use the flags and defaults")
+    parser.add_argument('--profile', action='store_true',
+                        help="run under cProfile (rendering serially, so drawing shows up in the profile)")
+    parser.add_argument('--shard', metavar='I/N', help="render only shard I of N (split by Seat No hash) for multi-machine runs")
+    parser.add_argument('--merge-shards', nargs='+', metavar='DIR',
+                        help="combine the shard output folders of the roster into one ZIP (or merged PDF with --merged)")
+    return parser.parse_args(argv)
+
+def get_user_inputs(args, interactive=True):
+    """The single job described by the command line, asking for anything missing when `interactive`"""
     print("🎓 Hall Ticket Generator - Command Line Version")
     print("=" * 50)
     
     # Get Excel file path
-    if len(sys.argv) > 1:
-        excel_file = sys.argv[1]
-    else:
+    if args.roster:
+        excel_file = args.roster
+    elif interactive:
         excel_file = input("📄 Enter the path to Excel file (or press Enter for 'dummy_students.xlsx'): ").strip()
         if not excel_file:
             excel_file = "dummy_students.xlsx"
+    else:
+        print("❌ Error: no roster given (pass a file, or --job)")
+        return None
     
     # Check if file exists
     if not os.path.exists(excel_file):
         print(f"❌ Error: File '{excel_file}' not found!")
-        return None, None, None, None, None
+        return None
     
     # Get department name
-    department_name = input("🏫 Enter department name (or press Enter for default): ").strip()
+    department_name = args.department
+    if department_name is None and interactive:
+        department_name = input("🏫 Enter department name (or press Enter for default): ").strip()
     if not department_name:
-        department_name = "INFORMATION SCIENCE ENGINEERING"
+        department_name = DEFAULT_DEPARTMENT
     
     # Get logo path
-    logo_path = input("🖼️ Enter logo file path (or press Enter to skip): ").strip()
+    logo_path = args.logo
+    if logo_path is None and interactive:
+        logo_path = input("🖼️ Enter logo file path (or press Enter to skip): ").strip()
     if logo_path and not os.path.exists(logo_path):
         print(f"⚠️ Warning: Logo file '{logo_path}' not found. Continuing without logo.")
         logo_path = None
@@ -36,6 +87,17 @@ def get_user_inputs():
         logo_path = "logo.jpg"
         print("✅ Found 'logo.jpg' in current directory. Using this file.")
     
+    custom_subjects = args.subjects
+    if custom_subjects is None and interactive:
+        custom_subjects = get_custom_subjects()
+
+    output_dir = args.output_dir or os.getcwd()
+    previous = PREVIOUS_NONE if args.full else (args.previous_manifest or PREVIOUS_AUTO)
+    return BatchJob(excel_file, department_name, logo_path, custom_subjects, bool(args.merged), args.volume_size or 0,
+                    output_dir, previous, args.workers)
+
+def get_custom_subjects():
+    """Ask whether to use the roster's subjects; returns the subjects entered instead, or None"""
     # Ask for subject option
     print("\n📚 Subject Options:")
     print("1. Use subjects from Excel file")
@@ -47,197 +109,457 @@ def get_user_inputs():
             break
         print("Please enter 1 or 2")
     
-    use_custom_subjects = choice == '2'
-    custom_subjects = None
-    
-    if use_custom_subjects:
-        print("\n📝 Enter subjects (one per line). Press Enter twice when done:")
-        print("Format: Subject Code - Subject Name")
-        print("Example: 21CS81 - Machine Learning")
-        print()
-        
-        subjects = []
-        while True:
-            subject = input().strip()
-            if not subject:
-                break
-            subjects.append(subject)
-        
-        if subjects:
-            custom_subjects = subjects
-            print(f"✅ Received {len(custom_subjects)} subjects")
-        else:
-            print("❌ No subjects entered. Will use subjects from Excel file.")
-            use_custom_subjects = False
-    
-    return excel_file, department_name, logo_path, use_custom_subjects, custom_subjects
-
-def draw_ticket(c, row, y_start, copy_label, department_name, logo_path):
-    width, height = A4
-
-    # Draw outer box for ticket (top above logo)
-    box_left = 30
-    box_right = width - 30
-    box_top = y_start + 40  # move box top above logo
-    box_bottom = y_start - 320  # enough to cover all content including signatures
-    box_width = box_right - box_left
-    box_height = box_top - box_bottom
-    c.setLineWidth(1)
-    c.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
-
-    # College Logo
-    if logo_path:
-        try:
-            c.drawImage(logo_path, 40, y_start-30, width=60, height=60, mask='auto')
-        except:
-            pass
-
-    # Header
-    c.setFont("Helvetica-Bold", 13)
-    c.drawCentredString(width/2, y_start, "GURU NANAK DEV ENGINEERING COLLEGE, BIDAR")
-    c.setLineWidth(1)
-
-    # Department name (dynamically set by user)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width/2, y_start-20, department_name.upper())
-    c.setLineWidth(0.8)
-
-    # Exam title
-    c.setFont("Helvetica-Bold", 11)
-    c.drawCentredString(width/2, y_start-40, "ADMISSION TICKET FOR B.E EXAMINATION JUNE / JULY 2025")
-    c.setLineWidth(0.5)
-    c.line(40, y_start-50, width-40, y_start-50)  # horizontal line after admission ticket text
-
-    # Copy Label
-    c.setFont("Helvetica-Bold", 10)
-    c.drawRightString(width-40, y_start-40, copy_label)
-
-    # Student details
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y_start-80, f"1. UNIVERSITY SEAT NO.: {row['Seat No']}     No: {row['Exam No']}     Date: {row['Date']}")
-    c.drawString(50, y_start-100, f"2. NAME OF THE CANDIDATE: {row['Name']}")
-
-    # Subjects with signature box
-    c.drawString(50, y_start-120, "3. SUBJECTS APPLIED:")
-    subjects = str(row['Subjects Applied']).split(",")
-    y = y_start - 140
-    for sub in subjects:
-        sub = sub.strip()
-        c.drawString(70, y, sub)
-        c.rect(200, y-5, 60, 15)   # box for signature
-        y -= 20
-
-    # Note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(70, y, "Note: Please verify the eligibility of candidate before issuing the admission ticket.")
-    y -= 20
-    c.drawString(70, y, "This is Electronically Generated Admission Ticket.")
-
-    # Photo
-    if pd.notna(row['Photo Path']):
-        try:
-            c.drawImage(row['Photo Path'], width-150, y_start-130, 100, 100)
-        except:
-            pass
-
-    # Exam Center
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y-30, f"Exam Center: {row['Exam Center']}")
-
-    # Signature placeholders
-    c.drawString(50, y-70, "Signature of the Candidate")
-    c.drawString(250, y-70, "Signature of the Principal with seal")
-    c.drawString(450, y-70, "Signature of the Hod")
-
-def generate_hallticket(row, department_name, logo_path):
-    filename = f"hallticket_{row['Seat No']}.pdf"
-    c = canvas.Canvas(filename, pagesize=A4)
-    width, height = A4
-
-    # Only two copies now
-    copies = ["STUDENT COPY", "COLLEGE COPY"]
-    y_positions = [height-50, height/2-30]  # spaced nicely
-
-    for label, y in zip(copies, y_positions):
-        draw_ticket(c, row, y, label, department_name, logo_path)
-
-        # Horizontal line separator
-        c.setLineWidth(0.5)
-        c.line(40, y-280, width-40, y-280)
-
-    # Footer note
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawCentredString(width/2, 30, "Candidate must read the instructions provided in the answer booklet before commencement of examination.")
-
-    c.showPage()
-    c.save()
-    print(f"✅ Generated {filename}")
-
-def main():
-    # Get user inputs
-    excel_file, department_name, logo_path, use_custom_subjects, custom_subjects = get_user_inputs()
-    
-    if excel_file is None:
-        return
+    if choice == '1':
+        return None
+
+    print("\n📝 Enter subjects (one per line). Press Enter twice when done:")
+    print("Format: Subject Code - Subject Name")
+    print("Example: 21CS81 - Machine Learning")
+    print()
+
+    subjects = []
+    while True:
+        subject = input().strip()
+        if not subject:
+            break
+        subjects.append(subject)
+
+    if not subjects:
+        print("❌ No subjects entered. Will use subjects from Excel file.")
+        return None
+    print(f"✅ Received {len(subjects)} subjects")
+    return subjects
+
+def get_output_options():
+    """Ask whether to write one PDF per student or a single merged PDF for printing"""
+    print("\n🖨️ Output Options:")
+    print("1. One PDF per student")
+    print("2. Single merged PDF for bulk printing")
+
+    while True:
+        choice = input("Choose option (1 or 2, Enter for 1): ").strip() or '1'
+        if choice in ['1', '2']:
+            break
+        print("Please enter 1 or 2")
+
+    if choice == '1':
+        return False, 0
+
+    volume_size = input("📚 Pages per PDF volume (press Enter for a single file): ").strip()
+    if not volume_size.isdigit():
+        volume_size = '0'
+    return True, int(volume_size)
+
+def get_previous_manifest(job, interactive=True):
+    """Manifest of an earlier run to diff against: the job's `previous`, or the last run's manifest in its output folder"""
+    if job.previous == PREVIOUS_NONE:
+        return None
+    if job.previous == PREVIOUS_AUTO:
+        path = manifest_path(job.output_dir, BATCH_NAME)
+        if not os.path.exists(path):
+            return None
+        if interactive:
+            choice = input("🔁 Found the previous run's manifest. Regenerate only changed students? (Y/n): ").strip().lower()
+            if choice in ['n', 'no']:
+                return None
+    else:
+        path = job.previous
 
     try:
-        # Load Excel
-        df = pd.read_excel(excel_file)
-        print(f"\n✅ Loaded Excel file: {os.path.basename(excel_file)}")
+        manifest = BatchManifest.load(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Warning: could not read previous manifest '{path}' ({e}). Regenerating everything.")
+        return None
+    print(f"✅ Using previous manifest: {os.path.basename(path)} ({len(manifest.students)} students)")
+    return manifest
+
+def load_roster(job, timer):
+    """Read the job's roster and apply its custom subjects; returns the DataFrame or None if it cannot be read"""
+    try:
+        # Only the columns a ticket uses; .csv and .parquet rosters work too
+        with timer.stage('parse'):
+            df = read_roster(job.roster)
+        print(f"\n✅ Loaded Excel file: {os.path.basename(job.roster)}")
         print(f"📊 Found {len(df)} student records")
-        print(f"🏫 Department: {department_name}")
-        if logo_path:
-            print(f"🖼️ Logo: {os.path.basename(logo_path)}")
+        print(f"🏫 Department: {job.department}")
+        if job.logo:
+            print(f"🖼️ Logo: {os.path.basename(job.logo)}")
         else:
             print("🖼️ No logo selected")
     except Exception as e:
         print(f"❌ Error loading Excel file: {e}")
-        return
+        return None
 
     # Handle custom subjects
-    if use_custom_subjects and custom_subjects:
-        subjects_string = ", ".join(custom_subjects)
-        df['Subjects Applied'] = subjects_string
+    if job.subjects:
+        df['Subjects Applied'] = ", ".join(job.subjects)
         print(f"⚙️ Updated all records with custom subjects")
-        print(f"📚 Using {len(custom_subjects)} custom subjects")
+        print(f"📚 Using {len(job.subjects)} custom subjects")
     else:
         print(f"📊 Using subjects from Excel file")
+    return df
+
+def print_validation(report, top=10):
+    """Summarise the roster check: counts, then the first errors and warnings"""
+    summary = report.to_dict(top)
+    if not summary['error_count'] and not summary['warning_count']:
+        print("✅ Roster check: no problems found")
+        return summary
+    print(f"\n🔎 Roster check: {summary['invalid_rows']} row(s) with errors (skipped), "
+          f"{summary['warning_count']} warning(s)")
+    for issue in summary['errors']:
+        print(f"   ❌ Row {issue['row']} ({issue['seat_no']}): {issue['message']}")
+    for issue in summary['warnings']:
+        print(f"   ⚠️ Row {issue['row']} ({issue['seat_no']}): {issue['message']}")
+    hidden = summary['error_count'] + summary['warning_count'] - len(summary['errors']) - len(summary['warnings'])
+    if hidden > 0:
+        print(f"   ... and {hidden} more")
+    return summary
+
+def check_roster(df, timer):
+    """--check: run the roster check alone and print its report as JSON; returns the exit status"""
+    with timer.stage('validate'):
+        report = validate_roster(df)
+    print_validation(report)
+    print(json.dumps(report.to_dict(), indent=2))
+    return 0 if report.ok else 1
+
+def print_diff(diff, records):
+    """Summarise what changed since the previous run"""
+    print(f"\n🔍 Changes since the previous run: {diff.count('added')} added, {diff.count('changed')} changed, "
+          f"{len(diff.removed)} removed, {diff.count('unchanged')} unchanged")
+    for index, fields in diff.changed_fields.items():
+        print(f"   ✏️ {records[index].seat_no}: {', '.join(fields)}")
+    for index, status in enumerate(diff.status):
+        if status == 'added':
+            print(f"   ➕ {records[index].seat_no}")
+    for seat_no in diff.removed:
+        print(f"   ➖ {seat_no}")
+
+def generate_tickets(df, department_name, logo_path, merged=False, volume_size=0, previous=None, timer=None,
+                     workers=None, output_dir=None, resume=False, cache=render_cache):
+    """
+    Generate individual PDFs, or one merged PDF (optionally split into volumes), in `output_dir` (default: current directory).
+
+    With the `previous` run's manifest only added and changed students are rendered; everything else is
+    kept (or spliced in) from that run. Individual PDFs are journaled in a checkpoint as they are written;
+    with `resume` the tickets an interrupted run finished are kept, after checking their size and hash.
+    Rows the roster check finds errors in are reported up front and skipped, not rendered.
+    Tickets already drawn by an earlier run come from the render `cache`; None draws every one.
+    Stage timings and counters go into `timer` (a BatchTimer). Returns the result of every row.
+    """
+    timer = timer or metrics.batch()
+    timer.inc('batches')
+    # Set HALLTICKET_WORKERS=1 to force serial mode
+    workers = resolve_workers(workers)
+    output_dir = output_dir or os.getcwd()
+    try:
+        with timer.stage('prepare'):
+            records = prepare_records(df)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return []
+    # Duplicate seats, empty fields, missing photos and overlong subject lists, checked for the whole roster at once
+    with timer.stage('validate'):
+        report = validate_roster(df)
+        report.mark(records)
+    print_validation(report)
+    with open(os.path.join(output_dir, f"{BATCH_NAME}{VALIDATION_SUFFIX}"), 'w') as f:
+        json.dump(report.to_dict(max_listed=None), f, indent=2)
+    timer.count_photos(records)
+    renderer = TicketRenderer(department_name, logo_path)
+
+    # Shrink photos to the ticket's photo slot once per source image (reused by later runs)
+    with timer.stage('resize'):
+        photo_report = photo_derivatives.apply(records)
+    if photo_report['photos']:
+        print(f"🖼️ Photos: {photo_report['created']} resized, {photo_report['reused']} reused, "
+              f"{photo_report['unchanged']} already small - {photo_report['bytes_saved'] / 1024:.0f} KB less photo data")
+    for failure in photo_report['failed']:
+        logger.warning("⚠️ Could not resize %s: %s", failure['photo_path'], failure['error'])
+
+    # Diff against the previous run, keyed on Seat No
+    with timer.stage('diff'):
+        fields = roster_fields(df)
+        diff = diff_roster(renderer, records, fields, previous)
+    if previous is not None:
+        print_diff(diff, records)
+    previous_outputs = PreviousOutputs(previous, output_dir)
+
+    if merged:
+        if resume:
+            print("⚠️ --resume only applies to one PDF per student; unchanged volumes are still kept from the last finished run")
+        print(f"\n🔄 Generating merged hall ticket PDF using {workers} worker(s)...")
+        # Unchanged volumes are copied from the previous run; in the others, unchanged pages are spliced in
+        volume_count = max(1, math.ceil(len(records) / (volume_size or max(1, len(records)))))
+        results, volumes = [], []
+        rendered = iter_volumes_incremental(renderer, records, diff, previous_outputs, volume_size, workers)
+        for number, data, volume_results, digest in timer.timed(rendered, 'render'):
+            filename = volume_filename(BATCH_NAME, number, volume_count)
+            with timer.stage('save'), open(os.path.join(output_dir, filename), 'wb') as f:
+                f.write(data)
+            volumes.append({'filename': filename, 'digest': digest})
+            results.extend(timer.tally(volume_results))
+            kept = sum(1 for r in volume_results if r['reused'])
+            if kept == len(volume_results):
+                print(f"✅ Kept {filename} (unchanged)")
+            elif kept:
+                print(f"✅ Updated {filename} ({len(volume_results) - kept} redrawn, {kept} unchanged pages kept)")
+            else:
+                print(f"✅ Generated {filename}")
+        outputs = {'kind': 'merged', 'archive': None, 'volume_size': volume_size or 0, 'volumes': volumes}
+    else:
+        # Every ticket written is journaled, so a crashed or killed run can be continued with --resume
+        checkpoint = Checkpoint.open(checkpoint_path(output_dir, BATCH_NAME), diff, resume, directory=output_dir)
+        if resume:
+            print(f"⏯️ Checkpoint lists {len(checkpoint.earlier)} finished tickets; checking them...")
+        print(f"\n🔄 Generating hall tickets using {workers} worker(s)...")
+        # Unchanged students keep their existing PDFs; the rest may still be copied from the render cache
+        rendered = iter_incremental(renderer, records, diff, previous_outputs, workers=workers,
+                                    output_dir=output_dir, cache=cache, checkpoint=checkpoint)
+        try:
+            results = list(timer.tally(timer.timed(rendered, 'render')))
+        finally:
+            checkpoint.close()
+        if checkpoint.resumed:
+            print(f"⏯️ Resumed {checkpoint.resumed} tickets finished by the interrupted run")
+        for r in results:
+            if r['success'] and not r['reused'] and not r.get('resumed'):
+                logger.debug("✅ Generated %s%s", r['filename'], " (unchanged, from cache)" if r.get('cached') else "")
+        rendered_count = sum(1 for r in results if r['success'] and not r['reused'] and not r.get('resumed'))
+        if rendered_count:
+            print(f"✅ Generated {rendered_count} hall tickets")
+        reused_count = sum(1 for r in results if r['reused'])
+        if reused_count:
+            print(f"✅ Kept {reused_count} unchanged hall tickets")
+        if previous is not None:
+            for filename in remove_stale_tickets(output_dir, diff, previous):
+                print(f"🗑️ Removed {filename} (no longer in the roster)")
+        outputs = {'kind': 'files'}
+    previous_outputs.close()
+    with timer.stage('save'):
+        BatchManifest.build(renderer, records, fields, diff, results, outputs).save(manifest_path(output_dir, BATCH_NAME))
+
+    for r in results:
+        if not r['success'] and not r.get('skipped'):
+            logger.warning("❌ Error generating ticket for %s: %s", r['seat_no'], r['error'])
+    return results
+
+def print_profile(summary, top=10):
+    """Show where a profiled run spent its time: per library, then the hottest functions"""
+    if 'error' in summary:
+        print(f"⚠️ {summary['error']}")
+        return
+    print(f"\n🔬 Profile saved to {os.path.basename(summary['profile_path'])} ({summary['wall_seconds']:.2f}s profiled)")
+    for library, seconds in summary['by_library'].items():
+        print(f"   {library:<16} {seconds:8.3f}s")
+    print("   Hottest functions (own time):")
+    for entry in summary['top'][:top]:
+        print(f"   {entry['own_seconds']:8.3f}s  {entry['calls']:>8}x  {entry['function']} ({entry['location']})")
+
+def print_metrics(timer, path, profile=None):
+    """Print the run's stage timings and counters (and profile summary) as JSON and save them to `path`"""
+    summary = timer.summary()
+    if profile is not None:
+        summary['profile'] = profile
+    print("\n⏱️ Run summary:")
+    print(json.dumps(summary, indent=2))
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def run_job(job, df, previous, timer, profile=False, shard=None, resume=False):
+    """
+    Generate one job's tickets into its output directory and print its run summary; returns the generated count.
+
+    With `resume` an interrupted run in the same output directory is continued (see generate_tickets).
+
+    With `shard` - (index, count, full roster rows, roster digest) - `df` holds only that shard's rows
+    and a shard manifest is written for merging later.
+    """
+    os.makedirs(job.output_dir, exist_ok=True)
+    args = (df, job.department, job.logo, job.merged, job.volume_size, previous, timer)
+    profile_summary = None
+    if profile:
+        # Serial and uncached, so every ticket is drawn in the profiled thread
+        results, profile_summary = profile_run(
+            generate_tickets, *args, workers=1, output_dir=job.output_dir, resume=resume, cache=None,
+            path=os.path.join(job.output_dir, f"{BATCH_NAME}{PROFILE_SUFFIX}"))
+    else:
+        results = generate_tickets(*args, workers=job.workers, output_dir=job.output_dir, resume=resume)
+    generated_count = sum(1 for r in results if r['success'])
+
+    print(f"\n🎉 Successfully generated {generated_count} out of {len(df)} hall tickets!")
+    print(f"📁 Files saved in: {job.output_dir}")
+    if shard is not None:
+        index, count, roster_rows, digest = shard
+        path = ShardManifest.build(index, count, roster_rows, digest, df.index, results).save(job.output_dir)
+        print(f"🧩 Shard {index}/{count} manifest: {os.path.basename(path)}")
+    if profile_summary is not None:
+        print_profile(profile_summary)
+    print_metrics(timer, os.path.join(job.output_dir, f"{BATCH_NAME}{METRICS_SUFFIX}"), profile_summary)
+    return generated_count
+
+def take_shard(job, df, shard):
+    """Cut the roster down to one shard; returns (shard rows, shard info for run_job)"""
+    index, count = shard
+    rows, digest = len(df), roster_digest(df)
+    df = select_shard(df, index, count)
+    print(f"🧩 Shard {index}/{count}: {len(df)} of {rows} students")
+    if job.merged:
+        # Shards always write one PDF per student; --merge-shards --merged builds the print PDF in roster order
+        print("⚠️ Sharded runs write one PDF per student; merge the shards with --merged for a single PDF")
+        job.merged, job.volume_size = False, 0
+    return df, (index, count, rows, digest)
+
+def merge_shards(args):
+    """Combine shard outputs into one ZIP or merged PDF, after checking every roster row has its ticket"""
+    if not args.roster:
+        print("❌ Error: --merge-shards needs the original roster to check the shards against")
+        return 2
+    timer = metrics.batch()
+    with timer.stage('parse'):
+        try:
+            df = read_roster(args.roster)
+        except Exception as e:
+            print(f"❌ Error loading Excel file: {e}")
+            return 1
+    try:
+        shards = [(ShardManifest.load(path), path if os.path.isdir(path) else os.path.dirname(path))
+                  for path in args.merge_shards]
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    paths, problems = plan_merge(shards, df)
+    if problems:
+        print(f"❌ The shards do not cover {os.path.basename(args.roster)} ({len(df)} students); nothing merged:")
+        for problem in problems:
+            print(f"   • {problem}")
+        return 1
+    print(f"✅ {len(shards)} shard(s) cover all {len(df)} students of {os.path.basename(args.roster)}")
+
+    output_dir = args.output_dir or os.getcwd()
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        with timer.stage('zip' if not (args.merged or args.volume_size) else 'save'):
+            if args.merged or args.volume_size:
+                filenames = merge_to_pdf(paths, output_dir, BATCH_NAME, args.volume_size)
+            else:
+                filenames = [os.path.basename(merge_to_zip(paths, os.path.join(output_dir, f"{BATCH_NAME}.zip")))]
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    for filename in filenames:
+        print(f"✅ Wrote {filename}")
+    print(f"📁 Files saved in: {output_dir}")
+    return 0
+
+def run_job_file(args):
+    """Generate every job in the job file in this process, sharing one warm worker pool; returns the exit status"""
+    try:
+        jobs = load_job_file(args.job)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 2
+
+    shard = parse_shard(args.shard) if args.shard else None
+    print(f"🎓 Hall Ticket Generator - {len(jobs)} job(s) from {os.path.basename(args.job)}")
+    outcomes = []
+    # Workers start once and keep their fonts, template and logo caches for every job
+    with warm_pool(args.workers):
+        for number, job in enumerate(jobs, 1):
+            print(f"\n📦 Job {number}/{len(jobs)}: {job.name} ({os.path.basename(job.roster)})")
+            if args.full:
+                job.previous = PREVIOUS_NONE
+            if job.workers is None:
+                job.workers = args.workers
+            timer = metrics.batch()
+            df = load_roster(job, timer)
+            if df is None:
+                outcomes.append((job, 0, None))
+                continue
+            shard_info = None
+            if shard is not None:
+                df, shard_info = take_shard(job, df, shard)
+            if args.check:
+                outcomes.append((job, len(df) if check_roster(df, timer) == 0 else 0, len(df)))
+                continue
+            previous = get_previous_manifest(job, interactive=False)
+            outcomes.append((job, run_job(job, df, previous, timer, args.profile, shard_info, args.resume), len(df)))
+
+    print("\n📋 Jobs:")
+    for job, generated_count, total in outcomes:
+        status = "❌ roster unreadable" if total is None else f"{'✅' if generated_count == total else '⚠️'} {generated_count}/{total}"
+        print(f"   {status}  {job.name} -> {job.output_dir}")
+    return 0 if all(generated_count == total for job, generated_count, total in outcomes) else 1
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(fmt='%(message)s')
+    if args.shard:
+        try:
+            parse_shard(args.shard)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 2
+    if args.merge_shards:
+        return merge_shards(args)
+    if args.job:
+        return run_job_file(args)
+
+    # Get user inputs (only what the flags left out, and nothing at all with --yes)
+    interactive = not args.yes
+    timer = metrics.batch()
+    job = get_user_inputs(args, interactive)
+    if job is None:
+        return 1
+
+    df = load_roster(job, timer)
+    if df is None:
+        return 1
+    shard_info = None
+    if args.shard:
+        df, shard_info = take_shard(job, df, parse_shard(args.shard))
+    if args.check:
+        return check_roster(df, timer)
 
     # Display summary
     print(f"\n📋 Summary:")
-    print(f"   Excel File: {os.path.basename(excel_file)}")
-    print(f"   Department: {department_name}")
+    print(f"   Excel File: {os.path.basename(job.roster)}")
+    print(f"   Department: {job.department}")
     print(f"   Students: {len(df)}")
-    if logo_path:
-        print(f"   Logo: {os.path.basename(logo_path)}")
-    if use_custom_subjects and custom_subjects:
-        print(f"   Subjects: {len(custom_subjects)} custom subjects")
-        for i, subject in enumerate(custom_subjects[:2], 1):
+    if job.logo:
+        print(f"   Logo: {os.path.basename(job.logo)}")
+    if job.subjects:
+        print(f"   Subjects: {len(job.subjects)} custom subjects")
+        for i, subject in enumerate(job.subjects[:2], 1):
             print(f"      {i}. {subject}")
-        if len(custom_subjects) > 2:
-            print(f"      ... and {len(custom_subjects) - 2} more")
+        if len(job.subjects) > 2:
+            print(f"      ... and {len(job.subjects) - 2} more")
     else:
         print(f"   Subjects: From Excel file")
 
+    # Ask for output format
+    if shard_info is not None:
+        job.merged, job.volume_size = False, 0  # shards are merged into one PDF by --merge-shards
+    elif args.merged is None and args.volume_size is None:
+        if interactive:
+            job.merged, job.volume_size = get_output_options()
+    elif args.volume_size:
+        job.merged = True  # a volume size only makes sense for merged PDFs
+    previous = get_previous_manifest(job, interactive)
+
     # Confirm generation
-    confirm = input(f"\n🔄 Generate hall tickets for {len(df)} students? (y/N): ").strip().lower()
-    if confirm not in ['y', 'yes']:
-        print("❌ Operation cancelled by user.")
-        return
+    if interactive:
+        confirm = input(f"\n🔄 Generate hall tickets for {len(df)} students? (y/N): ").strip().lower()
+        if confirm not in ['y', 'yes']:
+            print("❌ Operation cancelled by user.")
+            return 0
 
     # Generate hall tickets
-    print("\n🔄 Generating hall tickets...")
-    generated_count = 0
-
-    for _, row in df.iterrows():
-        try:
-            generate_hallticket(row, department_name, logo_path)
-            generated_count += 1
-        except Exception as e:
-            print(f"❌ Error generating ticket for {row.get('Name', 'Unknown')}: {e}")
-
-    print(f"\n🎉 Successfully generated {generated_count} out of {len(df)} hall tickets!")
-    print(f"📁 Files saved in: {os.getcwd()}")
+    generated_count = run_job(job, df, previous, timer, args.profile, shard_info, args.resume)
+    return 0 if generated_count == len(df) else 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+generate_bounded - memory stays flat however large the roster, and validation spans every chunk
+"""
+
+import os
+import tracemalloc
+import zipfile
+
+import pandas as pd
+import pytest
+
+from hallticket import Budget, JobQueue, TicketRenderer, generate_bounded
+from hallticket.bounded import current_rss_mb
+from hallticket.jobs import COMPLETED
+
+TICKET_BYTES = 64 * 1024
+SLOW = not os.environ.get('HALLTICKET_SLOW_TESTS')  # set HALLTICKET_SLOW_TESTS=1 to run the tests that take minutes
+
+class PaddedRenderer(TicketRenderer):
+    """Skips the drawing and returns a fixed-size blob per student, so the test is about memory, not reportlab"""
+
+    def render_to_bytes(self, row):
+        return bytes(TICKET_BYTES)
+
+def roster(rows):
+    return pd.DataFrame({'Seat No': [f'S{i:05d}' for i in range(rows)], 'Exam No': 'E1', 'Name': 'Student',
+                         'Date': '14-05-2025', 'Exam Center': 'GN', 'Subjects Applied': '21CS81, 21CS82'})
+
+@pytest.fixture
+def roster_csv(tmp_path):
+    def write(df):
+        path = tmp_path / 'roster.csv'
+        df.to_csv(path, index=False)
+        return str(path)
+    return write
+
+def test_peak_memory_is_independent_of_roster_size(tmp_path, roster_csv):
+    rows = 3000  # ~190 MB of tickets, against a peak of a few chunks
+    path = roster_csv(roster(rows))
+    zip_path = tmp_path / 'tickets.zip'
+
+    tracemalloc.start()  # Python allocations, not RSS: the interpreter and libraries are not counted
+    try:
+        summary = generate_bounded(PaddedRenderer('DEPT'), path, str(zip_path), Budget(memory_mb=16), workers=1)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert summary['generated_count'] == rows
+    assert summary['chunks'] > 1
+    with zipfile.ZipFile(zip_path) as zipf:
+        assert len(zipf.namelist()) == rows
+    assert peak < 16 * 1024 * 1024, f"peak {peak / 1024 / 1024:.1f} MB for {rows * TICKET_BYTES / 1024 / 1024:.0f} MB of tickets"
+
+@pytest.mark.skipif(SLOW, reason='renders 50,000 real tickets (about two minutes); set HALLTICKET_SLOW_TESTS=1')
+@pytest.mark.skipif(current_rss_mb() is None, reason='reads resident memory from /proc')
+def test_rss_stays_within_budget_for_50k_rows(tmp_path, roster_csv):
+    rows, budget_mb = 50000, 192
+    path = roster_csv(roster(rows))
+    samples = []
+
+    def sample(result):
+        if result['index'] % 1000 == 0:
+            samples.append(current_rss_mb())
+
+    # The real renderer in this process (workers=1), so the whole pipeline is measured, interpreter included
+    summary = generate_bounded(TicketRenderer('DEPT'), path, str(tmp_path / 'tickets.zip'), Budget(memory_mb=budget_mb),
+                               workers=1, progress=sample)
+
+    assert summary['generated_count'] == rows
+    assert len(samples) == rows // 1000
+    assert max(samples) < budget_mb, f"RSS reached {max(samples)} MB against a {budget_mb} MB budget"
+    # Tickets are a few KB each and none are kept; what stays per row (its entry in the ZIP's central
+    # directory, its Seat No for the duplicate check) is well under a kilobyte
+    growth = max(samples) - samples[0]
+    assert growth < rows / 1024, f"RSS grew {growth:.1f} MB while writing {summary['bytes_written'] / 1024 / 1024:.0f} MB"
+
+def test_duplicates_are_caught_across_chunks(tmp_path, roster_csv):
+    df = roster(1100)
+    df.loc[1050, 'Seat No'] = 'S00005'  # repeats a row from the first chunk
+    df.loc[700, 'Name'] = ''
+    summary = generate_bounded(PaddedRenderer('DEPT'), roster_csv(df), str(tmp_path / 'tickets.zip'),
+                               Budget(memory_mb=16), workers=1)
+
+    assert summary['chunks'] == 3
+    assert summary['skipped_count'] == 2
+    assert summary['generated_count'] == 1098
+    validation = summary['validation']
+    assert not validation['ok']
+    assert validation['rows'] == 1100
+    assert validation['invalid_rows'] == 2
+    assert validation['checks'] == {'duplicate_seat_no': 1, 'missing_name': 1}
+    assert [(issue['row'], issue['index'], issue['check']) for issue in validation['errors']] == \
+        [(702, 700, 'missing_name'), (1052, 1050, 'duplicate_seat_no')]
+    assert validation['errors'][1]['message'] == 'Seat No repeats row 7'
+
+def test_job_progress_counts_every_chunk(tmp_path, roster_csv):
+    path = roster_csv(roster(1200))
+
+    def generate(job):
+        job.set_total(1200)
+        return generate_bounded(PaddedRenderer('DEPT'), path, str(tmp_path / 'tickets.zip'), Budget(memory_mb=16),
+                                workers=1, progress=job.record)
+
+    job = JobQueue(workers=1).execute(generate)
+    assert job.status == COMPLETED
+    assert job.result['chunks'] == 3
+    status = job.to_dict()
+    assert (status['done'], status['failed'], status['remaining']) == (1200, 0, 0)
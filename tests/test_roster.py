@@ -0,0 +1,68 @@
+"""
+Roster readers - the .xlsx reader matches pandas, and nrows is honoured by every format
+"""
+
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from hallticket import ROSTER_COLUMNS, iter_roster, preview_roster, read_roster
+
+HEADER = ['Seat No', 'Exam No', 'Name', 'Date', 'Subjects Applied', 'Exam Center', 'Photo Path', 'Notes']
+ROWS = [
+    ('3GN21CS001', 'E1001', 'Asha', datetime.datetime(2025, 5, 14), '21CS81, 21CS82', 'GN', 'photos/asha.jpg'),
+    ('3GN21CS002', 1002, 'Bharath', datetime.datetime(2025, 5, 15), '21CS81', None, None),
+    ('0042', 'E1003', 'Chitra', datetime.datetime(2025, 5, 16), '21CS81, 21CS83', 'GN', ''),
+    ('3GN21CS004', 'E1004', None, datetime.datetime(2025, 5, 17), '21CS84', 'GN', 'photos/dev.jpg'),
+    ('3GN21CS005', 'E1005', 'Esha', datetime.datetime(2025, 5, 18), '21CS85', 'GN', None),
+]
+
+@pytest.fixture
+def xlsx_path(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in ROWS:
+        sheet.append(list(row) + ['ignored'])
+    path = tmp_path / 'roster.xlsx'
+    workbook.save(path)
+    return str(path)
+
+@pytest.mark.parametrize('nrows', [None, 0, 1, 3, 5, 50])
+def test_xlsx_matches_pandas(xlsx_path, nrows):
+    expected = pd.read_excel(xlsx_path, nrows=nrows)[ROSTER_COLUMNS]
+    pd.testing.assert_frame_equal(read_roster(xlsx_path, nrows=nrows), expected)
+
+@pytest.mark.parametrize('roster_format', ['xlsx', 'csv', 'parquet'])
+@pytest.mark.parametrize('nrows, chunk_rows, sizes', [(0, None, [0]), (0, 2, [0]), (3, 2, [2, 1]), (4, 2, [2, 2]),
+                                                      (None, 2, [2, 2, 1]), (None, None, [5])])
+def test_nrows_and_chunks(tmp_path, xlsx_path, roster_format, nrows, chunk_rows, sizes):
+    path = xlsx_path
+    if roster_format != 'xlsx':
+        df = pd.read_excel(xlsx_path, dtype=str)
+        path = str(tmp_path / f'roster.{roster_format}')
+        if roster_format == 'csv':
+            df.to_csv(path, index=False)
+        else:
+            pytest.importorskip('pyarrow')
+            df.to_parquet(path, index=False)
+    chunks = list(iter_roster(path, chunk_rows=chunk_rows, nrows=nrows))
+    assert [len(chunk) for chunk in chunks] == sizes
+    assert sorted(chunks[0].columns) == sorted(ROSTER_COLUMNS)
+
+def test_preview_without_rows(xlsx_path):
+    preview = preview_roster(xlsx_path, nrows=0)
+    assert preview['columns'] == HEADER
+    assert preview['row_count'] == len(ROWS)
+    assert preview['sample_data'] == []
+
+def test_csv_preview_keeps_text(tmp_path):
+    path = tmp_path / 'roster.csv'
+    path.write_text('Seat No,Exam No,Name\n00123,0042,Asha\n00124,,Bharath\n')
+    preview = preview_roster(str(path))
+    assert preview['row_count'] == 2
+    assert [row['Seat No'] for row in preview['sample_data']] == ['00123', '00124']
+    assert preview['sample_data'][0]['Exam No'] == '0042'
+    assert pd.isna(preview['sample_data'][1]['Exam No'])